@@ -0,0 +1,87 @@
+import logging
+from typing import Optional, Union
+
+from app.client.async_mysql_client import AsyncMySQLClient
+from app.client.async_postgresql_client import AsyncPostgreSQLClient
+from app.db.mysql.connection import MySQLConnectionArgs
+from app.db.postgresql.connection import PostgreSQLConnectionArgs
+from app.exception import AppDBConnectionError
+from app.misc.circuit_breaker import Bulkhead, CircuitBreaker, guarded_async
+from app.router.default.models import ApiV1ListTablesResponse
+
+
+class AsyncDBClient:
+    """
+    AsyncDBClient is the asyncio counterpart of DBClient.
+
+    The queries go through the circuit breaker and the bulkhead of the backend, shared with the DBClient.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        bulkhead: Optional[Bulkhead] = None,
+    ):
+        self.config: dict = config
+        self.circuit_breaker = circuit_breaker
+        self.bulkhead = bulkhead
+        self.logger = logging.getLogger("db")
+        self.client: Union[AsyncMySQLClient, AsyncPostgreSQLClient] = (
+            self.build_postgresql_client()
+            if self.config["db"]["engine"].lower() == "postgresql"
+            else self.build_mysql_client()
+        )
+
+    async def open(self) -> None:
+        """Open the connection pool, connections are opened lazily when the database is not reachable yet"""
+        try:
+            await self.client.connect()
+        except AppDBConnectionError as ex:
+            self.logger.warning("cannot open the database connection pool", extra={"error": str(ex)})
+
+    async def disconnect(self) -> None:
+        await self.client.disconnect()
+
+    # This is a demo method
+    async def get_list_of_tables(
+        self,
+        limit: int,
+        after_id: Optional[int] = None,
+    ) -> ApiV1ListTablesResponse:
+        async with guarded_async(self.circuit_breaker, self.bulkhead):
+            return await self.client.get_list_of_tables(limit=limit, after_id=after_id)
+
+    def build_mysql_client(self) -> AsyncMySQLClient:
+        pool_cfg = self.config["db"]["mysql"].get("pool", {})
+        return AsyncMySQLClient(
+            cnx_args=MySQLConnectionArgs(
+                hostname=self.config["db"]["mysql"]["hostname"],
+                tcp_port=self.config["db"]["mysql"]["port"],
+                login=self.config["db"]["mysql"]["username"],
+                password=self.config["db"]["mysql"]["password"],
+                database=self.config["db"]["mysql"]["database"],
+                program=self.config["db"]["mysql"]["program"],
+            ),
+            logger=logging.getLogger("db.client"),
+            dry_run=self.config["db"]["dry_run"],
+            min_size=pool_cfg.get("min_size", 0),
+            max_size=pool_cfg.get("max_size", 10),
+        )
+
+    def build_postgresql_client(self) -> AsyncPostgreSQLClient:
+        pool_cfg = self.config["db"]["postgresql"].get("pool", {})
+        return AsyncPostgreSQLClient(
+            cnx_args=PostgreSQLConnectionArgs(
+                hostname=self.config["db"]["postgresql"]["hostname"],
+                tcp_port=self.config["db"]["postgresql"]["port"],
+                login=self.config["db"]["postgresql"]["username"],
+                password=self.config["db"]["postgresql"]["password"],
+                database=self.config["db"]["postgresql"]["database"],
+                program=self.config["db"]["postgresql"]["program"],
+            ),
+            logger=logging.getLogger("db.client"),
+            dry_run=self.config["db"]["dry_run"],
+            min_size=pool_cfg.get("min_size", 0),
+            max_size=pool_cfg.get("max_size", 10),
+        )
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0401,W0614,W0718
+from typing import Optional
+
+from app.db.mysql.async_connection import AsyncMySQLConnection
+from app.db.mysql.connection import MySQLConnectionArgs
+from app.exception import AppDBRetryableError
+from app.misc.pagination import paginate
+from app.misc.retry import async_retry, retry_budget
+from app.router.default.models import ApiV1ListTablesResponse, Table
+
+
+class AsyncMySQLClient(AsyncMySQLConnection):
+    def __init__(
+        self,
+        cnx_args: MySQLConnectionArgs,
+        logger,
+        dry_run: bool = False,
+        min_size: int = 0,
+        max_size: int = 10,
+    ):
+        self.dry_run = dry_run
+        super().__init__(cnx_args=cnx_args, logger=logger, min_size=min_size, max_size=max_size)
+
+    # This is a demo method
+    @async_retry(
+        exceptions=(AppDBRetryableError,),
+        tries=4,
+        delay=1,
+        max_delay=4,
+        backoff=2,
+        full_jitter=True,
+        budget=retry_budget,
+    )
+    async def get_list_of_tables(
+        self,
+        limit: int,
+        after_id: Optional[int] = None,
+    ) -> ApiV1ListTablesResponse:
+        # The commented code below is a placeholder for the actual code that will be implemented
+        #
+        # sql_query, sql_args = query_get_list_of_tables(limit + 1, after_id)
+        # rows = await self.select(sql_query, sql_args)
+        # tables, next_cursor = paginate([Table(**row) for row in rows], limit, key=lambda table: table.id)
+        # return ApiV1ListTablesResponse(tables=tables, next=next_cursor)
+
+        # This is a demo code
+        start = 0 if after_id is None else after_id + 1
+        tables = [Table(tableId=i, tableName=f"table{i}") for i in range(start, start + limit + 1)]
+        tables, next_cursor = paginate(tables, limit, key=lambda table: table.id)
+        return ApiV1ListTablesResponse(tables=tables, next=next_cursor)
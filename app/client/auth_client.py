@@ -1,22 +1,125 @@
+import threading
+from typing import Iterable, Optional
+
+from app.misc.cache import LRUCache
+from app.misc.jwks import get_jwks_url, jwks_key_store
+from app.misc.permissions_checker import decoded_token_cache
+
+# permission granting every operation
+ALL_OPERATIONS = "*"
+
+
+class UserAccess:
+    """
+    UserAccess is the full set of roles and permissions (operation ids) of a user.
+    """
+
+    def __init__(self, roles: Iterable[str] = (), permissions: Iterable[str] = ()):
+        self.roles = frozenset(roles)
+        self.permissions = frozenset(permissions)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.roles and not self.permissions
+
+    def has_permission(self, operation_id: str) -> bool:
+        return ALL_OPERATIONS in self.permissions or operation_id in self.permissions
+
+
 class AuthClient:
+    """
+    AuthClient checks the roles and permissions of the users.
+
+    The access of a user (roles and permissions) is fetched in one lookup, memoized for the duration
+    of the request and cached for ttl seconds (negative_ttl seconds for users without any access).
+    """
+
     def __init__(self, config: dict):
         self.config: dict = config
+        cache_cfg = config["auth"].get("permissions_cache", {})
+        self.cache: Optional[LRUCache] = (
+            LRUCache(max_size=cache_cfg.get("max_size", 10000)) if cache_cfg.get("enable") else None
+        )
+        self.ttl = cache_cfg.get("ttl", 60.0)
+        self.negative_ttl = cache_cfg.get("negative_ttl", 10.0)
+        self._stats_lock = threading.Lock()
+        self._stats = {"request_hits": 0, "hits": 0, "misses": 0}
+        if "token_cache" in config["auth"]:
+            decoded_token_cache.configure(**config["auth"]["token_cache"])
+
+        sso_cfg = config["auth"]["sso"]
+        self.verify_signature = bool(sso_cfg["enable"] and sso_cfg.get("verify_signature"))
+        if self.verify_signature:
+            jwks_cfg = {key: value for key, value in sso_cfg.get("jwks", {}).items() if key != "url"}
+            jwks_key_store.configure(url=get_jwks_url(sso_cfg), **jwks_cfg)
+
+    def open(self) -> None:
+        """Fetch the signing keys of the SSO and keep them fresh"""
+        if self.verify_signature:
+            jwks_key_store.start()
 
-    def user_has_admin_role(self, user_uuid) -> bool:
+    def close(self) -> None:
+        if self.verify_signature:
+            jwks_key_store.stop()
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats, size=len(self.cache) if self.cache is not None else 0)
+
+    def fetch_user_access(self, user_uuid) -> UserAccess:
+        """Fetch all the roles and permissions of a user (IdP / permission service)"""
+        return UserAccess(roles=["admin", "user"], permissions=[ALL_OPERATIONS])  # TODO: Mocked data
+
+    def get_user_access(self, user_uuid, request=None) -> UserAccess:
+        """Get the roles and permissions of a user, memoized for the request and cached"""
+        if not user_uuid:
+            return UserAccess()
+
+        memo = getattr(request.state, "user_access", None) if request is not None else None
+        if memo is not None and memo[0] == user_uuid:
+            self._incr("request_hits")
+            return memo[1]
+
+        access = self.cache.get(user_uuid) if self.cache is not None else None
+        if access is not None:
+            self._incr("hits")
+        else:
+            self._incr("misses")
+            access = self.fetch_user_access(user_uuid)
+            if self.cache is not None:
+                self.cache.set(user_uuid, access, self.negative_ttl if access.is_empty else self.ttl)
+
+        if request is not None:
+            request.state.user_access = (user_uuid, access)
+        return access
+
+    def invalidate(self, user_uuid=None) -> None:
+        """Forget the cached access of a user (roles or permissions changed), of all the users by default"""
+        if self.cache is None:
+            return
+
+        if user_uuid is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(user_uuid)
+
+    def user_has_admin_role(self, user_uuid, request=None) -> bool:
         """Check if the user has the admin role"""
-        user_roles = self.get_user_roles(user_uuid)
+        user_roles = self.get_user_roles(user_uuid, request=request)
         return "admin" in user_roles
 
-    def get_user_roles(self, user_uuid) -> list:
+    def get_user_roles(self, user_uuid, request=None) -> list:
         """Get the user roles"""
-        if not user_uuid:
-            return []
-
-        return ["admin", "user"]  # TODO: Mocked data
+        return sorted(self.get_user_access(user_uuid, request=request).roles)
 
     def user_has_permissions(self, user_uuid, operation_id, request, **kwargs) -> bool:  # noqa
         """Check if the user has permissions"""
         if not user_uuid or not operation_id:
             return False
 
-        return True  # TODO: Mocked data
+        return self.get_user_access(user_uuid, request=request).has_permission(operation_id)
+
+    def _incr(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
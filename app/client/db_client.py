@@ -1,56 +1,318 @@
+import contextlib
 import logging
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Type, TypeVar, Union
+
+import redis
 
 from app.client.mysql_client import MySQLClient
 from app.client.postgresql_client import PostgreSQLClient
+from app.client.sqlite_client import SQLiteClient
+from app.db.frame import group_stats
 from app.db.mysql.connection import MySQLConnectionArgs
+from app.db.mysql.pool import MySQLConnectionPool
+from app.db.pool import ConnectionPool
 from app.db.postgresql.connection import PostgreSQLConnectionArgs
-from app.router.default.models import ApiV1ListTablesResponse
+from app.db.postgresql.pool import PostgreSQLConnectionPool
+from app.db.replica import Replica, ReplicaSet
+from app.db.sqlite.connection import SQLiteConnectionArgs
+from app.exception import AppDBConnectionError, AppDBPoolExhaustedError, AppDBRetryableError, AppException
+from app.misc.cache import LRUCache, ReadThroughCache, RedisCache, cached
+from app.misc.circuit_breaker import Bulkhead, CircuitBreaker, guarded
+from app.router.default.models import ApiV1GetTableStatsResponse, ApiV1ListTablesResponse, Table, TableKindStats
+
+T = TypeVar("T")
 
 
 class DBClient:
     def __init__(self, config: dict):
         self.config: dict = config
         self.logger = logging.getLogger("db")
-        self.client = (
-            self.build_postgresql_client()
-            if self.config["db"]["engine"].lower() == "postgresql"
-            else self.build_mysql_client()
-        )
+        self.cache: Optional[ReadThroughCache] = self.build_cache()
+        # the dry run mode runs the queries on a local SQLite database
+        self.engine = "sqlite" if self.config["db"]["dry_run"] else self.config["db"]["engine"].lower()
+        self.client = self.build_client()
+        self.pool: Optional[ConnectionPool] = self.client.pool
+        engine_cfg = self.config["db"][self.engine]
+        keepalive_cfg = self.config["db"].get("keepalive", {})
+        if keepalive_cfg.get("enable") and self.pool is not None:
+            # the pinged connections must still be closed after idle_timeout seconds (see ConnectionPool.keepalive)
+            if keepalive_cfg["idle_threshold"] >= self.pool.idle_timeout:
+                raise ValueError("db.keepalive.idle_threshold must be lower than the pool idle_timeout")
+        backend = f"{self.engine}:{engine_cfg.get('hostname') or engine_cfg['database']}"
+        self.circuit_breaker: Optional[CircuitBreaker] = self.build_circuit_breaker(backend)
+        self.bulkhead: Optional[Bulkhead] = self.build_bulkhead(backend)
+        # read-only queries are sent to the replicas (if any)
+        self.replicas: Optional[ReplicaSet] = self.build_replicas()
+
+    def open(self) -> None:
+        """Open the connection pools (if any)"""
+        if self.engine == "sqlite":
+            # create and seed the database
+            self.client.connect()
+        if self.pool is not None:
+            self.pool.open(prewarm=self.config["db"][self.engine].get("pool", {}).get("prewarm"))
+        if self.replicas is not None:
+            self.replicas.open()
+
+    def keepalive(self) -> int:
+        """Ping the idle pooled connections before the server closes them, return the number of pinged ones"""
+        idle_threshold = self.config["db"]["keepalive"]["idle_threshold"]
+        pools = [self.pool] + ([replica.client.pool for replica in self.replicas.replicas] if self.replicas else [])
+        return sum(pool.keepalive(idle_threshold) for pool in pools if pool is not None)
 
     def disconnect(self) -> None:
         self.client.disconnect()
+        if self.pool is not None:
+            self.pool.close()
+        if self.replicas is not None:
+            self.replicas.disconnect()
+
+    def get_pool_stats(self) -> dict:
+        """Return the connection pool statistics (empty when pooling is disabled)"""
+        return self.pool.stats if self.pool is not None else {}
+
+    def get_cache_stats(self) -> dict:
+        """Return the query cache statistics (empty when caching is disabled)"""
+        return self.cache.stats if self.cache is not None else {}
+
+    def get_resilience_stats(self) -> dict:
+        """Return the circuit breaker and bulkhead statistics (empty when disabled)"""
+        return {
+            "circuit_breaker": self.circuit_breaker.stats if self.circuit_breaker is not None else {},
+            "bulkhead": self.bulkhead.stats if self.bulkhead is not None else {},
+        }
+
+    def get_replica_stats(self) -> dict:
+        """Return the read replicas statistics (empty when there is no replica)"""
+        return self.replicas.stats if self.replicas is not None else {}
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Run the enclosed queries through the bulkhead and the circuit breaker of the backend"""
+        with guarded(self.circuit_breaker, self.bulkhead):
+            yield
+
+    def guard_iter(self, iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Same as guard for a lazily consumed result.
+
+        The guard is entered at once, so that an open breaker or a full bulkhead fails the request
+        before the response starts, and is left when the iterator is exhausted or closed.
+        """
+
+        def iterate() -> Iterator[Optional[T]]:
+            with self.guard():
+                yield None
+                yield from iterable
+
+        iterator = iterate()
+        # run up to the first yield, inside the guard
+        next(iterator)
+        return iterator
+
+    def read(self, fn: Callable[[Any], T]) -> T:
+        """Call the read-only fn(client) on a replica (if any), falling back to the primary"""
+
+        def on_primary() -> T:
+            with self.guard(), self.client.checkout():
+                return fn(self.client)
+
+        if self.replicas is None:
+            return on_primary()
+
+        return self.replicas.read(fn, fallback=on_primary)
 
     # This is a demo method
+    @cached("get_list_of_tables", ApiV1ListTablesResponse)
     def get_list_of_tables(
         self,
         limit: int,
+        after_id: Optional[int] = None,
     ) -> ApiV1ListTablesResponse:
-        return self.client.get_list_of_tables(limit=limit)
-
-    def build_mysql_client(self) -> MySQLClient:
-        self.client = MySQLClient(
-            cnx_args=MySQLConnectionArgs(
-                hostname=self.config["db"]["mysql"]["hostname"],
-                tcp_port=self.config["db"]["mysql"]["port"],
-                login=self.config["db"]["mysql"]["username"],
-                password=self.config["db"]["mysql"]["password"],
-                database=self.config["db"]["mysql"]["database"],
-                program=self.config["db"]["mysql"]["program"],
-            ),
+        return self.read(lambda client: client.get_list_of_tables(limit=limit, after_id=after_id))
+
+    # This is a demo method
+    def iter_list_of_tables(
+        self,
+        limit: int,
+        batch_size: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> Iterator[List[Table]]:
+        """Yield the tables in batches, without loading the whole result in memory"""
+        if batch_size is None:
+            batch_size = self.config["db"].get("stream_batch_size", 1000)
+        return self.guard_iter(self.client.iter_list_of_tables(limit=limit, batch_size=batch_size, after_id=after_id))
+
+    # This is a demo method
+    def get_table_stats(self) -> ApiV1GetTableStatsResponse:
+        """Aggregate the table sizes by kind, the statistics are computed on the columns, not row by row"""
+        frame = self.read(lambda client: client.get_table_sizes())
+
+        stats = group_stats(frame, by="kind", column="pages", percentiles=(0.5, 0.95))
+        stats["tuples"] = frame.groupby("kind", sort=True)["tuples"].sum()
+        kinds = [
+            TableKindStats(
+                kind=kind,
+                count=row["count"],
+                pages=row["sum"],
+                pagesMean=row["mean"],
+                pagesP50=row["p50"],
+                pagesP95=row["p95"],
+                tuples=row["tuples"],
+            )
+            for kind, row in stats.to_dict("index").items()
+        ]
+        return ApiV1GetTableStatsResponse(count=len(frame), kinds=kinds)
+
+    def export_table(self, table_name: str, fmt: str = "csv") -> Iterator[Union[str, bytes]]:
+        """Yield a table dump produced by the COPY protocol"""
+        if not isinstance(self.client, PostgreSQLClient):
+            raise AppException(
+                status_code=501,
+                message="Table export is only supported by the PostgreSQL engine",
+                error_type="NotImplementedError",
+            )
+
+        return self.guard_iter(self.client.copy_out_stream(table=table_name, fmt=fmt, header=True))
+
+    def build_circuit_breaker(self, backend: str) -> Optional[CircuitBreaker]:
+        breaker_cfg = self.config["db"].get("circuit_breaker", {})
+        if not breaker_cfg.get("enable"):
+            return None
+
+        return CircuitBreaker(
+            name=backend,
+            failure_rate_threshold=breaker_cfg["failure_rate_threshold"],
+            minimum_calls=breaker_cfg["minimum_calls"],
+            window=breaker_cfg["window"],
+            open_timeout=breaker_cfg["open_timeout"],
+            half_open_max_calls=breaker_cfg["half_open_max_calls"],
+            # only the errors telling that the backend is unhealthy, not an exhausted local pool
+            exceptions=(AppDBConnectionError, AppDBRetryableError),
+            excluded_exceptions=(AppDBPoolExhaustedError,),
+            logger=self.logger,
+        )
+
+    def build_bulkhead(self, backend: str) -> Optional[Bulkhead]:
+        bulkhead_cfg = self.config["db"].get("bulkhead", {})
+        if not bulkhead_cfg.get("enable"):
+            return None
+
+        return Bulkhead(
+            name=backend,
+            max_concurrent=bulkhead_cfg["max_concurrent"],
+            max_wait=bulkhead_cfg["max_wait"],
+        )
+
+    def build_cache(self) -> Optional[ReadThroughCache]:
+        cache_cfg = self.config.get("cache", {})
+        if not cache_cfg.get("enable"):
+            return None
+
+        redis_cache = None
+        if cache_cfg["redis"]["url"]:
+            redis_cache = RedisCache(
+                redis_client=redis.Redis.from_url(cache_cfg["redis"]["url"]),
+                prefix=cache_cfg["redis"]["prefix"],
+            )
+
+        return ReadThroughCache(
+            lru=LRUCache(max_size=cache_cfg["lru_max_size"]),
+            redis_cache=redis_cache,
+            ttls=cache_cfg["ttl"],
+            logger=logging.getLogger("db.cache"),
+        )
+
+    def build_client(self, hostname: Optional[str] = None) -> Union[MySQLClient, PostgreSQLClient, SQLiteClient]:
+        if self.engine == "postgresql":
+            return self.build_postgresql_client(hostname)
+
+        if self.engine == "sqlite":
+            return self.build_sqlite_client()
+
+        return self.build_mysql_client(hostname)
+
+    def build_replicas(self) -> Optional[ReplicaSet]:
+        replicas_cfg = self.config["db"].get("replicas", {})
+        if not replicas_cfg.get("hostnames") or self.engine == "sqlite":
+            return None
+
+        replicas = []
+        for hostname in replicas_cfg["hostnames"]:
+            name = f"{self.engine}:{hostname}"
+            replicas.append(
+                Replica(
+                    name=name,
+                    client=self.build_client(hostname),
+                    circuit_breaker=self.build_circuit_breaker(name),
+                    bulkhead=self.build_bulkhead(name),
+                )
+            )
+
+        hedge_cfg = replicas_cfg.get("hedge", {})
+        return ReplicaSet(
+            replicas=replicas,
+            hedge=hedge_cfg.get("enable", False),
+            hedge_percentile=hedge_cfg.get("percentile", 0.95),
+            hedge_min_delay=hedge_cfg.get("min_delay", 0.01),
+            max_workers=hedge_cfg.get("max_workers", 16),
+            logger=self.logger,
+        )
+
+    def build_mysql_client(self, hostname: Optional[str] = None) -> MySQLClient:
+        cnx_args = MySQLConnectionArgs(
+            hostname=hostname or self.config["db"]["mysql"]["hostname"],
+            tcp_port=self.config["db"]["mysql"]["port"],
+            login=self.config["db"]["mysql"]["username"],
+            password=self.config["db"]["mysql"]["password"],
+            database=self.config["db"]["mysql"]["database"],
+            program=self.config["db"]["mysql"]["program"],
+        )
+        return MySQLClient(
+            cnx_args=cnx_args,
             logger=logging.getLogger("db.client"),
             dry_run=self.config["db"]["dry_run"],
+            pool=self.build_pool(MySQLConnectionPool, cnx_args, self.config["db"]["mysql"].get("pool", {})),
         )
 
-    def build_postgresql_client(self) -> PostgreSQLClient:
-        self.client = PostgreSQLClient(
-            cnx_args=PostgreSQLConnectionArgs(
-                hostname=self.config["db"]["postgresql"]["hostname"],
-                tcp_port=self.config["db"]["postgresql"]["port"],
-                login=self.config["db"]["postgresql"]["username"],
-                password=self.config["db"]["postgresql"]["password"],
-                database=self.config["db"]["postgresql"]["database"],
-                program=self.config["db"]["postgresql"]["program"],
+    def build_postgresql_client(self, hostname: Optional[str] = None) -> PostgreSQLClient:
+        cnx_args = PostgreSQLConnectionArgs(
+            hostname=hostname or self.config["db"]["postgresql"]["hostname"],
+            tcp_port=self.config["db"]["postgresql"]["port"],
+            login=self.config["db"]["postgresql"]["username"],
+            password=self.config["db"]["postgresql"]["password"],
+            database=self.config["db"]["postgresql"]["database"],
+            program=self.config["db"]["postgresql"]["program"],
+        )
+        return PostgreSQLClient(
+            cnx_args=cnx_args,
+            logger=logging.getLogger("db.client"),
+            dry_run=self.config["db"]["dry_run"],
+            pool=self.build_pool(PostgreSQLConnectionPool, cnx_args, self.config["db"]["postgresql"].get("pool", {})),
+        )
+
+    def build_sqlite_client(self) -> SQLiteClient:
+        return SQLiteClient(
+            cnx_args=SQLiteConnectionArgs(
+                database=self.config["db"]["sqlite"]["database"],
+                seed_rows=self.config["db"]["sqlite"]["seed_rows"],
             ),
             logger=logging.getLogger("db.client"),
             dry_run=self.config["db"]["dry_run"],
         )
+
+    @staticmethod
+    def build_pool(pool_class: Type[ConnectionPool], cnx_args, pool_cfg: dict) -> Optional[ConnectionPool]:
+        if not pool_cfg.get("enable"):
+            return None
+
+        return pool_class(
+            cnx_args=cnx_args,
+            min_size=pool_cfg["min_size"],
+            max_size=pool_cfg["max_size"],
+            idle_timeout=pool_cfg["idle_timeout"],
+            max_lifetime=pool_cfg["max_lifetime"],
+            borrow_timeout=pool_cfg["borrow_timeout"],
+            validation_interval=pool_cfg.get("validation_interval"),
+            logger=logging.getLogger("db.pool"),
+        )
@@ -6,30 +6,92 @@
 # from uuid import UUID, uuid4
 
 # from pymysql.cursors import SSCursor, SSDictCursor
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
 from app.db.mysql.connection import MySQLConnection, MySQLConnectionArgs
+from app.db.mysql.pool import MySQLConnectionPool
 from app.exception import AppDBRetryableError
-from app.misc.retry import retry
+from app.misc.pagination import paginate
+from app.misc.retry import retry, retry_budget
 from app.router.default.models import ApiV1ListTablesResponse, Table
 
 
 class MySQLClient(MySQLConnection):
-    def __init__(self, cnx_args: MySQLConnectionArgs, logger, dry_run: bool = False):
+    def __init__(
+        self,
+        cnx_args: MySQLConnectionArgs,
+        logger,
+        dry_run: bool = False,
+        pool: Optional[MySQLConnectionPool] = None,
+    ):
         self.dry_run = dry_run
-        super().__init__(cnx_args=cnx_args, logger=logger)
+        super().__init__(cnx_args=cnx_args, logger=logger, pool=pool)
 
     # This is a demo method
-    @retry(exceptions=(AppDBRetryableError,), tries=4, delay=1, max_delay=4, backoff=2)
+    @retry(
+        exceptions=(AppDBRetryableError,),
+        tries=4,
+        delay=1,
+        max_delay=4,
+        backoff=2,
+        full_jitter=True,
+        budget=retry_budget,
+    )
     def get_list_of_tables(
         self,
         limit: int,
+        after_id: Optional[int] = None,
     ) -> ApiV1ListTablesResponse:
         # The commented code below is a placeholder for the actual code that will be implemented
         #
-        # sql_query, sql_args = query_get_list_of_tables(limit)
+        # sql_query, sql_args = query_get_list_of_tables(limit + 1, after_id)
         # rows = self.select(sql_query, sql_args, False, SSDictCursor)
-        # tables = [Table(**row) for row in rows]
-        # return ApiV1ListTablesResponse(tables=tables)
+        # tables, next_cursor = paginate([Table(**row) for row in rows], limit, key=lambda table: table.id)
+        # return ApiV1ListTablesResponse(tables=tables, next=next_cursor)
+
+        # This is a demo code
+        start = 0 if after_id is None else after_id + 1
+        tables = [Table(tableId=i, tableName=f"table{i}") for i in range(start, start + limit + 1)]
+        tables, next_cursor = paginate(tables, limit, key=lambda table: table.id)
+        return ApiV1ListTablesResponse(tables=tables, next=next_cursor)
+
+    # This is a demo method
+    def iter_list_of_tables(
+        self,
+        limit: int,
+        batch_size: int = 1000,
+        after_id: Optional[int] = None,
+    ) -> Iterator[List[Table]]:
+        # The commented code below is a placeholder for the actual code that will be implemented
+        #
+        # sql_query, sql_args = query_get_list_of_tables(limit, after_id)
+        # for rows in self.select_stream(sql_query, sql_args, batch_size, SSDictCursor):
+        #     yield [Table(**row) for row in rows]
+
+        # This is a demo code
+        first = 0 if after_id is None else after_id + 1
+        for start in range(first, first + limit, batch_size):
+            end = min(start + batch_size, first + limit)
+            yield [Table(tableId=i, tableName=f"table{i}") for i in range(start, end)]
+
+    # This is a demo method
+    def get_table_sizes(self) -> pd.DataFrame:
+        """Return the kind, number of pages and estimated number of rows of the tables, one row per table"""
+        # The commented code below is a placeholder for the actual code that will be implemented
+        #
+        # return self.select_frame(query_registry.get(QUERY_TABLE_SIZES).sql)
 
         # This is a demo code
-        tables = [Table(tableId=i, tableName=f"table{i}") for i in range(limit)]
-        return ApiV1ListTablesResponse(tables=tables)
+        table_ids = np.arange(1000)
+        pages = table_ids * 7 % 100
+        return pd.DataFrame(
+            {
+                "table_id": pd.array(table_ids, dtype="Int64"),
+                "kind": pd.array(np.array(list("rivS"))[table_ids % 4], dtype="string"),
+                "pages": pd.array(pages, dtype="Int64"),
+                "tuples": pd.array(pages * 50.0, dtype="Float64"),
+            }
+        )
@@ -5,31 +5,70 @@
 # from typing import List, Optional
 # from uuid import UUID, uuid4
 
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
 from app.db.postgresql.connection import PostgreSQLConnection, PostgreSQLConnectionArgs
+from app.db.postgresql.pool import PostgreSQLConnectionPool
 from app.exception.db import AppDBRetryableError
-from app.misc.retry import retry
+from app.misc.pagination import paginate
+from app.misc.retry import retry, retry_budget
 from app.router.default.models import ApiV1ListTablesResponse, Table
-from app.sql.queries import query_get_list_of_tables
+from app.sql.queries import QUERY_TABLE_SIZES, named_query_get_list_of_tables, query_get_list_of_tables, query_registry
 
 
 class PostgreSQLClient(PostgreSQLConnection):
-    def __init__(self, cnx_args: PostgreSQLConnectionArgs, logger, dry_run: bool = False):
+    def __init__(
+        self,
+        cnx_args: PostgreSQLConnectionArgs,
+        logger,
+        dry_run: bool = False,
+        pool: Optional[PostgreSQLConnectionPool] = None,
+    ):
         self.dry_run = dry_run
-        super().__init__(cnx_args=cnx_args, logger=logger)
+        super().__init__(cnx_args=cnx_args, logger=logger, pool=pool)
 
     # This is a demo method
-    @retry(exceptions=(AppDBRetryableError,), tries=4, delay=1, max_delay=4, backoff=2)
+    @retry(
+        exceptions=(AppDBRetryableError,),
+        tries=4,
+        delay=1,
+        max_delay=4,
+        backoff=2,
+        full_jitter=True,
+        budget=retry_budget,
+    )
     def get_list_of_tables(
         self,
         limit: int,
+        after_id: Optional[int] = None,
     ) -> ApiV1ListTablesResponse:
         # The commented code below is a placeholder for the actual code that will be implemented
         #
-        sql_query, sql_args = query_get_list_of_tables(limit)
-        rows = self.select(sql_query, sql_args, auto_close=False, cursor_args={})
+        # fetch one extra row to know whether there is a next page
+        query_name, sql_args = named_query_get_list_of_tables(limit + 1, after_id)
+        rows = self.select_prepared(query_name, sql_args)
         tables = [Table(tableId=tableId, tableName=tableName) for tableId, tableName in rows]
-        return ApiV1ListTablesResponse(tables=tables)
+        tables, next_cursor = paginate(tables, limit, key=lambda table: table.id)
+        return ApiV1ListTablesResponse(tables=tables, next=next_cursor)
 
         # This is a demo code
         # tables = [Table(tableId=i, tableName=f"table{i}") for i in range(limit)]
         # return ApiV1ListTablesResponse(tables=tables)
+
+    # This is a demo method
+    def iter_list_of_tables(
+        self,
+        limit: int,
+        batch_size: int = 1000,
+        after_id: Optional[int] = None,
+    ) -> Iterator[List[Table]]:
+        sql_query, sql_args = query_get_list_of_tables(limit, after_id)
+        for rows in self.select_stream(sql_query, sql_args, batch_size=batch_size):
+            yield [Table(tableId=tableId, tableName=tableName) for tableId, tableName in rows]
+
+    # This is a demo method
+    def get_table_sizes(self) -> pd.DataFrame:
+        """Return the kind, number of pages and estimated number of rows of the tables, one row per table"""
+        return self.select_frame(query_registry.get(QUERY_TABLE_SIZES).sql)
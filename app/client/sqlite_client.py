@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from app.db.sqlite.connection import SQLiteConnection, SQLiteConnectionArgs
+from app.exception import AppDBRetryableError
+from app.misc.pagination import paginate
+from app.misc.retry import retry
+from app.router.default.models import ApiV1ListTablesResponse, Table
+from app.sql.queries import QUERY_TABLE_SIZES, named_query_get_list_of_tables, query_get_list_of_tables, query_registry
+
+
+class SQLiteClient(SQLiteConnection):
+    def __init__(
+        self,
+        cnx_args: SQLiteConnectionArgs,
+        logger,
+        dry_run: bool = True,
+        pool=None,
+    ):
+        self.dry_run = dry_run
+        super().__init__(cnx_args=cnx_args, logger=logger, pool=pool)
+
+    # This is a demo method
+    @retry(exceptions=(AppDBRetryableError,), tries=4, delay=0.1, max_delay=1, backoff=2)
+    def get_list_of_tables(
+        self,
+        limit: int,
+        after_id: Optional[int] = None,
+    ) -> ApiV1ListTablesResponse:
+        # fetch one extra row to know whether there is a next page
+        query_name, sql_args = named_query_get_list_of_tables(limit + 1, after_id)
+        rows = self.select_prepared(query_name, sql_args)
+        tables = [Table(tableId=tableId, tableName=tableName) for tableId, tableName in rows]
+        tables, next_cursor = paginate(tables, limit, key=lambda table: table.id)
+        return ApiV1ListTablesResponse(tables=tables, next=next_cursor)
+
+    # This is a demo method
+    def iter_list_of_tables(
+        self,
+        limit: int,
+        batch_size: int = 1000,
+        after_id: Optional[int] = None,
+    ) -> Iterator[List[Table]]:
+        sql_query, sql_args = query_get_list_of_tables(limit, after_id)
+        for rows in self.select_stream(sql_query, sql_args, batch_size=batch_size):
+            yield [Table(tableId=tableId, tableName=tableName) for tableId, tableName in rows]
+
+    # This is a demo method
+    def get_table_sizes(self) -> pd.DataFrame:
+        """Return the kind, number of pages and estimated number of rows of the tables, one row per table"""
+        return self.select_frame(query_registry.get(QUERY_TABLE_SIZES).sql)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+
+def rows_to_frame(
+    rows: Sequence[Sequence], columns: List[str], dtypes: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    Build a columnar DataFrame from the rows of a query.
+
+    The columns of dtypes (typically derived from the column types of the cursor description) are cast,
+    the types of the other columns are inferred, using the pandas nullable types (NULL becomes NA).
+    """
+    frame = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    if dtypes:
+        frame = frame.astype({column: dtype for column, dtype in dtypes.items() if column in frame.columns})
+
+    return frame.convert_dtypes()
+
+
+def group_stats(
+    frame: pd.DataFrame,
+    by: str,
+    column: str,
+    percentiles: Sequence[float] = (0.5, 0.95),
+) -> pd.DataFrame:
+    """
+    Return, for each value of the by column, the number of rows and the sum, mean and percentiles of column.
+
+    The result is indexed by the by column, percentile columns are named p50, p95...
+    """
+    grouped = frame.groupby(by, sort=True)[column]
+    stats = grouped.agg(["count", "sum", "mean"])
+    if percentiles:
+        quantiles = grouped.quantile(list(percentiles)).unstack()
+        quantiles.columns = [f"p{round(percentile * 100):d}" for percentile in quantiles.columns]
+        stats = stats.join(quantiles)
+
+    return stats
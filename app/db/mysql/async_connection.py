@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0718
+
+import contextlib
+import uuid
+from typing import Any, AsyncIterator, List, Optional, Tuple, Type, Union
+
+import aiomysql
+import pymysql
+
+from app.db.mysql.connection import MySQLConnectionArgs, is_statement_timeout
+from app.exception import AppDBConnectionError, AppDBError, AppDBRetryableError, AppDBTimeoutError, AppException
+from app.exception.mysql import ERROR_CANNOT_EXECUTE_MYSQL_COMMAND, MYSQL_ERRORS, MYSQL_RECOVERABLE_ERRORS
+from app.misc.deadline import get_remaining_time
+
+
+@contextlib.asynccontextmanager
+async def statement_timeout(connection: aiomysql.Connection, timeout: Optional[float]) -> AsyncIterator[None]:
+    """Bound the SELECT statements of the block by the session max_execution_time"""
+    if timeout is None:
+        yield
+        return
+
+    # max_execution_time only applies to read-only SELECT statements
+    async with connection.cursor() as cursor:
+        await cursor.execute("SET SESSION max_execution_time = %s", (max(int(timeout * 1000), 1),))
+    try:
+        yield
+    finally:
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SET SESSION max_execution_time = DEFAULT")
+        except Exception:
+            # a closed connection is dropped by the pool instead of keeping the timeout
+            connection.close()
+
+
+class AsyncMySQLConnection:
+    """
+    AsyncMySQLConnection runs queries on an aiomysql connection pool.
+
+    Each query borrows a connection for its own duration, so concurrency is bounded
+    by the pool size instead of the threadpool. Like MySQLConnection, the queries are bounded
+    by the deadline of the request (see app.misc.deadline).
+    """
+
+    def __init__(self, cnx_args: MySQLConnectionArgs, logger, min_size: int = 0, max_size: int = 10):
+        self._cnx_args = cnx_args
+        self.logger = logger
+        self.session_id = str(uuid.uuid1())
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool: Optional[aiomysql.Pool] = None
+
+    async def connect(self) -> None:
+        """Create the connection pool"""
+        if self.pool is not None:
+            return
+
+        try:
+            self.pool = await aiomysql.create_pool(
+                minsize=self.min_size,
+                maxsize=self.max_size,
+                user=self._cnx_args.login,
+                host=self._cnx_args.hostname,
+                port=self._cnx_args.tcp_port,
+                password=self._cnx_args.password,
+                db=self._cnx_args.database,
+                program_name=self._cnx_args.program,
+                charset="utf8mb4",
+                cursorclass=aiomysql.DictCursor,
+            )
+        except pymysql.err.OperationalError as ex:
+            raise AppDBConnectionError("Can't connect to MySql", ex=ex) from ex
+
+    async def disconnect(self) -> None:
+        """Close the connection pool"""
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            pool.close()
+            await pool.wait_closed()
+
+    async def select(
+        self,
+        sql_req: str,
+        params=None,
+        cursor_class: Type[aiomysql.Cursor] = None,
+    ) -> List[Union[dict, tuple]]:
+        await self.connect()
+        remaining_time = get_remaining_time()
+        try:
+            async with self.pool.acquire() as connection:
+                async with statement_timeout(connection, self._check_deadline(remaining_time)):
+                    async with connection.cursor(cursor_class) as cursor:
+                        await cursor.execute(sql_req, params or [])
+                        return await cursor.fetchall()
+        except Exception as ex:
+            raise self._to_app_exception(ex, sql_req, params, remaining_time) from ex
+
+    async def execute(
+        self,
+        sql_req: str,
+        params=None,
+        commit: bool = True,
+        cursor_class: Type[aiomysql.Cursor] = None,
+    ) -> Tuple[int, Any]:
+        await self.connect()
+        remaining_time = get_remaining_time()
+        try:
+            async with self.pool.acquire() as connection:
+                async with statement_timeout(connection, self._check_deadline(remaining_time)):
+                    async with connection.cursor(cursor_class) as cursor:
+                        try:
+                            number_of_affected_rows = await cursor.execute(sql_req, params or [])
+                            if commit:
+                                await connection.commit()
+                        except Exception:
+                            await connection.rollback()
+                            raise
+                        return number_of_affected_rows, cursor.lastrowid
+        except Exception as ex:
+            raise self._to_app_exception(ex, sql_req, params, remaining_time) from ex
+
+    @staticmethod
+    def _check_deadline(remaining_time: Optional[float]) -> Optional[float]:
+        if remaining_time is not None and remaining_time <= 0:
+            raise AppDBTimeoutError(message="Request deadline exceeded before the query")
+        return remaining_time
+
+    def _to_app_exception(self, ex: Exception, sql_req: str, params, timeout: Optional[float]) -> AppException:
+        if isinstance(ex, AppException):
+            return ex
+
+        mysql_error_code = ex.args[0] if isinstance(ex, pymysql.err.Error) and ex.args else None
+        self.logger.error(
+            str(ex),
+            extra={
+                "sql_request": sql_req,
+                "sql_params": str(params),
+                "mysql_error_code": mysql_error_code,
+            },
+        )
+
+        if timeout is not None and is_statement_timeout(ex):
+            return AppDBTimeoutError(message=f"MySQL query exceeded the {timeout:.3f}s statement timeout", ex=ex)
+
+        if mysql_error_code in MYSQL_RECOVERABLE_ERRORS:
+            return AppDBRetryableError(
+                message=ERROR_CANNOT_EXECUTE_MYSQL_COMMAND,
+                error_code=mysql_error_code,
+                ex=ex,
+                error_type=MYSQL_ERRORS.get(mysql_error_code, "MySQLError"),
+            )
+
+        if isinstance(ex, pymysql.err.Error):
+            # do not retry on this kind of error
+            return AppDBError(
+                message=ERROR_CANNOT_EXECUTE_MYSQL_COMMAND,
+                error_code=mysql_error_code,
+                ex=ex,
+                error_type=MYSQL_ERRORS.get(mysql_error_code, "MySQLError"),
+            )
+
+        return AppException(message=str(ex), error_type=str(type(ex)), ex=ex)
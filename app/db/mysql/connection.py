@@ -2,15 +2,43 @@
 # pylint: disable=W0718,R0912,R0915
 
 import uuid
-from typing import Any, Dict, List, Optional, Tuple, Type, Union
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
 
+import pandas as pd
 import pymysql
-from pymysql.cursors import Cursor
+from pymysql.cursors import Cursor, SSDictCursor
 from pymysql.err import OperationalError
 
-from app.db.mysql.helper import get_mysql_cnx, sql_execute, sql_select
-from app.exception import AppDBConnectionError, AppDBError, AppDBRetryableError, AppException
-from app.exception.mysql import ERROR_CANNOT_EXECUTE_MYSQL_COMMAND, MYSQL_ERRORS, MYSQL_RECOVERABLE_ERRORS
+from app.db.mysql.helper import (
+    get_mysql_cnx,
+    sql_execute,
+    sql_execute_many,
+    sql_select,
+    sql_select_frame,
+    sql_select_stream,
+)
+from app.db.mysql.pool import MySQLConnectionPool
+from app.db.pool import Checkout
+from app.db.stats import query_stats
+from app.exception import (
+    AppDBConnectionError,
+    AppDBError,
+    AppDBQueryCancelledError,
+    AppDBRetryableError,
+    AppDBTimeoutError,
+    AppException,
+)
+from app.exception.mysql import (
+    ERROR_CANNOT_EXECUTE_MYSQL_COMMAND,
+    MYSQL_ERROR_QUERY_TIMEOUT,
+    MYSQL_ERRORS,
+    MYSQL_RECOVERABLE_ERRORS,
+)
+from app.misc.cancellation import is_cancelled, on_cancel
+from app.misc.deadline import get_remaining_time
+from app.sql.queries import query_registry
 
 
 class MySQLConnectionArgs:
@@ -47,12 +75,25 @@ class MySQLConnectionArgs:
         }
 
 
+def is_statement_timeout(ex: Optional[BaseException]) -> bool:
+    """Return True if the error (or one of its causes) is a query interrupted by max_execution_time"""
+    while ex is not None:
+        if getattr(ex, "error_code", None) == MYSQL_ERROR_QUERY_TIMEOUT:
+            return True
+        if isinstance(ex, pymysql.err.Error) and ex.args and ex.args[0] == MYSQL_ERROR_QUERY_TIMEOUT:
+            return True
+        ex = getattr(ex, "ex", None) or ex.__cause__
+    return False
+
+
 class MySQLConnection:
-    def __init__(self, cnx_args: MySQLConnectionArgs, logger):
+    def __init__(self, cnx_args: MySQLConnectionArgs, logger, pool: Optional[MySQLConnectionPool] = None):
         self._cnx_args = cnx_args
         self.logger = logger
         self.session_id = str(uuid.uuid1())
         self.sql_cnx = None
+        self.pool = pool
+        self._checkout: ContextVar[Optional[Checkout]] = ContextVar(f"mysql_checkout_{self.session_id}", default=None)
 
     def __enter__(self):
         self.connect()
@@ -78,8 +119,79 @@ class MySQLConnection:
     def get_mysql_cnx(self):
         return get_mysql_cnx(self._cnx_args.as_dict)
 
+    @contextmanager
+    def checkout(self):
+        """
+        Borrow a pooled connection for the duration of the block (re-entrant).
+
+        The running query is cancelled when the current request is cancelled (see app.misc.cancellation).
+        """
+        if self._checkout.get() is not None:
+            yield self
+            return
+
+        holder = Checkout()
+        token = self._checkout.set(holder)
+        try:
+            with on_cancel(lambda: self.cancel_query(holder)):
+                try:
+                    yield self
+                except Exception as ex:
+                    if is_cancelled() and not isinstance(ex, AppDBQueryCancelledError):
+                        raise AppDBQueryCancelledError(message="MySQL query cancelled", ex=ex) from ex
+                    if holder.statement_timeout is not None and is_statement_timeout(ex):
+                        raise AppDBTimeoutError(
+                            message=f"MySQL query exceeded the {holder.statement_timeout:.3f}s statement timeout",
+                            ex=ex,
+                        ) from ex
+                    raise
+        finally:
+            self._checkout.reset(token)
+            if holder.pooled is not None:
+                discard = False
+                if holder.statement_timeout is not None:
+                    try:
+                        self.reset_statement_timeout(holder.pooled.raw)
+                    except Exception:
+                        discard = True
+                self.pool.release(holder.pooled, discard=discard)
+
+    def cancel_query(self, holder: Checkout) -> None:
+        """Cancel the query running on the connection of a checkout (called from another thread)"""
+        raw = holder.pooled.raw if holder.pooled is not None else (self.sql_cnx if self.pool is None else None)
+        if raw is None or not raw.open:
+            return
+
+        # the query is killed from a side connection, the connection itself remains usable
+        side_cnx = self.get_mysql_cnx()
+        try:
+            with side_cnx.cursor() as cursor:
+                cursor.execute("KILL QUERY %s", (raw.thread_id(),))
+        finally:
+            side_cnx.close()
+
+    @staticmethod
+    def set_statement_timeout(raw, timeout: float) -> None:
+        # max_execution_time only applies to read-only SELECT statements
+        with raw.cursor() as cursor:
+            cursor.execute("SET SESSION max_execution_time = %s", (max(int(timeout * 1000), 1),))
+
+    @staticmethod
+    def reset_statement_timeout(raw) -> None:
+        with raw.cursor() as cursor:
+            cursor.execute("SET SESSION max_execution_time = DEFAULT")
+
     def disconnect(self) -> None:
         """Disconnect form a mysql server"""
+        if self.pool is not None:
+            # discard the borrowed connection, the next access borrows a fresh one
+            holder = self._checkout.get()
+            if holder is not None and holder.pooled is not None:
+                self.pool.release(holder.pooled, discard=True)
+                holder.pooled = None
+                holder.statement_timeout = None
+            return
+
         if self.sql_cnx:
             try:
                 #  saw behaviour when it failed to send logout cmd due
@@ -116,6 +228,21 @@ class MySQLConnection:
 
     @property
     def cnx(self):
+        if self.pool is not None:
+            holder = self._checkout.get()
+            if holder is None:
+                raise AppDBConnectionError(message="No connection checked out from the MySQL pool")
+            if holder.pooled is None:
+                remaining_time = get_remaining_time()
+                if remaining_time is not None and remaining_time <= 0:
+                    raise AppDBTimeoutError(message="Request deadline exceeded before the query")
+                holder.pooled = self.pool.acquire()
+                if remaining_time is not None:
+                    # bound the queries of the request by its deadline
+                    self.set_statement_timeout(holder.pooled.raw, remaining_time)
+                    holder.statement_timeout = remaining_time
+            return holder.pooled.raw
+
         if not self.sql_cnx:
             self.connect()
 
@@ -128,7 +255,55 @@ class MySQLConnection:
         auto_close: bool = True,
         cursor_class: Type[Cursor] = None,
     ) -> List[Union[dict, tuple]]:
-        return sql_select(self.cnx, sql_req, params, auto_close, cursor_class)
+        # pooled connections are returned to the pool instead of being closed
+        return sql_select(self.cnx, sql_req, params, auto_close and self.pool is None, cursor_class)
+
+    def select_frame(self, sql_req: str, params=None, dtypes: Optional[dict] = None) -> pd.DataFrame:
+        """
+        Return the result of a select as a DataFrame, the columns are typed from the MySQL column types
+        (dtypes overrides the type of some columns).
+        """
+        return sql_select_frame(self.cnx, sql_req, params, dtypes)
+
+    def select_prepared(self, name: str, params=None, cursor_class: Type[Cursor] = None) -> List[Union[dict, tuple]]:
+        """
+        Run a query of the registry (app.sql.queries) by name.
+
+        PyMySQL has no server side prepared statements (binary protocol), and a SQL level PREPARE/EXECUTE
+        costs more round trips than it saves, so the statement text is sent with the params.
+        """
+        return self.select(query_registry.get(name).sql, params, auto_close=False, cursor_class=cursor_class)
+
+    def select_stream(
+        self,
+        sql_req: str,
+        params=None,
+        batch_size: int = 1000,
+        cursor_class: Type[Cursor] = SSDictCursor,
+    ) -> Iterator[List[Union[dict, tuple]]]:
+        """
+        Yield the rows of a select in batches, rows are read from the server as they are consumed.
+
+        A stream closed before its end closes its connection rather than reading the rows left.
+        """
+        if self.pool is None:
+            try:
+                yield from sql_select_stream(self.cnx, sql_req, params, batch_size, cursor_class)
+            except GeneratorExit:
+                self.disconnect()
+                raise
+            return
+
+        # the generator may be resumed from different contexts (threads), so it owns its connection
+        pooled = self.pool.acquire()
+        failed = False
+        try:
+            yield from sql_select_stream(pooled.raw, sql_req, params, batch_size, cursor_class)
+        except (Exception, GeneratorExit):
+            failed = True
+            raise
+        finally:
+            self.pool.release(pooled, discard=failed)
 
     def execute(
         self,
@@ -142,7 +317,7 @@ class MySQLConnection:
             connection=self.cnx,
             sql_req=sql_req,
             params=params,
-            auto_close=auto_close,
+            auto_close=auto_close and self.pool is None,
             commit=commit,
             cursor_class=cursor_class,
         )
@@ -155,8 +330,10 @@ class MySQLConnection:
         try:
             connection = self.cnx
             cursor = connection.cursor(cursor_class)
-            cursor.execute(sql_req, params)
-            result = cursor.fetchall()
+            with query_stats.measure(sql_req) as timer:
+                cursor.execute(sql_req, params)
+                result = cursor.fetchall()
+                timer.set_result(result)
             cursor.close()
             return result
         except Exception as ex:
@@ -227,7 +404,8 @@ class MySQLConnection:
             connection = self.cnx
             cursor = connection.cursor(cursor_class)
             try:
-                number_of_affected_rows = cursor.execute(sql_req, params)
+                with query_stats.measure(sql_req) as timer:
+                    number_of_affected_rows = timer.rows = cursor.execute(sql_req, params)
             except pymysql.err.Warning as ex:
                 self.logger.warning(str(ex), extra={"sql_request": sql_req, "sql_params": str(params)})
 
@@ -301,6 +479,46 @@ class MySQLConnection:
 
             raise AppException(message=str(ex), error_type=str(type(ex)), ex=ex) from ex
 
+    def execute_many(
+        self,
+        sql_req: str,
+        params_seq: Iterable[Union[List, Tuple, Dict]],
+        batch_size: int = 1000,
+        commit: bool = True,
+        cursor_class: Type[Cursor] = Cursor,
+    ) -> List[int]:
+        """
+        Bulk write: execute sql_req for each parameter set, as multi-row statements of batch_size rows.
+
+        Each batch is committed on its own, so on failure the previous batches stay committed.
+
+        :returns: the number of affected rows of each batch.
+        """
+        try:
+            return sql_execute_many(self.cnx, sql_req, params_seq, batch_size, commit, cursor_class)
+        except pymysql.err.Error as ex:
+            mysql_error_code = ex.args[0] if ex.args else None
+            self.logger.error(str(ex), extra={"sql_request": sql_req, "mysql_error_code": mysql_error_code})
+            try:
+                self.disconnect()
+            except Exception:
+                pass
+
+            if mysql_error_code in MYSQL_RECOVERABLE_ERRORS:
+                raise AppDBRetryableError(
+                    message=ERROR_CANNOT_EXECUTE_MYSQL_COMMAND,
+                    error_code=mysql_error_code,
+                    ex=ex,
+                    error_type=MYSQL_ERRORS.get(mysql_error_code, "MySQLError"),
+                ) from ex
+
+            raise AppDBError(
+                message=ERROR_CANNOT_EXECUTE_MYSQL_COMMAND,
+                error_code=mysql_error_code,
+                ex=ex,
+                error_type=MYSQL_ERRORS.get(mysql_error_code, "MySQLError"),
+            ) from ex
+
     def rollback(self):
         self.cnx.rollback()
 
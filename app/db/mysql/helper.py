@@ -1,10 +1,30 @@
 # -*- coding: utf-8 -*-
 
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 
+import pandas as pd
 import pymysql
+from pymysql.constants import FIELD_TYPE
 
+from app.db.frame import rows_to_frame
+from app.db.stats import query_stats
 from app.exception.mysql import MYSQL_RECOVERABLE_ERRORS
+from app.misc.utils import chunked
+
+# DataFrame dtype of the MySQL column types, the other types are inferred from the values
+MYSQL_DTYPES = {
+    FIELD_TYPE.TINY: "Int64",
+    FIELD_TYPE.SHORT: "Int64",
+    FIELD_TYPE.LONG: "Int64",
+    FIELD_TYPE.INT24: "Int64",
+    FIELD_TYPE.LONGLONG: "Int64",
+    FIELD_TYPE.YEAR: "Int64",
+    FIELD_TYPE.FLOAT: "Float32",
+    FIELD_TYPE.DOUBLE: "Float64",
+    FIELD_TYPE.VARCHAR: "string",
+    FIELD_TYPE.VAR_STRING: "string",
+    FIELD_TYPE.STRING: "string",
+}
 
 
 def get_mysql_cnx(config: dict):
@@ -16,6 +36,7 @@ def get_mysql_cnx(config: dict):
         db=config["database"],
         program_name=config["program"],
         charset="utf8mb4",
+        connect_timeout=config.get("connect_timeout", 10),
         cursorclass=pymysql.cursors.DictCursor,
     )
 
@@ -33,8 +54,11 @@ def sql_select(
         with connection.cursor(cursor_class) as cursor:
             if params is None:
                 params = []
-            cursor.execute(sql_req, params)
-            return cursor.fetchall()
+            with query_stats.measure(sql_req) as timer:
+                cursor.execute(sql_req, params)
+                result = cursor.fetchall()
+                timer.set_result(result)
+            return result
     except pymysql.err.InterfaceError:
         # force close connection
         connection.close()
@@ -88,7 +112,8 @@ def sql_execute(
         with connection.cursor(cursor_class) as cursor:
             if params is None:
                 params = []
-            result = cursor.execute(sql_req, params)
+            with query_stats.measure(sql_req) as timer:
+                result = timer.rows = cursor.execute(sql_req, params)
             if commit:
                 connection.commit()
 
@@ -115,3 +140,86 @@ def sql_execute(
     finally:
         if auto_close:
             connection.close()
+
+
+def sql_select_stream(
+    connection: pymysql.connections.Connection,
+    sql_req: str,
+    params: Optional[List] = None,
+    batch_size: int = 1000,
+    cursor_class: pymysql.cursors.Cursor = pymysql.cursors.SSDictCursor,
+) -> Iterator[List]:
+    """
+    Execute a select with an unbuffered (server side) cursor and yield the rows in batches.
+
+    When the generator is closed before the end of the result, the connection is closed.
+    """
+    cursor = connection.cursor(cursor_class)
+    try:
+        if params is None:
+            params = []
+        cursor.execute(sql_req, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    except GeneratorExit:
+        # closing an unbuffered cursor reads (and drops) all the rows left, closing the socket
+        # instead makes the server abort the query
+        connection.close()
+        raise
+    finally:
+        if connection.open:
+            cursor.close()
+
+
+def sql_select_frame(
+    connection: pymysql.connections.Connection,
+    sql_req: str,
+    params: Optional[List] = None,
+    dtypes: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """Execute a select and return the result as a DataFrame typed from the column types of the result"""
+    # rows are fetched as tuples, not as dicts: the columns are built once from the description
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        with query_stats.measure(sql_req) as timer:
+            cursor.execute(sql_req, params or [])
+            rows = cursor.fetchall()
+            timer.set_result(rows)
+        columns = [column[0] for column in cursor.description]
+        column_dtypes = {
+            column[0]: MYSQL_DTYPES[column[1]] for column in cursor.description if column[1] in MYSQL_DTYPES
+        }
+
+    return rows_to_frame(rows, columns, dict(column_dtypes, **(dtypes or {})))
+
+
+def sql_execute_many(
+    connection: pymysql.connections.Connection,
+    sql_req: str,
+    params_seq: Iterable,
+    batch_size: int = 1000,
+    commit: bool = True,
+    cursor_class: pymysql.cursors.Cursor = None,
+) -> List[int]:
+    """
+    Execute a statement for each parameter set, batch_size parameter sets at a time.
+
+    pymysql rewrites "INSERT ... VALUES (...)" statements into multi-row INSERTs.
+    Each batch is committed on its own (when commit is set).
+
+    :returns: the number of affected rows of each batch.
+    """
+    affected_rows = []
+    for batch in chunked(params_seq, batch_size):
+        with connection.cursor(cursor_class) as cursor:
+            try:
+                affected_rows.append(cursor.executemany(sql_req, batch))
+                if commit:
+                    connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    return affected_rows
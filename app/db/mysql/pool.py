@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Optional
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+from app.db.mysql.helper import get_mysql_cnx
+from app.db.pool import ConnectionPool
+from app.exception import AppDBConnectionError
+
+
+class MySQLConnectionPool(ConnectionPool):
+    """
+    MySQLConnectionPool is a pool of pymysql connections.
+    """
+
+    def __init__(
+        self,
+        cnx_args,
+        min_size: int = 0,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        max_lifetime: float = 3600.0,
+        borrow_timeout: float = 5.0,
+        validation_interval: Optional[float] = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self._cnx_args = cnx_args
+        super().__init__(
+            min_size=min_size,
+            max_size=max_size,
+            idle_timeout=idle_timeout,
+            max_lifetime=max_lifetime,
+            borrow_timeout=borrow_timeout,
+            validation_interval=validation_interval,
+            logger=logger,
+        )
+
+    def create_connection(self) -> pymysql.connections.Connection:
+        try:
+            return get_mysql_cnx(self._cnx_args.as_dict)
+        except pymysql.err.OperationalError as ex:
+            raise AppDBConnectionError("Can't connect to MySql", ex=ex) from ex
+
+    def close_connection(self, raw: pymysql.connections.Connection) -> None:
+        if raw.open:
+            raw.close()
+
+    def reset_connection(self, raw: pymysql.connections.Connection) -> bool:
+        if not raw.open:
+            return False
+
+        # do not leak an open transaction (and its snapshot) to the next borrower
+        if raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            raw.rollback()
+
+        return True
+
+    def validate_connection(self, raw: pymysql.connections.Connection) -> bool:
+        raw.ping(reconnect=False)
+        return True
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0718
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, List, Optional, Set
+
+from app.exception import AppDBConnectionError, AppDBPoolExhaustedError
+
+
+class PooledConnection:
+    """
+    PooledConnection wraps a raw driver connection owned by a ConnectionPool.
+    """
+
+    def __init__(self, raw: Any):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        # names of the statements prepared on the connection (see app.sql.registry)
+        self.prepared: Set[str] = set()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    @property
+    def idle_time(self) -> float:
+        return time.monotonic() - self.last_used_at
+
+
+class Checkout:
+    """
+    Checkout holds the pooled connection borrowed by the current request.
+    """
+
+    def __init__(self):
+        self.pooled: Optional[PooledConnection] = None
+        # server side statement timeout (seconds) set on the borrowed connection
+        self.statement_timeout: Optional[float] = None
+
+
+class ConnectionPool:
+    """
+    ConnectionPool is a bounded, thread-safe pool of database connections.
+
+    Subclasses implement the driver specific methods used to create, reset and close connections.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 0,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        max_lifetime: float = 3600.0,
+        borrow_timeout: float = 5.0,
+        validation_interval: Optional[float] = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size} max_size={max_size}")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.borrow_timeout = borrow_timeout
+        self.validation_interval = validation_interval
+        self.logger = logger or logging.getLogger("db.pool")
+        self._available = threading.Condition(threading.Lock())
+        self._idle: deque = deque()
+        self._size = 0
+        self._closed = False
+        self._waiters = 0
+        self._acquire_count = 0
+        self._wait_count = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def create_connection(self) -> Any:
+        """Open a new raw connection"""
+        raise NotImplementedError
+
+    def close_connection(self, raw: Any) -> None:
+        """Close a raw connection"""
+        raise NotImplementedError
+
+    def reset_connection(self, raw: Any) -> bool:
+        """Reset a raw connection before it goes back to the pool, return False to discard it"""
+        return True
+
+    def validate_connection(self, raw: Any) -> bool:
+        """Check that an idle connection is still usable"""
+        return True
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    @property
+    def stats(self) -> dict:
+        """Return the pool usage statistics"""
+        with self._available:
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "in_use": self._size - len(self._idle),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "acquire_count": self._acquire_count,
+                "wait_count": self._wait_count,
+                "wait_time_total": self._wait_time_total,
+                "wait_time_max": self._wait_time_max,
+            }
+
+    def open(self, prewarm: Optional[int] = None) -> None:
+        """Fill the pool up to min_size connections, or up to prewarm connections (at most max_size)"""
+        with self._available:
+            self._closed = False
+
+        self._fill(min(max(self.min_size, prewarm or 0), self.max_size))
+
+    def keepalive(self, idle_threshold: float) -> int:
+        """
+        Ping the connections idle for more than idle_threshold seconds, before the server (MySQL wait_timeout,
+        proxies...) closes them, drop the dead ones and fill the pool up to min_size connections again.
+
+        At most min_size connections are pinged, the pinged ones keep their idle time and their place in
+        the idle queue, so that the connections above min_size are still closed after idle_timeout seconds:
+        idle_threshold must be lower than idle_timeout.
+
+        :returns: the number of pinged connections.
+        """
+        if idle_threshold >= self.idle_timeout:
+            raise ValueError(f"keepalive idle_threshold ({idle_threshold}) must be lower than idle_timeout")
+
+        to_close: List[PooledConnection] = []
+        stale: List[PooledConnection] = []
+        with self._available:
+            if self._closed:
+                return 0
+
+            self._prune_idle(to_close)
+            # the oldest idle connections are on the left, they are borrowed during the ping
+            while self._idle and len(stale) < self.min_size and self._idle[0].idle_time >= idle_threshold:
+                stale.append(self._idle.popleft())
+        self._close_all(to_close)
+
+        valid = []
+        for pooled in stale:
+            try:
+                valid.append(self.validate_connection(pooled.raw))
+            except Exception:
+                valid.append(False)
+
+        dead: List[PooledConnection] = []
+        with self._available:
+            # put the connections back where they were, without touching last_used_at
+            for pooled, is_valid in reversed(list(zip(stale, valid))):
+                if is_valid and not self._closed:
+                    self._idle.appendleft(pooled)
+                else:
+                    self._size -= 1
+                    dead.append(pooled)
+                self._available.notify()
+        self._close_all(dead)
+
+        self._fill(self.min_size)
+        return len(stale)
+
+    def _fill(self, size: int) -> None:
+        opened = []
+        try:
+            while self._size < size:
+                opened.append(self.acquire())
+        except AppDBConnectionError as ex:
+            self.logger.warning("cannot pre-open pool connection", extra={"error": str(ex)})
+        finally:
+            for pooled in opened:
+                self.release(pooled)
+
+    def close(self) -> None:
+        """Close all idle connections, connections in use are closed when released"""
+        with self._available:
+            self._closed = True
+            to_close = list(self._idle)
+            self._idle.clear()
+            self._size -= len(to_close)
+            self._available.notify_all()
+
+        self._close_all(to_close)
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Borrow a connection, wait up to timeout seconds when the pool is exhausted"""
+        if timeout is None:
+            timeout = self.borrow_timeout
+
+        while True:
+            pooled = self._borrow(timeout)
+            if pooled is None:
+                break
+
+            if self._needs_validation(pooled):
+                try:
+                    valid = self.validate_connection(pooled.raw)
+                except Exception:
+                    valid = False
+                if not valid:
+                    self.release(pooled, discard=True)
+                    continue
+
+            return pooled
+
+        try:
+            return PooledConnection(self.create_connection())
+        except Exception:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+
+    def _borrow(self, timeout: float) -> Optional[PooledConnection]:
+        """Take an idle connection, or reserve a slot for a new one (returns None)"""
+        started_at = time.monotonic()
+        deadline = started_at + timeout
+        to_close: List[PooledConnection] = []
+        waited = False
+        try:
+            with self._available:
+                self._acquire_count += 1
+                try:
+                    while True:
+                        if self._closed:
+                            raise AppDBConnectionError(message="Connection pool is closed")
+
+                        self._prune_idle(to_close)
+                        while self._idle:
+                            candidate = self._idle.pop()
+                            if self._is_expired(candidate):
+                                self._size -= 1
+                                to_close.append(candidate)
+                                continue
+                            return candidate
+
+                        if self._size < self.max_size:
+                            # reserve a slot, the connection is opened outside the lock
+                            self._size += 1
+                            return None
+
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise AppDBPoolExhaustedError(
+                                message=f"No database connection available after {timeout} seconds "
+                                f"(pool max_size={self.max_size})"
+                            )
+                        waited = True
+                        self._waiters += 1
+                        try:
+                            self._available.wait(remaining)
+                        finally:
+                            self._waiters -= 1
+                finally:
+                    if waited:
+                        wait_time = time.monotonic() - started_at
+                        self._wait_count += 1
+                        self._wait_time_total += wait_time
+                        self._wait_time_max = max(self._wait_time_max, wait_time)
+        finally:
+            self._close_all(to_close)
+
+    def release(self, pooled: PooledConnection, discard: bool = False) -> None:
+        """Return a borrowed connection to the pool, or close it when discarded"""
+        if not discard:
+            try:
+                discard = not self.reset_connection(pooled.raw)
+            except Exception as ex:
+                self.logger.warning("cannot reset pool connection", extra={"error": str(ex)})
+                discard = True
+
+        with self._available:
+            if discard or self._closed or self._is_expired(pooled):
+                self._size -= 1
+            else:
+                pooled.last_used_at = time.monotonic()
+                self._idle.append(pooled)
+                pooled = None
+            self._available.notify()
+
+        if pooled is not None:
+            self._close_all([pooled])
+
+    def _needs_validation(self, pooled: PooledConnection) -> bool:
+        return self.validation_interval is not None and pooled.idle_time > self.validation_interval
+
+    def _is_expired(self, pooled: PooledConnection) -> bool:
+        return self.max_lifetime is not None and pooled.age > self.max_lifetime
+
+    def _prune_idle(self, to_close: List[PooledConnection]) -> None:
+        # the idle queue is used as a stack, so the oldest idle connections are on the left
+        while self._idle and self._size > self.min_size and self._idle[0].idle_time > self.idle_timeout:
+            to_close.append(self._idle.popleft())
+            self._size -= 1
+
+    def _close_all(self, connections: List[PooledConnection]) -> None:
+        for pooled in connections:
+            try:
+                self.close_connection(pooled.raw)
+            except Exception:
+                pass
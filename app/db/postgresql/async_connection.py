@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0718
+
+import contextlib
+import functools
+import itertools
+import re
+import uuid
+from typing import AsyncIterator, List, Optional
+
+import asyncpg
+
+from app.db.postgresql.connection import PostgreSQLConnectionArgs
+from app.exception import AppDBConnectionError, AppDBError, AppDBRetryableError, AppDBTimeoutError, AppException
+from app.exception.postgresql import ERROR_CANNOT_EXECUTE_POSTGRESQL_COMMAND
+from app.misc.deadline import get_remaining_time
+
+# Connection level failures worth a retry
+POSTGRESQL_RECOVERABLE_ERRORS = (
+    asyncpg.exceptions.PostgresConnectionError,
+    asyncpg.exceptions.ConnectionDoesNotExistError,
+    asyncpg.exceptions.DeadlockDetectedError,
+    asyncpg.exceptions.SerializationError,
+    ConnectionError,
+)
+
+# a string literal ('' escapes a quote), a psycopg2 placeholder or an escaped percent sign
+_RE_PYFORMAT_TOKEN = re.compile(r"'(?:[^']|'')*'|%s|%%")
+
+
+@functools.lru_cache(maxsize=1024)
+def to_asyncpg_query(sql_req: str) -> str:
+    """Convert a query using the psycopg2 "%s" placeholders to asyncpg "$n" placeholders"""
+    counter = itertools.count(1)
+
+    def replace(match: re.Match) -> str:
+        token = match.group(0)
+        if token == "%s":
+            return f"${next(counter)}"
+        # "%%" is the psycopg2 escape of "%", inside or outside a string literal
+        return token.replace("%%", "%")
+
+    return _RE_PYFORMAT_TOKEN.sub(replace, sql_req)
+
+
+@contextlib.asynccontextmanager
+async def statement_timeout(connection: asyncpg.Connection, timeout: Optional[float]) -> AsyncIterator[None]:
+    """Bound the statements of the block by a server side statement_timeout, in a transaction"""
+    if timeout is None:
+        yield
+        return
+
+    async with connection.transaction():
+        # SET LOCAL does not take parameters, set_config(..., true) is its transaction scoped equivalent
+        await connection.execute("SELECT set_config('statement_timeout', $1, true)", str(max(int(timeout * 1000), 1)))
+        yield
+
+
+class AsyncPostgreSQLConnection:
+    """
+    AsyncPostgreSQLConnection runs queries on an asyncpg connection pool.
+
+    Each query borrows a connection for its own duration, so concurrency is bounded
+    by the pool size instead of the threadpool.
+    """
+
+    def __init__(self, cnx_args: PostgreSQLConnectionArgs, logger, min_size: int = 0, max_size: int = 10):
+        self._cnx_args = cnx_args
+        self.logger = logger
+        self.session_id = str(uuid.uuid1())
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool: Optional[asyncpg.Pool] = None
+
+    async def connect(self) -> None:
+        """Create the connection pool"""
+        if self.pool is not None:
+            return
+
+        try:
+            self.pool = await asyncpg.create_pool(
+                min_size=self.min_size,
+                max_size=self.max_size,
+                server_settings={"application_name": self._cnx_args.program},
+                **self._cnx_args.as_dict,
+            )
+        except (OSError, asyncpg.PostgresError) as ex:
+            raise AppDBConnectionError(message="Can't connect to PostgreSQL", ex=ex) from ex
+
+    async def disconnect(self) -> None:
+        """Close the connection pool"""
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            await pool.close()
+
+    async def select(self, sql_req: str, params=None) -> List[tuple]:
+        await self.connect()
+        remaining_time = get_remaining_time()
+        try:
+            async with self.pool.acquire() as connection:
+                async with statement_timeout(connection, self._check_deadline(remaining_time)):
+                    records = await connection.fetch(to_asyncpg_query(sql_req), *(params or []))
+                return [tuple(record) for record in records]
+        except Exception as ex:
+            raise self._to_app_exception(ex, sql_req, params, remaining_time) from ex
+
+    async def execute(self, sql_req: str, params=None) -> str:
+        await self.connect()
+        remaining_time = get_remaining_time()
+        try:
+            async with self.pool.acquire() as connection:
+                # asyncpg runs each statement in autocommit mode outside an explicit transaction
+                async with statement_timeout(connection, self._check_deadline(remaining_time)):
+                    return await connection.execute(to_asyncpg_query(sql_req), *(params or []))
+        except Exception as ex:
+            raise self._to_app_exception(ex, sql_req, params, remaining_time) from ex
+
+    @staticmethod
+    def _check_deadline(remaining_time: Optional[float]) -> Optional[float]:
+        if remaining_time is not None and remaining_time <= 0:
+            raise AppDBTimeoutError(message="Request deadline exceeded before the query")
+        return remaining_time
+
+    def _to_app_exception(self, ex: Exception, sql_req: str, params, timeout: Optional[float]) -> AppException:
+        if isinstance(ex, AppException):
+            return ex
+
+        error_code = getattr(ex, "sqlstate", None)
+        self.logger.error(
+            str(ex),
+            extra={
+                "sql_request": sql_req,
+                "sql_params": str(params),
+                "postgresql_error_code": error_code,
+            },
+        )
+
+        if timeout is not None and isinstance(ex, asyncpg.exceptions.QueryCanceledError):
+            return AppDBTimeoutError(
+                message=f"PostgreSQL query exceeded the {timeout:.3f}s statement timeout",
+                ex=ex,
+            )
+
+        if isinstance(ex, POSTGRESQL_RECOVERABLE_ERRORS):
+            return AppDBRetryableError(
+                message=ERROR_CANNOT_EXECUTE_POSTGRESQL_COMMAND,
+                error_code=error_code,
+                ex=ex,
+                error_type=ex.__class__.__name__,
+            )
+
+        if isinstance(ex, asyncpg.PostgresError):
+            return AppDBError(
+                message=ERROR_CANNOT_EXECUTE_POSTGRESQL_COMMAND,
+                error_code=error_code,
+                ex=ex,
+                error_type=ex.__class__.__name__,
+            )
+
+        return AppException(message=str(ex), error_type=str(type(ex)), ex=ex)
@@ -2,12 +2,39 @@
 # pylint: disable=W0718,R0912,R0915
 
 import uuid
-from typing import List, Union
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import IO, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
+import pandas as pd
 import psycopg2
+import psycopg2.errors
 
-from app.db.postgresql.helper import get_postgresql_cnx, sql_execute, sql_select
-from app.exception import AppDBConnectionError, AppException
+from app.db.pool import Checkout
+from app.db.postgresql.helper import (
+    build_copy_sql,
+    get_postgresql_cnx,
+    sql_copy_in,
+    sql_copy_out,
+    sql_copy_out_stream,
+    sql_execute,
+    sql_execute_many,
+    sql_select,
+    sql_select_frame,
+    sql_select_stream,
+)
+from app.db.postgresql.pool import PostgreSQLConnectionPool
+from app.exception import (
+    AppDBConnectionError,
+    AppDBError,
+    AppDBQueryCancelledError,
+    AppDBTimeoutError,
+    AppException,
+)
+from app.exception.postgresql import ERROR_CANNOT_EXECUTE_POSTGRESQL_COMMAND
+from app.misc.cancellation import is_cancelled, on_cancel
+from app.misc.deadline import get_remaining_time
+from app.sql.queries import query_registry
 
 
 class PostgreSQLConnectionArgs:
@@ -43,12 +70,27 @@ class PostgreSQLConnectionArgs:
         }
 
 
+def is_statement_timeout(ex: Optional[BaseException]) -> bool:
+    """Return True if the error (or one of its causes) is a query cancelled by statement_timeout"""
+    while ex is not None:
+        if isinstance(ex, psycopg2.errors.QueryCanceled):
+            return True
+        ex = getattr(ex, "ex", None) or ex.__cause__
+    return False
+
+
 class PostgreSQLConnection:
-    def __init__(self, cnx_args: PostgreSQLConnectionArgs, logger):
+    def __init__(self, cnx_args: PostgreSQLConnectionArgs, logger, pool: Optional[PostgreSQLConnectionPool] = None):
         self._cnx_args = cnx_args
         self.logger = logger
         self.session_id = str(uuid.uuid1())
         self.sql_cnx = None
+        self.pool = pool
+        # names of the statements prepared on sql_cnx (pooled connections track their own)
+        self._prepared: Set[str] = set()
+        self._checkout: ContextVar[Optional[Checkout]] = ContextVar(
+            f"postgresql_checkout_{self.session_id}", default=None
+        )
 
     def __enter__(self):
         self.connect()
@@ -64,6 +106,7 @@ class PostgreSQLConnection:
                 return
 
             self.sql_cnx = self.get_postgresql_cnx()
+            self._prepared = set()
             if not self.is_alive():
                 raise AppDBConnectionError(message="Can't connect to PostgreSQL (not alive)")
         except psycopg2.Error as ex:
@@ -72,11 +115,78 @@ class PostgreSQLConnection:
             self.disconnect()
             raise
 
+    @contextmanager
+    def checkout(self):
+        """
+        Borrow a pooled connection for the duration of the block (re-entrant).
+
+        The running query is cancelled when the current request is cancelled (see app.misc.cancellation).
+        """
+        if self._checkout.get() is not None:
+            yield self
+            return
+
+        holder = Checkout()
+        token = self._checkout.set(holder)
+        try:
+            with on_cancel(lambda: self.cancel_query(holder)):
+                try:
+                    yield self
+                except Exception as ex:
+                    if is_cancelled() and not isinstance(ex, AppDBQueryCancelledError):
+                        raise AppDBQueryCancelledError(message="PostgreSQL query cancelled", ex=ex) from ex
+                    if holder.statement_timeout is not None and is_statement_timeout(ex):
+                        raise AppDBTimeoutError(
+                            message=f"PostgreSQL query exceeded the {holder.statement_timeout:.3f}s statement timeout",
+                            ex=ex,
+                        ) from ex
+                    raise
+        finally:
+            self._checkout.reset(token)
+            if holder.pooled is not None:
+                discard = False
+                if holder.statement_timeout is not None:
+                    try:
+                        self.reset_statement_timeout(holder.pooled.raw)
+                    except Exception:
+                        discard = True
+                self.pool.release(holder.pooled, discard=discard)
+
+    def cancel_query(self, holder: Checkout) -> None:
+        """Cancel the query running on the connection of a checkout (called from another thread)"""
+        raw = holder.pooled.raw if holder.pooled is not None else (self.sql_cnx if self.pool is None else None)
+        if raw is not None and not raw.closed:
+            # the connection is left in an aborted transaction, which is rolled back when it is released
+            raw.cancel()
+
+    @staticmethod
+    def set_statement_timeout(raw, timeout: float) -> None:
+        with raw.cursor() as cursor:
+            cursor.execute("SET statement_timeout = %s", (max(int(timeout * 1000), 1),))
+        # SET is transactional, commit it so that a rollback of the request does not undo it
+        raw.commit()
+
+    @staticmethod
+    def reset_statement_timeout(raw) -> None:
+        raw.rollback()
+        with raw.cursor() as cursor:
+            cursor.execute("RESET statement_timeout")
+        raw.commit()
+
     def get_postgresql_cnx(self):
         return get_postgresql_cnx(self._cnx_args.as_dict)
 
     def disconnect(self) -> None:
         """Disconnect form server"""
+        if self.pool is not None:
+            # discard the borrowed connection, the next access borrows a fresh one
+            holder = self._checkout.get()
+            if holder is not None and holder.pooled is not None:
+                self.pool.release(holder.pooled, discard=True)
+                holder.pooled = None
+                holder.statement_timeout = None
+            return
+
         if self.sql_cnx:
             try:
                 #  saw behaviour when it failed to send logout cmd due
@@ -113,6 +223,21 @@ class PostgreSQLConnection:
 
     @property
     def cnx(self):
+        if self.pool is not None:
+            holder = self._checkout.get()
+            if holder is None:
+                raise AppDBConnectionError(message="No connection checked out from the PostgreSQL pool")
+            if holder.pooled is None:
+                remaining_time = get_remaining_time()
+                if remaining_time is not None and remaining_time <= 0:
+                    raise AppDBTimeoutError(message="Request deadline exceeded before the query")
+                holder.pooled = self.pool.acquire()
+                if remaining_time is not None:
+                    # bound the queries of the request by its deadline
+                    self.set_statement_timeout(holder.pooled.raw, remaining_time)
+                    holder.statement_timeout = remaining_time
+            return holder.pooled.raw
+
         if not self.sql_cnx:
             self.connect()
 
@@ -126,11 +251,64 @@ class PostgreSQLConnection:
         cursor_args: dict = None,
     ) -> List[Union[dict, tuple]]:
         try:
-            return sql_select(self.cnx, sql_req, params, auto_close, cursor_args)
+            # pooled connections are returned to the pool instead of being closed
+            return sql_select(self.cnx, sql_req, params, auto_close and self.pool is None, cursor_args)
         except AppException as ex:
             ex.log_exception()
             raise ex
 
+    def select_frame(self, sql_req: str, params=None, dtypes: Optional[dict] = None) -> pd.DataFrame:
+        """
+        Return the result of a select as a DataFrame, the columns are typed from the PostgreSQL column types
+        (dtypes overrides the type of some columns).
+        """
+        try:
+            return sql_select_frame(self.cnx, sql_req, params, dtypes)
+        except AppException as ex:
+            ex.log_exception()
+            raise ex
+
+    def select_prepared(self, name: str, params=None, cursor_args: dict = None) -> List[Union[dict, tuple]]:
+        """
+        Run a query of the registry (app.sql.queries) by name: the statement is parsed and planned by the server
+        once per connection (PREPARE), then only executed with params.
+        """
+        query = query_registry.get(name)
+        try:
+            connection = self.cnx
+            prepared = self._checkout.get().pooled.prepared if self.pool is not None else self._prepared
+            if name not in prepared:
+                # prepared statements belong to the session, they are not undone by a rollback
+                sql_execute(connection, query.prepare_sql, auto_close=False, commit=False)
+                prepared.add(name)
+            return sql_select(connection, query.execute_sql, params, False, cursor_args)
+        except AppException as ex:
+            ex.log_exception()
+            raise ex
+
+    def select_stream(
+        self,
+        sql_req: str,
+        params=None,
+        batch_size: int = 1000,
+        cursor_args: dict = None,
+    ) -> Iterator[List[Union[dict, tuple]]]:
+        """Yield the rows of a select in batches, rows are read from the server as they are consumed"""
+        if self.pool is None:
+            yield from sql_select_stream(self.cnx, sql_req, params, batch_size, cursor_args)
+            return
+
+        # the generator may be resumed from different contexts (threads), so it owns its connection
+        pooled = self.pool.acquire()
+        failed = False
+        try:
+            yield from sql_select_stream(pooled.raw, sql_req, params, batch_size, cursor_args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.pool.release(pooled, discard=failed)
+
     def execute(
         self,
         sql_req: str,
@@ -143,7 +321,7 @@ class PostgreSQLConnection:
             connection=self.cnx,
             sql_req=sql_req,
             params=params,
-            auto_close=auto_close,
+            auto_close=auto_close and self.pool is None,
             commit=commit,
             cursor_args=cursor_args,
         )
@@ -312,6 +490,111 @@ class PostgreSQLConnection:
     #
     #         raise AppException(message=str(ex), error_type=str(type(ex)), ex=ex) from ex
 
+    def execute_many(
+        self,
+        sql_req: str,
+        params_seq: Iterable[Union[List, Tuple]],
+        batch_size: int = 1000,
+        commit: bool = True,
+        template: Optional[str] = None,
+    ) -> List[int]:
+        """
+        Bulk write: execute a "INSERT ... VALUES %s" statement as multi-row statements of batch_size rows.
+
+        Each batch is committed on its own, so on failure the previous batches stay committed.
+
+        :returns: the number of affected rows of each batch.
+        """
+        try:
+            return sql_execute_many(self.cnx, sql_req, params_seq, batch_size, commit, template)
+        except psycopg2.Error as ex:
+            self.logger.error(str(ex), extra={"sql_request": sql_req, "postgresql_error_code": ex.pgcode})
+            if isinstance(ex, psycopg2.OperationalError):
+                self.disconnect()
+                raise AppDBConnectionError(message=ERROR_CANNOT_EXECUTE_POSTGRESQL_COMMAND, ex=ex) from ex
+
+            raise AppDBError(
+                message=ERROR_CANNOT_EXECUTE_POSTGRESQL_COMMAND,
+                error_code=ex.pgcode,
+                ex=ex,
+                error_type=ex.__class__.__name__,
+            ) from ex
+
+    def copy_in(
+        self,
+        table: str,
+        source: Union[IO, Iterable[Union[str, bytes]]],
+        columns: Optional[List[str]] = None,
+        fmt: str = "csv",
+        header: bool = False,
+        commit: bool = True,
+    ) -> int:
+        """
+        Bulk import rows into a table with the COPY protocol.
+
+        :param source: a file-like object or an iterable of str/bytes chunks (csv, text or binary COPY data).
+        :returns: the number of imported rows.
+        """
+        copy_sql = build_copy_sql("FROM", table=table, columns=columns, fmt=fmt, header=header)
+        try:
+            return sql_copy_in(self.cnx, copy_sql, source, commit=commit)
+        except psycopg2.Error as ex:
+            raise self._copy_error(ex, table) from ex
+
+    def copy_out(
+        self,
+        destination: IO,
+        table: Optional[str] = None,
+        query: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        fmt: str = "csv",
+        header: bool = True,
+    ) -> int:
+        """
+        Bulk export a table (or a query result) with the COPY protocol into a file-like object.
+
+        :returns: the number of exported rows.
+        """
+        copy_sql = build_copy_sql("TO", table=table, query=query, columns=columns, fmt=fmt, header=header)
+        try:
+            return sql_copy_out(self.cnx, copy_sql, destination)
+        except psycopg2.Error as ex:
+            raise self._copy_error(ex, table or query) from ex
+
+    def copy_out_stream(
+        self,
+        table: Optional[str] = None,
+        query: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        fmt: str = "csv",
+        header: bool = True,
+    ) -> Iterator[Union[str, bytes]]:
+        """Bulk export a table (or a query result) with the COPY protocol, yielding the data chunk by chunk"""
+        copy_sql = build_copy_sql("TO", table=table, query=query, columns=columns, fmt=fmt, header=header)
+        pooled = self.pool.acquire() if self.pool is not None else None
+        connection = pooled.raw if pooled is not None else self.cnx
+        completed = False
+        try:
+            yield from sql_copy_out_stream(connection, copy_sql)
+            completed = True
+        except psycopg2.Error as ex:
+            raise self._copy_error(ex, table or query) from ex
+        finally:
+            # an interrupted COPY leaves the connection in an unknown state
+            if pooled is not None:
+                self.pool.release(pooled, discard=not completed)
+            elif not completed:
+                self.disconnect()
+
+    def _copy_error(self, ex: psycopg2.Error, source: str) -> AppDBError:
+        self.logger.error(str(ex), extra={"copy_source": source, "postgresql_error_code": ex.pgcode})
+        return AppDBError(
+            message=ERROR_CANNOT_EXECUTE_POSTGRESQL_COMMAND,
+            error_code=ex.pgcode,
+            ex=ex,
+            error_type=ex.__class__.__name__,
+        )
+
     def rollback(self):
         self.cnx.rollback()
 
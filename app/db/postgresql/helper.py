@@ -1,8 +1,39 @@
 # -*- coding: utf-8 -*-
 
-from typing import List, Optional
+import queue
+import threading
+import uuid
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Union
 
+import pandas as pd
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+from app.db.frame import rows_to_frame
+from app.db.stats import query_stats
+from app.misc.streaming import IterableReader, QueueWriter
+from app.misc.utils import chunked
+
+COPY_FORMATS = ("csv", "text", "binary")
+
+_END_OF_COPY = object()
+
+# DataFrame dtype of the PostgreSQL types (pg_type oid), the other types are inferred from the values
+POSTGRESQL_DTYPES = {
+    16: "boolean",  # bool
+    18: "string",  # "char"
+    19: "string",  # name
+    20: "Int64",  # int8
+    21: "Int16",  # int2
+    23: "Int32",  # int4
+    25: "string",  # text
+    26: "Int64",  # oid (unsigned 32 bits)
+    700: "Float32",  # float4
+    701: "Float64",  # float8
+    1042: "string",  # bpchar
+    1043: "string",  # varchar
+}
 
 
 def get_postgresql_cnx(config: dict):
@@ -12,6 +43,7 @@ def get_postgresql_cnx(config: dict):
         host=config["host"],
         port=config["port"],
         database=config["database"],
+        connect_timeout=config.get("connect_timeout", 10),
     )
 
 
@@ -29,8 +61,15 @@ def sql_select(
             cursor_args = {}
 
         with connection.cursor(**cursor_args) as cursor:
-            cursor.execute(sql_req, params)
-            return cursor.fetchall()
+            with query_stats.measure(sql_req) as timer:
+                cursor.execute(sql_req, params)
+                result = cursor.fetchall()
+                timer.set_result(result)
+            return result
+    except psycopg2.errors.QueryCanceled:
+        # statement timeout or cancelled query: the connection is fine, roll the aborted transaction back
+        connection.rollback()
+        raise
     except psycopg2.OperationalError:
         # force close connection
         connection.close()
@@ -70,11 +109,17 @@ def sql_execute(
         with connection.cursor(**cursor_args) as cursor:
             if params is None:
                 params = []
-            result = cursor.execute(sql_req, params)
+            with query_stats.measure(sql_req) as timer:
+                result = cursor.execute(sql_req, params)
+                timer.rows = max(cursor.rowcount, 0)
             if commit:
                 connection.commit()
 
             return result
+    except psycopg2.errors.QueryCanceled:
+        # statement timeout or cancelled query: the connection is fine, roll the aborted transaction back
+        connection.rollback()
+        raise
     except psycopg2.OperationalError:
         if (
             auto_reconnect and retry_count > 0
@@ -97,3 +142,181 @@ def sql_execute(
     finally:
         if auto_close:
             connection.close()
+
+
+def sql_select_stream(
+    connection,
+    sql_req: str,
+    params: Optional[List] = None,
+    batch_size: int = 1000,
+    cursor_args: dict = None,
+) -> Iterator[List]:
+    """Execute a select with a named (server side) cursor and yield the rows in batches"""
+    cursor_args = dict(cursor_args or {})
+    cursor_args.setdefault("name", f"stream_{uuid.uuid4().hex}")
+    with connection.cursor(**cursor_args) as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(sql_req, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+
+def sql_select_frame(
+    connection,
+    sql_req: str,
+    params: Optional[List] = None,
+    dtypes: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """Execute a select and return the result as a DataFrame typed from the column types of the result"""
+    with connection.cursor() as cursor:
+        with query_stats.measure(sql_req) as timer:
+            cursor.execute(sql_req, params)
+            rows = cursor.fetchall()
+            timer.set_result(rows)
+        columns = [column.name for column in cursor.description]
+        column_dtypes = {
+            column.name: POSTGRESQL_DTYPES[column.type_code]
+            for column in cursor.description
+            if column.type_code in POSTGRESQL_DTYPES
+        }
+
+    return rows_to_frame(rows, columns, dict(column_dtypes, **(dtypes or {})))
+
+
+def sql_execute_many(
+    connection,
+    sql_req: str,
+    params_seq: Iterable,
+    batch_size: int = 1000,
+    commit: bool = True,
+    template: Optional[str] = None,
+) -> List[int]:
+    """
+    Execute a "INSERT ... VALUES %s" statement as one multi-row statement per batch of parameter sets.
+
+    Each batch is committed on its own (when commit is set).
+
+    :returns: the number of affected rows of each batch.
+    """
+    affected_rows = []
+    for batch in chunked(params_seq, batch_size):
+        with connection.cursor() as cursor:
+            try:
+                execute_values(cursor, sql_req, batch, template=template, page_size=len(batch))
+                affected_rows.append(cursor.rowcount)
+                if commit:
+                    connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    return affected_rows
+
+
+def build_copy_sql(
+    direction: str,
+    table: Optional[str] = None,
+    query: Optional[Union[str, sql.Composable]] = None,
+    columns: Optional[List[str]] = None,
+    fmt: str = "csv",
+    header: bool = False,
+) -> sql.Composed:
+    """
+    Build a "COPY ... FROM STDIN" (direction="FROM") or "COPY ... TO STDOUT" (direction="TO") statement.
+
+    The table may be qualified by its schema ("schema.table"), names are quoted as identifiers.
+    """
+    if fmt not in COPY_FORMATS:
+        raise ValueError(f"Unsupported COPY format: {fmt}")
+
+    if query is not None:
+        if direction != "TO":
+            raise ValueError("COPY FROM does not support a query")
+        source = sql.SQL("({})").format(sql.SQL(query) if isinstance(query, str) else query)
+    else:
+        source = sql.Identifier(*table.split("."))
+        if columns:
+            source = sql.SQL("{} ({})").format(source, sql.SQL(", ").join(map(sql.Identifier, columns)))
+
+    options = [sql.SQL("FORMAT {}").format(sql.SQL(fmt))]
+    if header and fmt == "csv":
+        options.append(sql.SQL("HEADER true"))
+
+    endpoint = "STDIN" if direction == "FROM" else "STDOUT"
+    return sql.SQL("COPY {} {} {} WITH ({})").format(
+        source, sql.SQL(direction), sql.SQL(endpoint), sql.SQL(", ").join(options)
+    )
+
+
+def sql_copy_in(
+    connection,
+    copy_sql: sql.Composable,
+    source: Union[IO, Iterable[Union[str, bytes]]],
+    commit: bool = True,
+    size: int = 65536,
+) -> int:
+    """
+    Stream a file-like object or an iterable of chunks to a "COPY ... FROM STDIN" statement.
+
+    :returns: the number of copied rows.
+    """
+    if not hasattr(source, "read"):
+        source = IterableReader(source)
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.copy_expert(copy_sql, source, size)
+            if commit:
+                connection.commit()
+            return cursor.rowcount
+        except Exception:
+            connection.rollback()
+            raise
+
+
+def sql_copy_out(connection, copy_sql: sql.Composable, destination: IO) -> int:
+    """
+    Write the output of a "COPY ... TO STDOUT" statement to a file-like object.
+
+    :returns: the number of copied rows.
+    """
+    with connection.cursor() as cursor:
+        cursor.copy_expert(copy_sql, destination)
+        return cursor.rowcount
+
+
+def sql_copy_out_stream(connection, copy_sql: sql.Composable, max_chunks: int = 16) -> Iterator[Union[str, bytes]]:
+    """
+    Yield the output of a "COPY ... TO STDOUT" statement chunk by chunk.
+
+    The COPY runs in a producer thread writing to a bounded queue, so memory stays bounded by max_chunks.
+    """
+    chunks: queue.Queue = queue.Queue(maxsize=max_chunks)
+    writer = QueueWriter(chunks)
+
+    def produce():
+        try:
+            sql_copy_out(connection, copy_sql, writer)
+            writer.put(_END_OF_COPY)
+        except Exception as ex:
+            try:
+                writer.put(ex)
+            except IOError:
+                pass
+
+    producer = threading.Thread(target=produce, name="copy-out", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _END_OF_COPY:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        writer.closed = True
+        producer.join()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Optional
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from app.db.pool import ConnectionPool
+from app.db.postgresql.helper import get_postgresql_cnx
+from app.exception import AppDBConnectionError
+
+
+class PostgreSQLConnectionPool(ConnectionPool):
+    """
+    PostgreSQLConnectionPool is a pool of psycopg2 connections.
+
+    Idle connections are only checked with a round trip when they have been idle
+    longer than validation_interval seconds.
+    """
+
+    def __init__(
+        self,
+        cnx_args,
+        min_size: int = 0,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        max_lifetime: float = 3600.0,
+        borrow_timeout: float = 5.0,
+        validation_interval: Optional[float] = 30.0,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self._cnx_args = cnx_args
+        super().__init__(
+            min_size=min_size,
+            max_size=max_size,
+            idle_timeout=idle_timeout,
+            max_lifetime=max_lifetime,
+            borrow_timeout=borrow_timeout,
+            validation_interval=validation_interval,
+            logger=logger,
+        )
+
+    def create_connection(self):
+        try:
+            return get_postgresql_cnx(self._cnx_args.as_dict)
+        except psycopg2.Error as ex:
+            raise AppDBConnectionError(message="Can't connect to PostgreSQL", ex=ex) from ex
+
+    def close_connection(self, raw) -> None:
+        if not raw.closed:
+            raw.close()
+
+    def reset_connection(self, raw) -> bool:
+        if raw.closed:
+            return False
+
+        # psycopg2 opens a transaction implicitly, end it so the connection is not left idle in transaction
+        if raw.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            raw.rollback()
+
+        return True
+
+    def validate_connection(self, raw) -> bool:
+        if raw.closed:
+            return False
+
+        with raw.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            valid = cursor.fetchone() == (1,)
+        raw.rollback()
+        return valid
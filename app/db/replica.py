@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0718
+
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional
+
+from app.exception import AppDBConnectionError
+from app.misc.cancellation import CancellationToken, cancellation_scope, on_cancel
+from app.misc.circuit_breaker import STATE_OPEN, Bulkhead, CircuitBreaker, guarded
+
+
+class Replica:
+    """
+    Replica is a read-only database backend: a client with its own connection pool,
+    circuit breaker and bulkhead.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        bulkhead: Optional[Bulkhead] = None,
+    ):
+        self.name = name
+        self.client = client
+        self.circuit_breaker = circuit_breaker
+        self.bulkhead = bulkhead
+        self.outstanding = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "outstanding": self.outstanding,
+            "pool": self.client.pool.stats if self.client.pool is not None else {},
+            "circuit_breaker": self.circuit_breaker.stats if self.circuit_breaker is not None else {},
+            "bulkhead": self.bulkhead.stats if self.bulkhead is not None else {},
+        }
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit breaker of the replica is open"""
+        return self.circuit_breaker is None or self.circuit_breaker.state != STATE_OPEN
+
+    def open(self) -> None:
+        if self.client.pool is not None:
+            self.client.pool.open()
+
+    def disconnect(self) -> None:
+        self.client.disconnect()
+        if self.client.pool is not None:
+            self.client.pool.close()
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        with guarded(self.circuit_breaker, self.bulkhead), self.client.checkout():
+            yield
+
+
+class ReplicaSet:
+    """
+    ReplicaSet load balances reads across replicas, picking the one with the least outstanding requests.
+
+    The replicas whose circuit breaker is open are skipped. A read failing with AppDBConnectionError
+    (connection error, open breaker, full bulkhead) is retried once on another replica, then on the
+    primary (fallback).
+
+    In hedged mode, when the first replica has not answered after the hedge_percentile latency of
+    the recent reads, the read is also sent to a second replica and the first answer wins: the query
+    of the slower replica is cancelled, so that it releases its connection and bulkhead slot.
+    """
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 0.01,
+        max_workers: int = 16,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.replicas = replicas
+        self.hedge = hedge and len(replicas) > 1
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.logger = logger or logging.getLogger("db")
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge") if self.hedge else None
+        )
+        self._latencies: deque = deque(maxlen=1000)
+        self._latency_count = 0
+        self._hedge_delay: Optional[float] = None
+        self._stats = {"reads": 0, "hedged": 0, "hedge_wins": 0, "retries": 0, "primary_fallbacks": 0}
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                hedge_delay=self._hedge_delay,
+                replicas=[replica.stats for replica in self.replicas],
+            )
+
+    def open(self) -> None:
+        for replica in self.replicas:
+            try:
+                replica.open()
+            except AppDBConnectionError as ex:
+                self.logger.warning("cannot open the replica", extra={"replica": replica.name, "error": str(ex)})
+
+    def disconnect(self) -> None:
+        for replica in self.replicas:
+            replica.disconnect()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def pick(self, exclude: Collection[Replica] = ()) -> Optional[Replica]:
+        """Return the available replica with the least outstanding requests (ties are broken randomly)"""
+        with self._lock:
+            candidates = [replica for replica in self.replicas if replica not in exclude and replica.available]
+            if not candidates:
+                return None
+
+            least = min(replica.outstanding for replica in candidates)
+            replica = random.choice([replica for replica in candidates if replica.outstanding == least])
+            replica.outstanding += 1
+            return replica
+
+    def read(self, fn: Callable[[Any], Any], fallback: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Call fn(client) on a replica, the call runs in a checkout of a pooled connection of the replica.
+
+        fallback() is called (typically the same read on the primary) when no replica could answer.
+        """
+        with self._lock:
+            self._stats["reads"] += 1
+
+        tried: List[Replica] = []
+        error: Optional[AppDBConnectionError] = None
+        # the first replica, then one retry on another replica
+        for attempt in range(2):
+            replica = self.pick(exclude=tried)
+            if replica is None:
+                break
+
+            tried.append(replica)
+            if attempt > 0:
+                with self._lock:
+                    self._stats["retries"] += 1
+            try:
+                if self.hedge and attempt == 0:
+                    return self._hedged_call(replica, fn, tried)
+                return self._call(replica, fn)
+            except AppDBConnectionError as ex:
+                error = ex
+                self.logger.warning("replica read failed", extra={"replica": replica.name, "error": str(ex)})
+
+        if fallback is not None:
+            with self._lock:
+                self._stats["primary_fallbacks"] += 1
+            return fallback()
+
+        if error is not None:
+            raise error
+        raise AppDBConnectionError("No replica available")
+
+    def get_hedge_delay(self) -> float:
+        with self._lock:
+            return max(self._hedge_delay or 0.0, self.hedge_min_delay)
+
+    def _hedged_call(self, first: Replica, fn: Callable[[Any], Any], tried: List[Replica]) -> Any:
+        # each read has its own cancellation token, so that the slower one can be cancelled
+        tokens: Dict[Future, CancellationToken] = {}
+        futures: Dict[Future, Replica] = {}
+
+        def submit(replica: Replica) -> None:
+            token = CancellationToken()
+            # the reads run in the context of the caller (deadline...)
+            future = self._executor.submit(contextvars.copy_context().run, self._call_in_scope, token, replica, fn)
+            tokens[future] = token
+            futures[future] = replica
+
+        def cancel_all() -> None:
+            for token in list(tokens.values()):
+                token.cancel()
+
+        with on_cancel(cancel_all):
+            submit(first)
+            done, _ = wait(futures, timeout=self.get_hedge_delay())
+            if not done:
+                second = self.pick(exclude=tried)
+                # no hedge without a second candidate
+                if second is not None:
+                    tried.append(second)
+                    submit(second)
+                    with self._lock:
+                        self._stats["hedged"] += 1
+
+            return self._first_result(futures, tokens, first)
+
+    def _first_result(self, futures: Dict[Future, Replica], tokens: Dict[Future, CancellationToken], first: Replica):
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if futures[future] is not first:
+                        with self._lock:
+                            self._stats["hedge_wins"] += 1
+                    # the slower read is cancelled, its result is dropped
+                    for other in pending:
+                        tokens[other].cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _call_in_scope(self, token: CancellationToken, replica: Replica, fn: Callable[[Any], Any]) -> Any:
+        with cancellation_scope(token):
+            return self._call(replica, fn)
+
+    def _call(self, replica: Replica, fn: Callable[[Any], Any]) -> Any:
+        started_at = time.perf_counter()
+        try:
+            with replica.guard():
+                result = fn(replica.client)
+            self._record_latency(time.perf_counter() - started_at)
+            return result
+        finally:
+            with self._lock:
+                replica.outstanding -= 1
+
+    def _record_latency(self, duration: float) -> None:
+        with self._lock:
+            self._latencies.append(duration)
+            self._latency_count += 1
+            # the percentile is refreshed every 50 reads, not on every read
+            if self._latency_count % 50 == 1:
+                latencies = sorted(self._latencies)
+                self._hedge_delay = latencies[min(int(len(latencies) * self.hedge_percentile), len(latencies) - 1)]
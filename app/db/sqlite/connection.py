@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0718
+
+import contextlib
+import sqlite3
+import threading
+import uuid
+from contextvars import ContextVar
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.db.sqlite.helper import (
+    get_sqlite_cnx,
+    seed_database,
+    sql_execute,
+    sql_execute_many,
+    sql_select,
+    sql_select_frame,
+    sql_select_stream,
+    to_sqlite_query,
+)
+from app.exception import AppDBConnectionError, AppDBError, AppDBQueryCancelledError, AppDBRetryableError
+from app.misc.cancellation import is_cancelled, on_cancel
+from app.sql.queries import query_registry
+
+ERROR_CANNOT_EXECUTE_SQLITE_COMMAND = "cannot execute sqlite command"
+
+
+class SQLiteConnectionArgs:
+    """
+    SQLiteConnectionArgs is a class which contains parameters
+    to open a SQLite database (":memory:" or a file path).
+    """
+
+    def __init__(self, database: str = ":memory:", seed_rows: int = 1000):
+        self.database = database
+        self.seed_rows = seed_rows
+        # there is no server, the database is used as host name in logs and metrics
+        self.hostname = database
+
+    @property
+    def as_dict(self):
+        return {
+            "database": self.database,
+            "seed_rows": self.seed_rows,
+        }
+
+
+class SQLiteConnection:
+    """
+    SQLiteConnection has the interface of MySQLConnection/PostgreSQLConnection on a local SQLite database,
+    so that the application runs (benchmarks, CI...) without any database server.
+
+    The database is opened once and seeded with the tables queried by the application.
+    The connection is shared by the threads, a checkout holds it for the duration of the block.
+    """
+
+    def __init__(self, cnx_args: SQLiteConnectionArgs, logger, pool=None):
+        self._cnx_args = cnx_args
+        self.logger = logger
+        self.session_id = str(uuid.uuid1())
+        self.sql_cnx: Optional[sqlite3.Connection] = None
+        # sqlite has no connection pool, the attribute keeps the interface of the other connections
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._checkout: ContextVar[bool] = ContextVar(f"sqlite_checkout_{self.session_id}", default=False)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback) -> None:
+        self.disconnect()
+
+    def connect(self) -> None:
+        """Open (and seed) the database"""
+        with self._connect_lock:
+            if self.sql_cnx is not None:
+                return
+
+            try:
+                sql_cnx = get_sqlite_cnx(self._cnx_args.as_dict)
+                seed_database(sql_cnx, self._cnx_args.seed_rows)
+                self.sql_cnx = sql_cnx
+            except sqlite3.Error as ex:
+                raise AppDBConnectionError(message="Can't open the SQLite database", ex=ex) from ex
+
+    def disconnect(self) -> None:
+        """Close the database, an in-memory database is lost"""
+        if self.sql_cnx is not None:
+            try:
+                self.sql_cnx.close()
+            except sqlite3.Error:
+                pass
+            finally:
+                self.sql_cnx = None
+
+    def is_alive(self) -> bool:
+        if self.sql_cnx is None:
+            return False
+        try:
+            return self.select(sql_req="SELECT 1") == [(1,)]
+        except AppDBError:
+            return False
+
+    @property
+    def cnx(self) -> sqlite3.Connection:
+        if self.sql_cnx is None:
+            self.connect()
+
+        return self.sql_cnx
+
+    @contextlib.contextmanager
+    def checkout(self):
+        """
+        Hold the connection for the duration of the block (re-entrant).
+
+        The running query is interrupted when the current request is cancelled (see app.misc.cancellation).
+        """
+        if self._checkout.get():
+            yield self
+            return
+
+        connection = self.cnx
+        with self._lock:
+            token = self._checkout.set(True)
+            try:
+                with on_cancel(connection.interrupt):
+                    try:
+                        yield self
+                    except Exception as ex:
+                        if is_cancelled() and not isinstance(ex, AppDBQueryCancelledError):
+                            raise AppDBQueryCancelledError(message="SQLite query cancelled", ex=ex) from ex
+                        raise
+            finally:
+                self._checkout.reset(token)
+
+    def select(self, sql_req: str, params=None, auto_close: bool = True, as_dict: bool = False) -> List:
+        """Same as the other connections, auto_close is ignored: closing would drop an in-memory database"""
+        with self.checkout():
+            return sql_select(self.cnx, sql_req, params, as_dict)
+
+    def select_frame(self, sql_req: str, params=None, dtypes: Optional[dict] = None) -> pd.DataFrame:
+        """Return the result of a select as a DataFrame, the column types are inferred from the values"""
+        with self.checkout():
+            return sql_select_frame(self.cnx, sql_req, params, dtypes)
+
+    def select_prepared(self, name: str, params=None, as_dict: bool = False) -> List:
+        """Run a query of the registry (app.sql.queries) by name, sqlite3 caches the compiled statements"""
+        return self.select(query_registry.get(name).sql, params, as_dict=as_dict)
+
+    def select_stream(self, sql_req: str, params=None, batch_size: int = 1000) -> Iterator[List[tuple]]:
+        """Yield the rows of a select in batches, the connection is held while a batch is fetched"""
+        # the generator may be resumed from different threads, a checkout (context variable) cannot be used,
+        # and holding the lock across the yields would block the other requests until the stream is consumed
+        yield from sql_select_stream(self.cnx, sql_req, params, batch_size, lock=self._lock)
+
+    def execute(self, sql_req: str, params=None, auto_close: bool = True, commit: bool = True) -> int:
+        with self.checkout():
+            return sql_execute(self.cnx, sql_req, params, commit)
+
+    def execute_many(
+        self,
+        sql_req: str,
+        params_seq: Iterable[Any],
+        batch_size: int = 1000,
+        commit: bool = True,
+    ) -> List[int]:
+        """
+        Bulk write: execute a statement for each parameter set, batch_size parameter sets per transaction.
+
+        :returns: the number of affected rows of each batch.
+        """
+        with self.checkout():
+            try:
+                return sql_execute_many(self.cnx, sql_req, params_seq, batch_size, commit)
+            except sqlite3.Error as ex:
+                raise self._to_app_exception(ex, sql_req) from ex
+
+    def safe_select(self, sql_req: str, params: List, as_dict: bool = False) -> List:
+        try:
+            return self.select(sql_req, params, as_dict=as_dict)
+        except sqlite3.Error as ex:
+            raise self._to_app_exception(ex, sql_req, params) from ex
+
+    def safe_execute(
+        self,
+        sql_req: str,
+        params: Optional[List] = None,
+        commit: bool = True,
+        auto_close: bool = True,
+    ) -> Tuple[int, Any]:
+        with self.checkout():
+            cursor = None
+            try:
+                cursor = self.cnx.execute(to_sqlite_query(sql_req), params or [])
+                if commit:
+                    self.cnx.commit()
+                return cursor.rowcount, cursor.lastrowid
+            except sqlite3.Error as ex:
+                self.cnx.rollback()
+                raise self._to_app_exception(ex, sql_req, params) from ex
+            finally:
+                if cursor is not None:
+                    cursor.close()
+
+    def rollback(self):
+        self.cnx.rollback()
+
+    def commit(self):
+        self.cnx.commit()
+
+    def _to_app_exception(self, ex: sqlite3.Error, sql_req: str, params=None) -> AppDBError:
+        self.logger.error(str(ex), extra={"sql_request": sql_req, "sql_params": str(params)})
+        if isinstance(ex, sqlite3.OperationalError) and "locked" in str(ex):
+            return AppDBRetryableError(message=ERROR_CANNOT_EXECUTE_SQLITE_COMMAND, ex=ex, error_type="SQLiteLocked")
+
+        return AppDBError(message=ERROR_CANNOT_EXECUTE_SQLITE_COMMAND, ex=ex, error_type=ex.__class__.__name__)
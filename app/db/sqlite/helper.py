@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import functools
+import re
+import sqlite3
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from app.db.frame import rows_to_frame
+from app.db.stats import query_stats
+from app.misc.utils import chunked
+
+_RE_PYFORMAT_PLACEHOLDER = re.compile(r"%s|%%")
+
+
+def get_sqlite_cnx(config: dict) -> sqlite3.Connection:
+    # the connection is shared by the threads of the process, the callers serialize its use
+    return sqlite3.connect(config["database"], check_same_thread=False)
+
+
+@functools.lru_cache(maxsize=1024)
+def to_sqlite_query(sql_req: str) -> str:
+    """Convert a query using the "%s" placeholders of pymysql/psycopg2 to the "?" placeholders of sqlite3"""
+    return _RE_PYFORMAT_PLACEHOLDER.sub(lambda match: "?" if match.group(0) == "%s" else "%", sql_req)
+
+
+def seed_database(connection: sqlite3.Connection, rows: int = 1000) -> None:
+    """Create and fill the tables queried by the application (pg_class like catalog)"""
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS pg_class ("
+        " oid INTEGER PRIMARY KEY, relname TEXT NOT NULL, relkind TEXT NOT NULL DEFAULT 'r',"
+        " relpages INTEGER NOT NULL DEFAULT 0, reltuples REAL NOT NULL DEFAULT 0)"
+    )
+    if connection.execute("SELECT COUNT(*) FROM pg_class").fetchone()[0] == 0:
+        # tables, indexes, views and sequences of various sizes
+        connection.executemany(
+            "INSERT INTO pg_class (oid, relname, relkind, relpages, reltuples) VALUES (?, ?, ?, ?, ?)",
+            ((i, f"table{i}", "rivS"[i % 4], i * 7 % 100, i * 7 % 100 * 50.0) for i in range(rows)),
+        )
+    connection.commit()
+
+
+def sql_select(
+    connection: sqlite3.Connection,
+    sql_req: str,
+    params: Optional[List] = None,
+    as_dict: bool = False,
+) -> List:
+    cursor = connection.cursor()
+    try:
+        with query_stats.measure(sql_req) as timer:
+            cursor.execute(to_sqlite_query(sql_req), params or [])
+            rows = cursor.fetchall()
+            if as_dict:
+                columns = [column[0] for column in cursor.description]
+                rows = [dict(zip(columns, row)) for row in rows]
+            timer.set_result(rows)
+        return rows
+    finally:
+        cursor.close()
+
+
+def sql_execute(
+    connection: sqlite3.Connection,
+    sql_req: str,
+    params: Optional[List] = None,
+    commit: bool = True,
+) -> int:
+    cursor = connection.cursor()
+    try:
+        with query_stats.measure(sql_req) as timer:
+            cursor.execute(to_sqlite_query(sql_req), params or [])
+            timer.rows = max(cursor.rowcount, 0)
+        if commit:
+            connection.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def sql_select_stream(
+    connection: sqlite3.Connection,
+    sql_req: str,
+    params: Optional[List] = None,
+    batch_size: int = 1000,
+    lock: Optional[ContextManager] = None,
+) -> Iterator[List]:
+    """Execute a select and yield the rows in batches, the lock is held while a batch is fetched only"""
+    lock = lock or contextlib.nullcontext()
+    cursor = connection.cursor()
+    try:
+        with lock:
+            cursor.execute(to_sqlite_query(sql_req), params or [])
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            yield rows
+            with lock:
+                rows = cursor.fetchmany(batch_size)
+    finally:
+        with lock:
+            cursor.close()
+
+
+def sql_select_frame(
+    connection: sqlite3.Connection,
+    sql_req: str,
+    params: Optional[List] = None,
+    dtypes: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """Execute a select and return the result as a DataFrame, sqlite columns are typed from the values"""
+    cursor = connection.cursor()
+    try:
+        with query_stats.measure(sql_req) as timer:
+            cursor.execute(to_sqlite_query(sql_req), params or [])
+            rows = cursor.fetchall()
+            timer.set_result(rows)
+        columns = [column[0] for column in cursor.description]
+    finally:
+        cursor.close()
+
+    return rows_to_frame(rows, columns, dtypes)
+
+
+def sql_execute_many(
+    connection: sqlite3.Connection,
+    sql_req: str,
+    params_seq: Iterable,
+    batch_size: int = 1000,
+    commit: bool = True,
+) -> List[int]:
+    """
+    Execute a statement for each parameter set, batch_size parameter sets at a time.
+
+    Each batch is committed on its own (when commit is set).
+
+    :returns: the number of affected rows of each batch.
+    """
+    affected_rows = []
+    sqlite_req = to_sqlite_query(sql_req)
+    for batch in chunked(params_seq, batch_size):
+        try:
+            cursor = connection.executemany(sqlite_req, batch)
+            affected_rows.append(cursor.rowcount)
+            if commit:
+                connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    return affected_rows
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import functools
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# upper bounds (milliseconds) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+STATS_ORDER_BY = ("total_time", "count", "max_time", "mean_time", "errors", "rows", "bytes")
+
+_RE_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_RE_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql_req: str) -> str:
+    """
+    Return the normalized form of a query: literals and placeholders are replaced by "?",
+    comments and extra spaces are removed, so that the same query with other values shares its statistics.
+    """
+    sql_req = _RE_COMMENT.sub(" ", sql_req)
+    sql_req = _RE_STRING.sub("?", sql_req)
+    sql_req = _RE_PLACEHOLDER.sub("?", sql_req)
+    sql_req = _RE_NUMBER.sub("?", sql_req)
+    sql_req = _RE_IN_LIST.sub("(?+)", sql_req)
+    return _RE_SPACES.sub(" ", sql_req).strip().lower()
+
+
+def estimate_size(rows: Any) -> int:
+    """Return an estimation of the size in bytes of a result set"""
+    if not isinstance(rows, (list, tuple)):
+        return 0
+
+    size = 0
+    for row in rows:
+        for value in row.values() if isinstance(row, dict) else row:
+            size += len(value) if isinstance(value, (str, bytes)) else 8
+    return size
+
+
+class QueryStat:
+    """
+    QueryStat aggregates the executions of one query fingerprint.
+    """
+
+    __slots__ = ("fingerprint", "count", "errors", "total_time", "max_time", "rows", "bytes", "buckets")
+
+    def __init__(self, query_fingerprint: str):
+        self.fingerprint = query_fingerprint
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.count if self.count else 0.0
+
+    def add(self, duration: float, rows: int, nbytes: int, error: bool) -> None:
+        self.count += 1
+        self.errors += error
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.rows += rows
+        self.bytes += nbytes
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, duration * 1000)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Return an estimation (bucket upper bound, in seconds) of the q percentile of the duration"""
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return LATENCY_BUCKETS_MS[i] / 1000 if i < len(LATENCY_BUCKETS_MS) else self.max_time
+        return self.max_time
+
+    def as_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "errors": self.errors,
+            "total_time": self.total_time,
+            "mean_time": self.mean_time,
+            "max_time": self.max_time,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "rows": self.rows,
+            "bytes": self.bytes,
+        }
+
+
+class QueryTimer:
+    """
+    QueryTimer measures one query execution, see QueryStatsRegistry.measure.
+    """
+
+    __slots__ = ("registry", "sql_req", "rows", "bytes", "started_at")
+
+    def __init__(self, registry: "QueryStatsRegistry", sql_req: str):
+        self.registry = registry
+        self.sql_req = sql_req
+        self.rows = 0
+        self.bytes = 0
+        self.started_at = 0.0
+
+    def set_result(self, rows: Any) -> None:
+        self.rows = len(rows) if isinstance(rows, (list, tuple)) else 0
+        self.bytes = estimate_size(rows)
+
+    def __enter__(self) -> "QueryTimer":
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback) -> None:
+        duration = time.perf_counter() - self.started_at
+        self.registry.record(self.sql_req, duration, self.rows, self.bytes, error=exception_type is not None)
+
+
+class QueryStatsRegistry:
+    """
+    QueryStatsRegistry records the duration, row count and size of the executed queries per fingerprint.
+
+    Queries slower than slow_query_threshold seconds are logged.
+    """
+
+    def __init__(
+        self,
+        enable: bool = True,
+        slow_query_threshold: Optional[float] = 1.0,
+        max_fingerprints: int = 1000,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.enable = enable
+        self.slow_query_threshold = slow_query_threshold
+        self.max_fingerprints = max_fingerprints
+        self.logger = logger or logging.getLogger("db")
+        self._lock = threading.Lock()
+        self._stats: Dict[str, QueryStat] = {}
+
+    def configure(self, enable: bool, slow_query_threshold: Optional[float], max_fingerprints: int) -> None:
+        self.enable = enable
+        self.slow_query_threshold = slow_query_threshold
+        self.max_fingerprints = max_fingerprints
+
+    def measure(self, sql_req: Any) -> QueryTimer:
+        """Return a context manager measuring the enclosed query execution"""
+        return QueryTimer(self, sql_req if isinstance(sql_req, str) else str(sql_req))
+
+    def record(self, sql_req: str, duration: float, rows: int = 0, nbytes: int = 0, error: bool = False) -> None:
+        if not self.enable:
+            return
+
+        query_fingerprint = fingerprint(sql_req)
+        with self._lock:
+            stat = self._stats.get(query_fingerprint)
+            if stat is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # too many distinct queries (non parameterized queries?), do not grow without bound
+                    query_fingerprint = "<other>"
+                    stat = self._stats.get(query_fingerprint)
+                if stat is None:
+                    stat = self._stats[query_fingerprint] = QueryStat(query_fingerprint)
+            stat.add(duration, rows, nbytes, error)
+
+        if self.slow_query_threshold is not None and duration >= self.slow_query_threshold:
+            self.logger.warning(
+                "slow query",
+                extra={"sql_fingerprint": query_fingerprint, "duration": duration, "rows": rows, "bytes": nbytes},
+            )
+
+    def top(self, limit: int = 20, order_by: str = "total_time") -> List[dict]:
+        """Return the statistics of the limit queries with the highest order_by value"""
+        if order_by not in STATS_ORDER_BY:
+            raise ValueError(f"Unsupported order: {order_by}")
+
+        with self._lock:
+            stats = [stat.as_dict() for stat in self._stats.values()]
+        return sorted(stats, key=lambda stat: stat[order_by], reverse=True)[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+# process-wide statistics of the queries executed by the database layers
+query_stats = QueryStatsRegistry()
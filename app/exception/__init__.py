@@ -6,5 +6,8 @@ from .auth import JWTExpiredSignatureError as JWTExpiredSignatureError
 from .auth import SSOException as SSOException
 from .db import AppDBConnectionError as AppDBConnectionError
 from .db import AppDBError as AppDBError
+from .db import AppDBPoolExhaustedError as AppDBPoolExhaustedError
+from .db import AppDBQueryCancelledError as AppDBQueryCancelledError
 from .db import AppDBRetryableError as AppDBRetryableError
+from .db import AppDBTimeoutError as AppDBTimeoutError
 from .exception import ConfigException as ConfigException
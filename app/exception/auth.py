@@ -10,7 +10,7 @@ class AuthException(AppException):
 class AuthHeaderException(AppException):
     def __init__(self, *, message: str):
         super().__init__(
-            error=ErrorResponse(code=403, name="AuthHeaderException", message=message),
+            error=ErrorResponse(code="403", name="AuthHeaderException", message=message),
             status_code=403,
             is_warning=True,
         )
@@ -19,7 +19,7 @@ class AuthHeaderException(AppException):
 class JWTDecodeException(AuthException):
     def __init__(self, *, message: str):
         super().__init__(
-            error=ErrorResponse(code=403, name="JWTDecodeException", message=message),
+            error=ErrorResponse(code="403", name="JWTDecodeException", message=message),
             status_code=403,
             is_warning=True,
         )
@@ -28,7 +28,7 @@ class JWTDecodeException(AuthException):
 class JWTExpiredSignatureError(AuthException):
     def __init__(self, *, message: str):
         super().__init__(
-            error=ErrorResponse(code=403, name="JWTExpiredSignatureError", message=message),
+            error=ErrorResponse(code="403", name="JWTExpiredSignatureError", message=message),
             status_code=403,
             is_warning=True,
         )
@@ -37,6 +37,6 @@ class JWTExpiredSignatureError(AuthException):
 class SSOException(AppException):
     def __init__(self, *, message: str):
         super().__init__(
-            error=ErrorResponse(code=403, name="SSOException", message=message),
+            error=ErrorResponse(code="403", name="SSOException", message=message),
             status_code=403,
         )
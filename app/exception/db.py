@@ -20,15 +20,27 @@ class AppDBError(AppException):
 
 
 class AppDBConnectionError(AppDBError):
-    def __init__(self, message: str = "", ex: Exception = None, logger_name: str = "db"):
+    def __init__(
+        self,
+        message: str = "",
+        ex: Exception = None,
+        logger_name: str = "db",
+        error_type: str = "AppDBConnectionError",
+    ):
         super().__init__(
             message=message,
             ex=ex,
-            error_type="AppDBConnectionError",
+            error_type=error_type,
             logger_name=logger_name,
         )
 
 
+class AppDBPoolExhaustedError(AppDBConnectionError):
+    def __init__(self, message: str = "", ex: Exception = None):
+        # no pooled connection became available in time: the database itself did not fail
+        super().__init__(message=message, ex=ex, error_type="AppDBPoolExhaustedError")
+
+
 class AppDBRetryableError(AppDBError):
     def __init__(
         self,
@@ -39,3 +51,19 @@ class AppDBRetryableError(AppDBError):
     ):
         super().__init__(message=message, error_code=error_code, ex=ex, error_type=error_type)
         self.is_permanent_error = False
+
+
+class AppDBQueryCancelledError(AppDBError):
+    def __init__(self, message: str = "", ex: Exception = None):
+        super().__init__(message=message, ex=ex, error_type="AppDBQueryCancelledError")
+        # the client closed the request, nobody reads the response
+        self.status_code = 499
+        self.error.code = "499"
+        self.is_warning = True
+
+
+class AppDBTimeoutError(AppDBError):
+    def __init__(self, message: str = "", ex: Exception = None):
+        super().__init__(message=message, ex=ex, error_type="AppDBTimeoutError")
+        self.status_code = 504
+        self.error.code = "504"
@@ -7,6 +7,9 @@ from pymysql.constants.ER import DUP_ENTRY, LOCK_WAIT_TIMEOUT, NO_SUCH_TABLE, TA
 # Code: 1205 Lock wait timeout exceeded; try restarting transaction
 MYSQL_RECOVERABLE_ERRORS = [2013, 2006, 2003, 1205]
 
+# Code: 3024 Query execution was interrupted, maximum statement execution time exceeded
+MYSQL_ERROR_QUERY_TIMEOUT = 3024
+
 MYSQL_ERRORS = {
     DUP_ENTRY: "Duplicate entry",
     TABLEACCESS_DENIED_ERROR: "Command denied to user",
@@ -15,6 +18,7 @@ MYSQL_ERRORS = {
     2013: "Lost connection to MySQL server during query",
     2006: "MySQL server has gone away",
     2003: "Can't connect to MySQL server",
+    MYSQL_ERROR_QUERY_TIMEOUT: "Maximum statement execution time exceeded",
 }
 
 ERROR_CANNOT_EXECUTE_MYSQL_COMMAND = "cannot execute mysql command"
@@ -0,0 +1 @@
+ERROR_CANNOT_EXECUTE_POSTGRESQL_COMMAND = "cannot execute postgresql command"
@@ -6,16 +6,18 @@ from logging import getLogger
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from starlette.authentication import AuthenticationError
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware import Middleware
-from starlette.middleware.authentication import AuthenticationMiddleware
 from starlette.middleware.cors import CORSMiddleware
 
 from app.client.auth_client import AuthClient
 from app.exception import AppException
+from app.misc.auth_middleware import AuthMiddleware
 from app.misc.constants import ROOT_PATH
 from app.misc.models import ErrorResponse
-from app.misc.permissions_checker import BasicAuthBackend
+from app.misc.permissions_checker import AuthSettings, RoutePermissionTable
 from app.misc.utils import setup
+from app.router.admin import router as routerAdmin
 from app.router.default import router as routerDefault
 from app.router.misc import router as routerMisc
 from app.service.manager import ServiceManager
@@ -27,17 +29,25 @@ async def lifespan(app: FastAPI):
     app.debug = bool(config["fastapi"]["debug"])
     getLogger("app").info("starting program")
     app.state.config = config
+    app.state.auth_settings = AuthSettings(config["auth"])
+    # the permissions required by each route, resolved once from the route metadata
+    app.state.route_permissions = RoutePermissionTable(app.routes)
     # Initialize the Auth client
     app.state.auth_client = AuthClient(config=config)
+    await run_in_threadpool(app.state.auth_client.open)
     # Initialize the service manager
     app.state.service_manager = ServiceManager(
         config=config,
         auth_client=app.state.auth_client,
     )
+    # Open the database connection pools
+    await app.state.service_manager.open()
 
     yield
 
     getLogger("app").info("shutdown program")
+    await app.state.service_manager.close()
+    app.state.auth_client.close()
 
 
 app = FastAPI(
@@ -82,7 +92,8 @@ app = FastAPI(
             allow_methods=["*"],
             allow_headers=["*"],
         ),
-        Middleware(AuthenticationMiddleware, backend=BasicAuthBackend()),
+        # authenticate each request once, the result is stored in the scope
+        Middleware(AuthMiddleware),
     ],
     lifespan=lifespan,
     debug=False,  # when True put the stacktrace of the error in the http response
@@ -96,19 +107,19 @@ async def base_exception_handler(_request: Request, exc: Exception):
     elif isinstance(exc, RequestValidationError):
         ex = AppException(
             status_code=400,
-            error=ErrorResponse(code=400, name=exc.__class__.__name__, message=str(exc)),
+            error=ErrorResponse(code="400", name=exc.__class__.__name__, message=str(exc)),
             ex=exc,
         )
     elif isinstance(exc, AuthenticationError):
         ex = AppException(
             status_code=400,
-            error=ErrorResponse(code=400, name=exc.__class__.__name__, message=str(exc)),
+            error=ErrorResponse(code="400", name=exc.__class__.__name__, message=str(exc)),
             ex=exc,
         )
     else:
         ex = AppException(
             status_code=500,
-            error=ErrorResponse(code=500, name=exc.__class__.__name__, message=str(exc)),
+            error=ErrorResponse(code="500", name=exc.__class__.__name__, message=str(exc)),
             ex=exc,
         )
 
@@ -117,6 +128,7 @@ async def base_exception_handler(_request: Request, exc: Exception):
 
 
 app.include_router(routerDefault.router)
+app.include_router(routerAdmin.router)
 app.include_router(routerMisc.router)
 
 
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from typing import Optional
+
+from starlette.authentication import AuthCredentials, UnauthenticatedUser
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.exception import AppException
+from app.misc.permissions_checker import AuthSettings, authenticate, parse_authorization
+
+
+def get_authorization_header(scope: Scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            return value.decode("latin-1")
+    return None
+
+
+class AuthMiddleware:
+    """
+    AuthMiddleware is a pure ASGI middleware authenticating each request once, before the routing.
+
+    The result is stored in the scope: "auth" and "user" (request.auth and request.user, as with the
+    starlette AuthenticationMiddleware) and "authorization", the parsed (scheme, credentials) header.
+    The requests on the excluded paths (health checks...) are not authenticated.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        scope["auth"] = AuthCredentials()
+        scope["user"] = UnauthenticatedUser()
+        settings: AuthSettings = scope["app"].state.auth_settings
+        if scope["path"] not in settings.excluded_paths:
+            authorization = get_authorization_header(scope)
+            if authorization is not None:
+                try:
+                    scope["authorization"] = parse_authorization(authorization)
+                    result = authenticate(*scope["authorization"], settings)
+                except AppException as ex:
+                    ex.log_exception()
+                    await ex.to_json_response()(scope, receive, send)
+                    return
+
+                if result is not None:
+                    scope["auth"], scope["user"] = result
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0718
+
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    LRUCache is a bounded, thread-safe, in-process cache with a time to live per entry.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    RedisCache is a shared cache tier storing serialized values in Redis.
+    """
+
+    def __init__(self, redis_client, prefix: str = ""):
+        self.redis = redis_client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Tuple[Optional[bytes], Optional[float]]:
+        """Return the value and its remaining time to live in seconds"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(self.prefix + key)
+        pipe.pttl(self.prefix + key)
+        value, pttl = pipe.execute()
+        return value, (pttl / 1000 if pttl and pttl > 0 else None)
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.redis.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def delete(self, key: str) -> None:
+        self.redis.delete(self.prefix + key)
+
+
+class ReadThroughCache:
+    """
+    ReadThroughCache looks up an in-process LRU tier, then an optional Redis tier, then calls the loader.
+
+    Concurrent misses on the same key are serialized so that only one caller runs the loader
+    (stampede protection), the others get the freshly cached value.
+    """
+
+    def __init__(
+        self,
+        lru: LRUCache,
+        redis_cache: Optional[RedisCache] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.lru = lru
+        self.redis_cache = redis_cache
+        self.ttls = ttls or {}
+        self.logger = logger or logging.getLogger("app")
+        self._locks_guard = threading.Lock()
+        self._locks: Dict[str, list] = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {"lru_hits": 0, "redis_hits": 0, "misses": 0, "loads": 0, "redis_errors": 0}
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats, lru_size=len(self.lru))
+
+    def get_ttl(self, name: str) -> Optional[float]:
+        return self.ttls.get(name)
+
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        ttl: float,
+        dumps: Callable[[Any], str],
+        loads: Callable[[bytes], Any],
+    ) -> Any:
+        value = self._lookup(key, loads, count_miss=False)
+        if value is not _MISSING:
+            return value
+
+        lock = self._acquire_key_lock(key)
+        try:
+            with lock[0]:
+                # another caller may have loaded the value while we were waiting
+                value = self._lookup(key, loads, count_miss=True)
+                if value is not _MISSING:
+                    return value
+
+                value = loader()
+                self._incr("loads")
+                self.lru.set(key, value, ttl)
+                if self.redis_cache is not None:
+                    try:
+                        self.redis_cache.set(key, dumps(value), ttl)
+                    except Exception as ex:
+                        self._incr("redis_errors")
+                        self.logger.warning("cannot write the redis cache", extra={"error": str(ex), "key": key})
+                return value
+        finally:
+            self._release_key_lock(key, lock)
+
+    def invalidate(self, key: str) -> None:
+        self.lru.delete(key)
+        if self.redis_cache is not None:
+            try:
+                self.redis_cache.delete(key)
+            except Exception as ex:
+                # the redis entry expires with its ttl
+                self._incr("redis_errors")
+                self.logger.warning("cannot delete from the redis cache", extra={"error": str(ex), "key": key})
+
+    def _lookup(self, key: str, loads: Callable[[bytes], Any], count_miss: bool) -> Any:
+        value = self.lru.get(key, _MISSING)
+        if value is not _MISSING:
+            self._incr("lru_hits")
+            return value
+
+        if self.redis_cache is not None:
+            try:
+                raw, remaining_ttl = self.redis_cache.get(key)
+            except Exception as ex:
+                self._incr("redis_errors")
+                self.logger.warning("cannot read the redis cache", extra={"error": str(ex), "key": key})
+                raw = None
+
+            if raw is not None:
+                value = loads(raw)
+                self.lru.set(key, value, remaining_ttl)
+                self._incr("redis_hits")
+                return value
+
+        if count_miss:
+            self._incr("misses")
+        return _MISSING
+
+    def _acquire_key_lock(self, key: str) -> list:
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = [threading.Lock(), 0]
+            lock[1] += 1
+            return lock
+
+    def _release_key_lock(self, key: str, lock: list) -> None:
+        with self._locks_guard:
+            lock[1] -= 1
+            if not lock[1]:
+                del self._locks[key]
+
+    def _incr(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+
+def make_cache_key(name: str, args: tuple, kwargs: dict) -> str:
+    return f"{name}:{json.dumps([args, kwargs], sort_keys=True, default=str, separators=(',', ':'))}"
+
+
+def cached(name: str, model: Type[BaseModel]):
+    """
+    Returns a read-through cache decorator for methods of objects with a "cache" attribute.
+
+    The method result is cached only when a time to live is configured for name.
+
+    :param name: the query name, used in the cache key and to look up its time to live.
+    :param model: the pydantic model returned by the method, used to (de)serialize the Redis tier.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def inner(self, *args, **kwargs):
+            cache: Optional[ReadThroughCache] = self.cache
+            ttl = cache.get_ttl(name) if cache is not None else None
+            if not ttl:
+                return method(self, *args, **kwargs)
+
+            return cache.get_or_load(
+                key=make_cache_key(name, args, kwargs),
+                loader=lambda: method(self, *args, **kwargs),
+                ttl=ttl,
+                dumps=lambda value: value.model_dump_json(by_alias=True),
+                loads=model.model_validate_json,
+            )
+
+        return inner
+
+    return decorator
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0718
+
+import asyncio
+import contextlib
+import logging
+import threading
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+_cancellation_token: ContextVar[Optional["CancellationToken"]] = ContextVar("cancellation_token", default=None)
+
+
+class CancellationToken:
+    """
+    CancellationToken tells the work done for a request that its result is no longer expected.
+
+    Callbacks registered by the work in progress (e.g. cancel the running query) are called once on cancel.
+    """
+
+    def __init__(self):
+        # callbacks are called with the lock held, so that once unregistered a callback is not running
+        self._lock = threading.RLock()
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+        self._next_id = 0
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+
+            self._cancelled = True
+            for callback in list(self._callbacks.values()):
+                try:
+                    callback()
+                except Exception as ex:
+                    logging.getLogger("app").warning("cancellation callback failed", extra={"error": str(ex)})
+            self._callbacks.clear()
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Register a callback (called at once when already cancelled), return the function unregistering it"""
+        with self._lock:
+            if self._cancelled:
+                callback()
+                return lambda: None
+
+            callback_id = self._next_id
+            self._next_id += 1
+            self._callbacks[callback_id] = callback
+
+        def unregister() -> None:
+            with self._lock:
+                self._callbacks.pop(callback_id, None)
+
+        return unregister
+
+
+@contextlib.contextmanager
+def cancellation_scope(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """Make token the cancellation token of the current context"""
+    context_token = _cancellation_token.set(token)
+    try:
+        yield token
+    finally:
+        _cancellation_token.reset(context_token)
+
+
+def get_cancellation_token() -> Optional[CancellationToken]:
+    return _cancellation_token.get()
+
+
+def is_cancelled() -> bool:
+    token = _cancellation_token.get()
+    return token is not None and token.cancelled
+
+
+@contextlib.contextmanager
+def on_cancel(callback: Callable[[], None]) -> Iterator[None]:
+    """Call callback if the current context is cancelled while the block is running"""
+    token = _cancellation_token.get()
+    unregister = token.register(callback) if token is not None else None
+    try:
+        yield
+    finally:
+        if unregister is not None:
+            unregister()
+
+
+@contextlib.asynccontextmanager
+async def cancel_on_disconnect(request: Request) -> AsyncIterator[CancellationToken]:
+    """
+    Cancel the work of the enclosed block when the client disconnects (ASGI "http.disconnect").
+
+    The request body is consumed by the watcher, so this is meant for requests without a body.
+    """
+    token = CancellationToken()
+
+    async def watch() -> None:
+        while True:
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                # the callbacks may block (e.g. KILL QUERY on a side connection)
+                await run_in_threadpool(token.cancel)
+                return
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        with cancellation_scope(token):
+            yield token
+    finally:
+        watcher.cancel()
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Iterator, Optional, Tuple, Type
+
+from app.exception import AppDBConnectionError
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# seconds between two attempts of a coroutine waiting for a bulkhead slot
+ASYNC_POLL_INTERVAL = 0.005
+
+
+class CircuitBreaker:
+    """
+    CircuitBreaker stops calling a backend whose failure rate is too high.
+
+    The failure rate is computed over the calls of a sliding time window. Once it reaches
+    failure_rate_threshold (and at least minimum_calls were made) the breaker opens and calls fail fast
+    for open_timeout seconds, then up to half_open_max_calls probe calls are let through (half open):
+    the breaker closes when they all succeed, and opens again as soon as one fails.
+
+    Only the exceptions are counted as failures, except the excluded_exceptions (local conditions such as
+    an exhausted connection pool) which record no outcome.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 10,
+        window: float = 30.0,
+        open_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        exceptions: Tuple[Type[Exception], ...] = (Exception,),
+        excluded_exceptions: Tuple[Type[Exception], ...] = (),
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.exceptions = exceptions
+        self.excluded_exceptions = excluded_exceptions
+        self.logger = logger or logging.getLogger("db")
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        # (timestamp, failed) of the calls of the window
+        self._calls: deque = deque()
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, name=self.name, state=self._current_state())
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Run the enclosed block through the breaker, raise AppDBConnectionError when it is open"""
+        self.before_call()
+        try:
+            yield
+        except self.excluded_exceptions:
+            # the call did not reach the backend
+            self.on_abandon()
+            raise
+        except self.exceptions:
+            self.on_failure()
+            raise
+        except Exception:
+            # errors of the caller (bad request...) do not say anything about the backend health
+            self.on_success()
+            raise
+        except BaseException:
+            # abandoned call (closed stream, cancelled task...): no outcome is recorded
+            self.on_abandon()
+            raise
+        else:
+            self.on_success()
+
+    def before_call(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_OPEN or (state == STATE_HALF_OPEN and self._half_open_calls >= self.half_open_max_calls):
+                self._stats["rejected"] += 1
+                raise AppDBConnectionError(f"Circuit breaker {self.name} is open")
+
+            if state == STATE_HALF_OPEN:
+                self._half_open_calls += 1
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._stats["successes"] += 1
+            if self._current_state() == STATE_HALF_OPEN:
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self._close()
+                return
+
+            self._record(False)
+
+    def on_abandon(self) -> None:
+        with self._lock:
+            if self._current_state() == STATE_HALF_OPEN:
+                # give the probe slot back
+                self._half_open_calls = max(self._half_open_calls - 1, 0)
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._stats["failures"] += 1
+            if self._current_state() == STATE_HALF_OPEN:
+                self._open()
+                return
+
+            self._record(True)
+            failures = sum(1 for _, failed in self._calls if failed)
+            if len(self._calls) >= self.minimum_calls and failures / len(self._calls) >= self.failure_rate_threshold:
+                self._open()
+
+    def _current_state(self) -> str:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_timeout:
+            self._state = STATE_HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+            self.logger.info("circuit breaker half open", extra={"circuit_breaker": self.name})
+        return self._state
+
+    def _record(self, failed: bool) -> None:
+        now = time.monotonic()
+        self._calls.append((now, failed))
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _open(self) -> None:
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._stats["opened"] += 1
+        self.logger.warning("circuit breaker open", extra={"circuit_breaker": self.name})
+
+    def _close(self) -> None:
+        self._state = STATE_CLOSED
+        self._calls.clear()
+        self.logger.info("circuit breaker closed", extra={"circuit_breaker": self.name})
+
+
+class Bulkhead:
+    """
+    Bulkhead caps the number of concurrent calls to a backend, so that a slow backend cannot
+    hold every worker thread. Callers wait up to max_wait seconds for a slot.
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 10, max_wait: float = 0.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._stats = {"in_flight": 0, "rejected": 0}
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, name=self.name, max_concurrent=self.max_concurrent)
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Run the enclosed block in a slot, raise AppDBConnectionError when no slot is available in time"""
+        if self.max_wait > 0:
+            acquired = self._semaphore.acquire(timeout=self.max_wait)
+        else:
+            acquired = self._semaphore.acquire(blocking=False)
+
+        self._enter(acquired)
+        try:
+            yield
+        finally:
+            self._leave()
+
+    @contextlib.asynccontextmanager
+    async def async_guard(self) -> AsyncIterator[None]:
+        """Same as guard for coroutines, the event loop is not blocked while waiting for a slot"""
+        expires_at = time.monotonic() + self.max_wait
+        acquired = self._semaphore.acquire(blocking=False)
+        while not acquired and time.monotonic() < expires_at:
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+            acquired = self._semaphore.acquire(blocking=False)
+
+        self._enter(acquired)
+        try:
+            yield
+        finally:
+            self._leave()
+
+    def _enter(self, acquired: bool) -> None:
+        if not acquired:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise AppDBConnectionError(f"Too many concurrent queries on {self.name}")
+
+        with self._lock:
+            self._stats["in_flight"] += 1
+
+    def _leave(self) -> None:
+        with self._lock:
+            self._stats["in_flight"] -= 1
+        self._semaphore.release()
+
+
+@contextlib.contextmanager
+def guarded(circuit_breaker: Optional[CircuitBreaker], bulkhead: Optional[Bulkhead]) -> Iterator[None]:
+    """Run the enclosed block through the bulkhead then the circuit breaker (each one may be None)"""
+    with contextlib.ExitStack() as stack:
+        if bulkhead is not None:
+            stack.enter_context(bulkhead.guard())
+        if circuit_breaker is not None:
+            stack.enter_context(circuit_breaker.guard())
+        yield
+
+
+@contextlib.asynccontextmanager
+async def guarded_async(circuit_breaker: Optional[CircuitBreaker], bulkhead: Optional[Bulkhead]) -> AsyncIterator[None]:
+    """Same as guarded for coroutines"""
+    async with contextlib.AsyncExitStack() as stack:
+        if bulkhead is not None:
+            await stack.enter_async_context(bulkhead.async_guard())
+        if circuit_breaker is not None:
+            stack.enter_context(circuit_breaker.guard())
+        yield
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import time
+from contextvars import ContextVar
+from typing import Iterator, Mapping, Optional
+
+from app.exception import AppException
+
+# header used by the clients to shorten the time they are willing to wait (seconds)
+REQUEST_TIMEOUT_HEADER = "x-request-timeout"
+
+# absolute time.monotonic() value after which the current request should give up
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(timeout: Optional[float]) -> Iterator[None]:
+    """
+    Set a deadline for the current context (request, task...), timeout seconds from now.
+
+    A nested deadline can only shorten the current one.
+    """
+    if timeout is None:
+        yield
+        return
+
+    expires_at = time.monotonic() + timeout
+    current = _deadline.get()
+    if current is not None:
+        expires_at = min(expires_at, current)
+
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_remaining_time() -> Optional[float]:
+    """Return the seconds left before the current deadline, None when there is no deadline"""
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+
+    return max(expires_at - time.monotonic(), 0.0)
+
+
+def get_operation_timeout(db_config: dict, operation_id: Optional[str]) -> Optional[float]:
+    """Return the configured timeout of an operation, by default the request timeout"""
+    return db_config.get("operation_timeouts", {}).get(operation_id, db_config.get("request_timeout"))
+
+
+def get_request_timeout(headers: Mapping[str, str], db_config: dict, operation_id: Optional[str]) -> Optional[float]:
+    """
+    Return the timeout of a request: the per operation timeout (or the default request timeout),
+    shortened by the request timeout header if any.
+    """
+    timeout = get_operation_timeout(db_config, operation_id)
+    header = headers.get(REQUEST_TIMEOUT_HEADER)
+    if not header:
+        return timeout
+
+    try:
+        requested = float(header)
+        if requested <= 0:
+            raise ValueError(header)
+    except ValueError as ex:
+        raise AppException(
+            status_code=400,
+            message=f"Invalid {REQUEST_TIMEOUT_HEADER} header: {header}",
+            error_type="InvalidRequestTimeout",
+            ex=ex,
+            is_warning=True,
+        ) from ex
+
+    return min(timeout, requested) if timeout else requested
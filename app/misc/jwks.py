@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0718
+
+import json
+import logging
+import threading
+import time
+import urllib.request
+from typing import Dict, Optional
+
+import jwt
+
+from app.exception import JWTDecodeException
+
+
+def get_jwks_url(sso_cfg: dict) -> str:
+    """Return the JWKS url of the SSO configuration, by default the certs endpoint of the Keycloak realm"""
+    jwks_url = sso_cfg.get("jwks", {}).get("url")
+    if jwks_url:
+        return jwks_url
+
+    return f"{sso_cfg['host'].rstrip('/')}/realms/{sso_cfg['realm_name']}/protocol/openid-connect/certs"
+
+
+class JWKSKeyStore:
+    """
+    JWKSKeyStore keeps the signing keys of a JSON Web Key Set (JWKS) in memory, by key id (kid).
+
+    The keys are fetched again by a background thread every refresh_interval seconds, before they
+    expire (cache_ttl seconds after the last successful fetch). On an unknown kid (key rotation), a single
+    caller fetches the keys with a miss_timeout timeout, at most once every min_refresh_interval seconds,
+    while the concurrent callers wait for it at most miss_timeout seconds.
+
+    The url may be a file:// url (local stand-in JWKS for tests and development).
+    """
+
+    def __init__(
+        self,
+        url: str = "",
+        cache_ttl: float = 3600.0,
+        refresh_interval: float = 600.0,
+        min_refresh_interval: float = 10.0,
+        timeout: float = 5.0,
+        miss_timeout: float = 1.0,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.url = url
+        self.cache_ttl = cache_ttl
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.miss_timeout = miss_timeout
+        self.logger = logger or logging.getLogger("app")
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at: Optional[float] = None
+        self._attempted_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # held by the caller fetching the keys of an unknown kid
+        self._miss_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"fetches": 0, "fetch_errors": 0, "unknown_kids": 0}
+
+    def configure(
+        self,
+        url: str,
+        cache_ttl: float = 3600.0,
+        refresh_interval: float = 600.0,
+        min_refresh_interval: float = 10.0,
+        timeout: float = 5.0,
+        miss_timeout: float = 1.0,
+    ) -> None:
+        with self._lock:
+            self.url = url
+            self.cache_ttl = cache_ttl
+            self.refresh_interval = refresh_interval
+            self.min_refresh_interval = min_refresh_interval
+            self.timeout = timeout
+            self.miss_timeout = miss_timeout
+            self._keys = {}
+            self._fetched_at = None
+            self._attempted_at = None
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, keys=len(self._keys), fetched_at=self._fetched_at)
+
+    def start(self) -> None:
+        """Fetch the keys and start refreshing them in the background"""
+        self.refresh(force=True)
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._refresh_loop, name="jwks-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout)
+            self._thread = None
+
+    def get_signing_key(self, kid: Optional[str]) -> jwt.PyJWK:
+        """Return the key of a kid, raise JWTDecodeException when the key set does not have it"""
+        key = self._get_key(kid)
+        if key is None:
+            with self._lock:
+                self._stats["unknown_kids"] += 1
+            # unknown kid (the keys may have been rotated) or expired keys
+            self._fetch_missing_keys()
+            key = self._get_key(kid)
+        if key is None:
+            raise JWTDecodeException(message=f"jwt: no signing key for kid {kid}")
+
+        return key
+
+    def _get_key(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        with self._lock:
+            return self._keys.get(kid) if not self._is_expired() else None
+
+    def _fetch_missing_keys(self) -> None:
+        """Fetch the key set (rate limited) in a single caller, the others wait for it at most miss_timeout"""
+        if self._miss_lock.acquire(blocking=False):
+            try:
+                self.refresh(timeout=self.miss_timeout)
+            finally:
+                self._miss_lock.release()
+        elif self._miss_lock.acquire(timeout=self.miss_timeout):
+            self._miss_lock.release()
+
+    def refresh(self, force: bool = False, timeout: Optional[float] = None) -> bool:
+        """Fetch the key set, unless it was attempted less than min_refresh_interval seconds ago"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._attempted_at is not None and now - self._attempted_at < self.min_refresh_interval:
+                return False
+
+            self._attempted_at = now
+            url = self.url
+
+        try:
+            with urllib.request.urlopen(url, timeout=timeout or self.timeout) as response:
+                key_set = jwt.PyJWKSet.from_dict(json.loads(response.read()))
+        except Exception as ex:
+            # the current keys are kept until they expire
+            with self._lock:
+                self._stats["fetch_errors"] += 1
+            self.logger.warning("cannot fetch the JWKS", extra={"jwks_url": url, "error": str(ex)})
+            return False
+
+        keys = {key.key_id: key for key in key_set.keys}
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self._stats["fetches"] += 1
+        return True
+
+    def _is_expired(self) -> bool:
+        return self._fetched_at is None or time.monotonic() - self._fetched_at >= self.cache_ttl
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh(force=True)
+
+
+jwks_key_store = JWKSKeyStore()
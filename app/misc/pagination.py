@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import base64
+import binascii
+import json
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from app.exception import AppException
+
+T = TypeVar("T")
+
+CURSOR_VERSION = 1
+
+
+def encode_cursor(last_id: int) -> str:
+    """Encode the key of the last returned row into an opaque cursor token."""
+    payload = json.dumps({"v": CURSOR_VERSION, "id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> int:
+    """Decode an opaque cursor token into the key of the last returned row."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if payload["v"] != CURSOR_VERSION or not isinstance(payload["id"], int):
+            raise ValueError("unsupported cursor")
+        return payload["id"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError) as ex:
+        raise AppException(
+            status_code=400,
+            message="Invalid pagination cursor",
+            error_type="InvalidCursor",
+            ex=ex,
+            is_warning=True,
+        ) from ex
+
+
+def paginate(items: List[T], limit: int, key: Callable[[T], int]) -> Tuple[List[T], Optional[str]]:
+    """
+    Split the rows of a keyset query fetched with limit + 1 rows.
+
+    :returns: the page (at most limit items) and the cursor of the next page (None on the last page).
+    """
+    if len(items) <= limit:
+        return items, None
+
+    page = items[:limit]
+    return page, encode_cursor(key(page[-1]))
@@ -1,14 +1,19 @@
 # pylint: disable=R1720,R1705,R0911
+import hashlib
+import threading
+import time
 from base64 import b64decode
-from typing import Optional, Tuple
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 import jwt
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from starlette.authentication import AuthCredentials, AuthenticationBackend, BaseUser, UnauthenticatedUser
+from starlette.authentication import AuthCredentials, BaseUser, UnauthenticatedUser
 
 from app.exception import AppException, AuthException, AuthHeaderException, JWTDecodeException, JWTExpiredSignatureError
+from app.misc.cache import LRUCache
 from app.misc.constants import TAG_ADMIN
+from app.misc.jwks import jwks_key_store
 
 
 class AuthenticatedUser(BaseUser):
@@ -29,82 +34,97 @@ class AuthenticatedUser(BaseUser):
         return str(self.token["identity_id"])
 
 
+class AuthSettings:
+    """
+    AuthSettings is the authentication configuration, read once instead of on every request.
+    """
+
+    def __init__(self, auth_cfg: dict):
+        self.sso_enabled = bool(auth_cfg["sso"]["enable"])
+        self.basic_enabled = bool(auth_cfg["basic"]["enable"])
+        self.basic_login = auth_cfg["basic"]["login"]
+        self.basic_password = auth_cfg["basic"]["password"]
+        self.excluded_paths = frozenset(auth_cfg.get("excluded_paths", []))
+
+    @property
+    def enabled(self) -> bool:
+        return self.sso_enabled or self.basic_enabled
+
+
 class OptionalHTTPBearer(HTTPBearer):
     """
     Optional HTTP Bearer.
 
     This class is used to make the HTTP Bearer optional (disabled in configuration).
+    The Authorization header is parsed by AuthMiddleware, this dependency only documents the security scheme.
     """
 
     async def __call__(self, request: Request) -> Optional[HTTPAuthorizationCredentials]:
         """Call."""
-        if not request.app.state.config["auth"]["sso"]["enable"]:
+        if not request.app.state.auth_settings.sso_enabled:
             return
 
-        try:
-            return await super().__call__(request)
-        except (Exception, HTTPException) as exp:
+        authorization = request.scope.get("authorization")
+        if authorization is None or authorization[0] != "bearer":
             ex = AppException(
                 status_code=401,
                 message="Missing authorization token",
-                error_type=exp.__class__.__name__,
+                error_type="HTTPException",
                 is_warning=True,
             )
             ex.log_exception()
             return None
 
+        return HTTPAuthorizationCredentials(scheme=authorization[0], credentials=authorization[1])
 
-class BasicAuthBackend(AuthenticationBackend):
-    async def authenticate(self, conn) -> Optional[Tuple["AuthCredentials", "BaseUser"]]:
-        auth_cfg = conn.app.state.config["auth"]
 
-        if "Authorization" not in conn.headers:
-            # no auth header, therefore the user is not authenticated
-            return None
+def parse_authorization(authorization: str) -> Tuple[str, str]:
+    """Split an Authorization header into its lower case scheme and its credentials"""
+    try:
+        scheme, credentials = authorization.split()
+    except ValueError as ex:
+        # invalid auth header
+        raise AuthHeaderException(message="Invalid Authorization header") from ex
+
+    return scheme.lower(), credentials
 
-        auth = conn.headers["Authorization"]
-        try:
-            scheme, credentials = auth.split()
-            scheme = scheme.lower()
-            if scheme == "bearer":
-                # bearer auth scheme
-                if auth_cfg["sso"]["enable"]:
-                    # decode the json web token
-                    token = decode_jwt_token(credentials)
-                    return AuthCredentials(["authenticated"]), AuthenticatedUser(token=token, auth_method=scheme)
-                else:
-                    # SSO may be disabled for local development and testing
-                    return None
-
-            elif scheme == "basic":
-                # basic auth scheme
-                if auth_cfg["basic"]["enable"]:
-                    b64decoded = b64decode(credentials).decode("utf-8")
-                    login, password = b64decoded.split(":")
-                    if login != auth_cfg["basic"]["login"] or password != auth_cfg["basic"]["password"]:
-                        # invalid login or password
-                        raise AuthException(message="Invalid password")
-
-                    return AuthCredentials(["authenticated"]), AuthenticatedUser(
-                        token={"email": login, "identity_id": login}, auth_method=scheme
-                    )
-                else:
-                    # basic auth is disabled
-                    return None
 
+def authenticate(scheme: str, credentials: str, settings: AuthSettings) -> Optional[Tuple[AuthCredentials, BaseUser]]:
+    """Authenticate the credentials of an Authorization header, return None when the scheme is disabled"""
+    try:
+        if scheme == "bearer":
+            # bearer auth scheme
+            if settings.sso_enabled:
+                # decode the json web token
+                token = decode_jwt_token(credentials)
+                return AuthCredentials(["authenticated"]), AuthenticatedUser(token=token, auth_method=scheme)
+            else:
+                # SSO may be disabled for local development and testing
+                return None
+
+        elif scheme == "basic":
+            # basic auth scheme
+            if settings.basic_enabled:
+                b64decoded = b64decode(credentials).decode("utf-8")
+                login, password = b64decoded.split(":")
+                if login != settings.basic_login or password != settings.basic_password:
+                    # invalid login or password
+                    raise AuthException(message="Invalid password")
+
+                return AuthCredentials(["authenticated"]), AuthenticatedUser(
+                    token={"email": login, "identity_id": login}, auth_method=scheme
+                )
             else:
-                # unsupported auth scheme
-                return AuthCredentials(), UnauthenticatedUser()
+                # basic auth is disabled
+                return None
 
-        except ValueError as ex:
-            # invalid auth header
-            raise AuthHeaderException(message="Invalid Authorization header") from ex
-        except jwt.ExpiredSignatureError:
-            # the token has expired
-            raise JWTDecodeException(message="jwt: token ExpiredSignatureError") from jwt.ExpiredSignatureError
-        except jwt.DecodeError:
-            # the token is invalid
-            raise JWTDecodeException(message="jwt: token DecodeError") from jwt.DecodeError
+        else:
+            # unsupported auth scheme
+            return AuthCredentials(), UnauthenticatedUser()
+
+    except ValueError as ex:
+        # invalid auth header
+        raise AuthHeaderException(message="Invalid Authorization header") from ex
 
 
 async def user_is_authenticated(
@@ -114,9 +134,7 @@ async def user_is_authenticated(
     """Check if the user is authenticated."""
 
     # Assume the user is authenticated
-    auth_sso_enabled = request.app.state.config["auth"]["sso"]["enable"]
-    auth_basic_enabled = request.app.state.config["auth"]["basic"]["enable"]
-    if not auth_sso_enabled and not auth_basic_enabled:
+    if not request.app.state.auth_settings.enabled:
         return
 
     if not request.user.is_authenticated:
@@ -130,23 +148,109 @@ async def user_is_authenticated(
         # it's only used by trusted inner services (sophia live)
         return
 
-    # Check if the user has admin permissions
-    if TAG_ADMIN in request.scope["route"].tags:
-        if not request.app.state.auth_client.user_has_admin_role(user_uuid=request.user.identity):
+    # Check if the user has the roles required by the route (admin...)
+    required_roles = get_route_permissions(request).required_roles
+    if required_roles:
+        user_roles = request.app.state.auth_client.get_user_roles(user_uuid=request.user.identity, request=request)
+        if not required_roles.issubset(user_roles):
             raise AppException(
                 status_code=403,
-                message=f"User {request.user.display_name} does not have admin permissions",
+                message=f"User {request.user.display_name} does not have {'/'.join(sorted(required_roles))}"
+                " permissions",
             )
 
 
+# roles required by the routes of a tag
+TAG_REQUIRED_ROLES = {TAG_ADMIN: "admin"}
+
+
+class RoutePermissions:
+    """
+    RoutePermissions is what a route requires from the user, resolved once from the route metadata:
+    authentication (user_is_authenticated dependency), roles (tags) and the operation permission (operation_id).
+    """
+
+    def __init__(
+        self,
+        operation_id: Optional[str] = None,
+        required_roles: Iterable[str] = (),
+        authenticated: bool = False,
+    ):
+        self.operation_id = operation_id
+        self.required_roles = frozenset(required_roles)
+        self.authenticated = authenticated
+
+    @property
+    def is_public(self) -> bool:
+        return not self.authenticated and not self.required_roles
+
+    @classmethod
+    def from_route(cls, route) -> "RoutePermissions":
+        dependant = getattr(route, "dependant", None)
+        authenticated = dependant is not None and any(
+            dependency.call is user_is_authenticated for dependency in dependant.dependencies
+        )
+        tags = getattr(route, "tags", None) or []
+        return cls(
+            operation_id=getattr(route, "operation_id", None) if authenticated else None,
+            required_roles=[TAG_REQUIRED_ROLES[tag] for tag in tags if tag in TAG_REQUIRED_ROLES],
+            authenticated=authenticated,
+        )
+
+
+_PUBLIC_ROUTE = RoutePermissions()
+
+
+class RoutePermissionTable:
+    """
+    RoutePermissionTable maps the routes of the application to their permissions, it is built at startup
+    so that a request resolves its permissions with a dict lookup.
+
+    The routes are keyed by identity: the unique id of a route is derived from its operation id, which
+    several routes may share, and the starlette routes are not hashable (they define __eq__).
+    """
+
+    def __init__(self, routes: Iterable = ()):
+        # id(route) -> (route, permissions), the route is kept so that its id is not reused
+        self._permissions: Dict[int, Tuple[Any, RoutePermissions]] = {}
+        for route in routes:
+            self.add(route)
+
+    def add(self, route) -> RoutePermissions:
+        permissions = RoutePermissions.from_route(route)
+        self._permissions[id(route)] = (route, permissions)
+        return permissions
+
+    def get(self, route) -> RoutePermissions:
+        if route is None:
+            return _PUBLIC_ROUTE
+
+        entry = self._permissions.get(id(route))
+        # routes added after startup are resolved on their first request
+        return entry[1] if entry is not None else self.add(route)
+
+    def __len__(self) -> int:
+        return len(self._permissions)
+
+
+def get_route_permissions(request: Request) -> RoutePermissions:
+    return request.app.state.route_permissions.get(request.scope.get("route"))
+
+
 def check_demo_permissions(
     request: Request,
-    operation_id: str,
+    operation_id: Optional[str] = None,
     **kwargs,
 ) -> None:
-    # note: the variable "operation_id" can be used to check the permissions for the specific operation
+    """Check that the user may run the operation, by default the operation of the route (operation_id)"""
+    if operation_id is None:
+        operation_id = get_route_permissions(request).operation_id
+        if operation_id is None:
+            # the route has no operation permission
+            return
+
     try:
-        if not request.user.is_authenticated and not request.app.state.config["auth"]["sso"]["enable"]:
+        if not request.user.is_authenticated and not request.app.state.auth_settings.sso_enabled:
             # Debug mode: no user is authenticated and SSO is disabled
             return
 
@@ -174,23 +278,99 @@ def check_demo_permissions(
             )
 
 
+class DecodedTokenCache:
+    """
+    DecodedTokenCache keeps the claims of the recently decoded JWT tokens, keyed by the SHA-256 digest
+    of the token (the tokens themselves are not kept in memory).
+
+    An entry expires with its token ("exp" claim), or after max_ttl seconds, the least recently used
+    entries are evicted beyond max_size entries.
+    """
+
+    def __init__(self, enable: bool = True, max_size: int = 10000, max_ttl: float = 300.0):
+        self.enable = enable
+        self.max_ttl = max_ttl
+        self._lru = LRUCache(max_size=max_size)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def configure(self, enable: bool = True, max_size: int = 10000, max_ttl: float = 300.0) -> None:
+        self.enable = enable
+        self.max_ttl = max_ttl
+        self._lru = LRUCache(max_size=max_size)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._lru), max_size=self._lru.max_size)
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        if not self.enable:
+            return None
+
+        claims = self._lru.get(self.key(token))
+        with self._lock:
+            self._stats["hits" if claims is not None else "misses"] += 1
+        # the caller may modify the claims
+        return dict(claims) if claims is not None else None
+
+    def set(self, token: str, claims: dict) -> None:
+        if not self.enable:
+            return
+
+        ttl = self.max_ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            ttl = min(ttl, claims["exp"] - time.time())
+        if ttl > 0:
+            self._lru.set(self.key(token), dict(claims), ttl)
+
+    def clear(self) -> None:
+        self._lru.clear()
+
+
+decoded_token_cache = DecodedTokenCache()
+
+
 def decode_jwt_token(token: str) -> dict:
-    """Decode a JWT token."""
+    """Decode a JWT token, the claims of the recently decoded tokens are cached."""
+    claims = decoded_token_cache.get(token)
+    if claims is not None:
+        return claims
+
     try:
-        # TODO should verify the signature, it may be implemented in the future
-        payload = jwt.decode(
-            token,
-            algorithms=["HS256"],
-            options={
-                "verify_signature": False,
-                "verify_exp": True,
-            },
-        )
+        if jwks_key_store.url:
+            # the key store is configured when auth.sso.verify_signature is enabled
+            signing_key = jwks_key_store.get_signing_key(jwt.get_unverified_header(token).get("kid"))
+            payload = jwt.decode(
+                token,
+                key=signing_key.key,
+                algorithms=[signing_key.algorithm_name],
+                options={
+                    "verify_exp": True,
+                    "verify_aud": False,
+                },
+            )
+        else:
+            payload = jwt.decode(
+                token,
+                algorithms=["HS256"],
+                options={
+                    "verify_signature": False,
+                    "verify_exp": True,
+                },
+            )
+        decoded_token_cache.set(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         raise JWTExpiredSignatureError(message="jwt: token ExpiredSignatureError") from jwt.ExpiredSignatureError
     except jwt.DecodeError:
         raise JWTDecodeException(message="jwt: token DecodeError") from jwt.DecodeError
+    except jwt.InvalidTokenError as ex:
+        raise JWTDecodeException(message=f"jwt: token {ex.__class__.__name__}") from ex
 
 
 def get_requester_id(request: Request) -> str:
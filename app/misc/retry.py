@@ -1,13 +1,64 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=W0718,R1710
 
+import asyncio
+import functools
 import logging
 import random
+import threading
 import time
 
+from app.misc.cancellation import is_cancelled
+from app.misc.deadline import get_remaining_time
+
 logging_logger = logging.getLogger(__name__)
 
 
+class RetryBudget:
+    """
+    RetryBudget is a token bucket limiting retries to a percentage of the calls.
+
+    Each call deposits ratio token, each retry withdraws one token. Once the bucket is empty
+    (e.g. when a backend is down), failed calls are no longer retried, which avoids retry storms.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0):
+        self._lock = threading.Lock()
+        self.configure(ratio=ratio, max_tokens=max_tokens)
+
+    def configure(self, ratio: float, max_tokens: float) -> None:
+        with self._lock:
+            self.ratio = ratio
+            self.max_tokens = max_tokens
+            self._tokens = max_tokens
+            self._stats = {"calls": 0, "retries": 0, "exhausted": 0}
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, tokens=self._tokens)
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._stats["calls"] += 1
+            self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        """Return True if a retry is allowed"""
+        with self._lock:
+            if self._tokens < 1:
+                self._stats["exhausted"] += 1
+                return False
+
+            self._tokens -= 1
+            self._stats["retries"] += 1
+            return True
+
+
+# process-wide retry budget shared by the database clients
+retry_budget = RetryBudget()
+
+
 def __retry_internal(
     f,
     fargs=None,
@@ -18,12 +69,16 @@ def __retry_internal(
     max_delay=None,
     backoff=1,
     jitter=0,
+    full_jitter=False,
+    budget=None,
     logger=logging_logger,
     f_ex_callback=None,
 ):
     """
     Executes a function and retries it if it failed.
 
+    Attempts are not retried once the current deadline (see app.misc.deadline) would be exceeded.
+
     :param f: the function to execute.
     :param fargs: the arguments to pass to the function
     :param fkwargs: the dict arguments to pass to the function
@@ -34,12 +89,17 @@ def __retry_internal(
     :param backoff: multiplier applied to delay between attempts. default: 1 (no backoff).
     :param jitter: extra seconds added to delay between attempts. default: 0.
                    fixed if a number, random if a range tuple (min, max)
+    :param full_jitter: sleep a random duration between 0 and the backoff delay. default: False.
+    :param budget: a RetryBudget limiting the retries. default: None (no limit).
     :param logger: logger.warning(fmt, error, delay) will be called on failed attempts.
                    default: retry.logging_logger. if None, logging is disabled.
     :param f_ex_callback: a callback function to handle exception.
     :returns: the result of the f function.
     """
     _tries, _delay = tries, delay
+    if budget is not None:
+        budget.deposit()
+
     while _tries:
         try:
             args = fargs if fargs else []
@@ -47,16 +107,24 @@ def __retry_internal(
             return f(*args, **kwargs)
         except exceptions as ex:
             _tries -= 1
-            if not _tries:
+            if not _tries or is_cancelled():
+                raise
+
+            sleep = random.uniform(0, _delay) if full_jitter else _delay
+            remaining_time = get_remaining_time()
+            if remaining_time is not None and remaining_time <= sleep:
+                raise
+
+            if budget is not None and not budget.withdraw():
                 raise
 
             if f_ex_callback:
                 f_ex_callback(*args, **kwargs, _ex=ex, _tries=_tries)
 
             if logger is not None:
-                logger.warning("%s, retrying in %s seconds...", ex, _delay)
+                logger.warning("%s, retrying in %s seconds...", ex, sleep)
 
-            time.sleep(_delay)
+            time.sleep(sleep)
             _delay *= backoff
 
             if isinstance(jitter, tuple):
@@ -75,6 +143,8 @@ def retry(
     max_delay=None,
     backoff=1,
     jitter=0,
+    full_jitter=False,
+    budget=None,
     logger=logging_logger,
     f_ex_callback=None,
 ):
@@ -87,6 +157,8 @@ def retry(
     :param backoff: multiplier applied to delay between attempts. default: 1 (no backoff).
     :param jitter: extra seconds added to delay between attempts. default: 0.
                    fixed if a number, random if a range tuple (min, max)
+    :param full_jitter: sleep a random duration between 0 and the backoff delay. default: False.
+    :param budget: a RetryBudget limiting the retries. default: None (no limit).
     :param logger: logger.warning(fmt, error, delay) will be called on failed attempts.
                    default: retry.logging_logger. if None, logging is disabled.
     :param f_ex_callback: a callback function to handle exception.
@@ -105,6 +177,117 @@ def retry(
                 max_delay,
                 backoff,
                 jitter,
+                full_jitter,
+                budget,
+                logger,
+                f_ex_callback,
+            )
+
+        return new_func
+
+    return retry_decorator
+
+
+async def __async_retry_internal(
+    f,
+    fargs=None,
+    fkwargs=None,
+    exceptions=Exception,
+    tries=-1,
+    delay=0,
+    max_delay=None,
+    backoff=1,
+    jitter=0,
+    full_jitter=False,
+    budget=None,
+    logger=logging_logger,
+    f_ex_callback=None,
+):
+    """
+    Executes a coroutine function and retries it if it failed, without blocking the event loop.
+
+    Attempts are not retried once the current deadline (see app.misc.deadline) would be exceeded.
+
+    Same parameters as __retry_internal, plus:
+    :param full_jitter: sleep a random duration between 0 and the backoff delay. default: False.
+    :param budget: a RetryBudget limiting the retries. default: None (no limit).
+    :returns: the result of the f coroutine.
+    """
+    _tries, _delay = tries, delay
+    if budget is not None:
+        budget.deposit()
+
+    while _tries:
+        try:
+            args = fargs if fargs else []
+            kwargs = fkwargs if fkwargs else {}
+            return await f(*args, **kwargs)
+        except exceptions as ex:
+            _tries -= 1
+            if not _tries or is_cancelled():
+                raise
+
+            sleep = random.uniform(0, _delay) if full_jitter else _delay
+            remaining_time = get_remaining_time()
+            if remaining_time is not None and remaining_time <= sleep:
+                raise
+
+            if budget is not None and not budget.withdraw():
+                raise
+
+            if f_ex_callback:
+                f_ex_callback(*args, **kwargs, _ex=ex, _tries=_tries)
+
+            if logger is not None:
+                logger.warning("%s, retrying in %s seconds...", ex, sleep)
+
+            await asyncio.sleep(sleep)
+            _delay *= backoff
+
+            if isinstance(jitter, tuple):
+                _delay += random.uniform(*jitter)
+            else:
+                _delay += jitter
+
+            if max_delay is not None:
+                _delay = min(_delay, max_delay)
+
+
+def async_retry(
+    exceptions=Exception,
+    tries=-1,
+    delay=0,
+    max_delay=None,
+    backoff=1,
+    jitter=0,
+    full_jitter=False,
+    budget=None,
+    logger=logging_logger,
+    f_ex_callback=None,
+):
+    """Returns a retry decorator for coroutine functions.
+
+    Same parameters as retry, plus:
+    :param full_jitter: sleep a random duration between 0 and the backoff delay. default: False.
+    :param budget: a RetryBudget limiting the retries. default: None (no limit).
+    :returns: a retry decorator.
+    """
+
+    def retry_decorator(func):
+        @functools.wraps(func)
+        async def new_func(*args, **kwargs):
+            return await __async_retry_internal(
+                func,
+                args,
+                kwargs,
+                exceptions,
+                tries,
+                delay,
+                max_delay,
+                backoff,
+                jitter,
+                full_jitter,
+                budget,
                 logger,
                 f_ex_callback,
             )
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.misc.cancellation import CancellationToken, cancellation_scope, on_cancel
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class _Flight:
+    def __init__(self):
+        self.task: Optional[asyncio.Future] = None
+        # the shared call is cancelled once all its callers are cancelled
+        self.token = CancellationToken()
+        self._lock = threading.Lock()
+        self._waiters = 0
+
+    def join(self) -> Callable[[], None]:
+        """Add a caller, return the function removing it (once)"""
+        with self._lock:
+            self._waiters += 1
+        left = False
+
+        def leave() -> None:
+            nonlocal left
+            with self._lock:
+                if left:
+                    return
+                left = True
+                self._waiters -= 1
+                cancel = self._waiters == 0
+            if cancel:
+                self.token.cancel()
+
+        return leave
+
+
+class SingleFlight:
+    """
+    SingleFlight coalesces concurrent calls sharing the same key into one execution.
+
+    Callers arriving while a call is in flight wait for it and receive its result (or exception),
+    nothing is cached once the call has completed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all the threads calling with the same key at the same time"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Await fn() once for all the coroutines calling with the same key at the same time.
+
+        The shared call runs with its own cancellation token (see app.misc.cancellation),
+        cancelled only when the cancellation tokens of all the callers are cancelled or they all timed out.
+        Each caller waits at most timeout seconds (asyncio.TimeoutError), so fn() should not rely on the
+        deadline of the caller that started it.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            with cancellation_scope(flight.token):
+                # the task copies the current context, including the flight token
+                flight.task = asyncio.ensure_future(fn())
+            flight.task.add_done_callback(lambda _: self._flights.pop(key, None))
+            self.executions += 1
+        else:
+            self.shared += 1
+
+        leave = flight.join()
+        try:
+            with on_cancel(leave):
+                # a cancelled (or timed out) caller must not cancel the call shared with the others
+                return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.TimeoutError:
+            leave()
+            raise
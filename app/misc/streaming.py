@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import queue
+from typing import Any, Iterable, Iterator, List, Optional, Union
+
+from pydantic import BaseModel
+
+MEDIA_TYPE_NDJSON = "application/x-ndjson"
+MEDIA_TYPE_CSV = "text/csv"
+STREAMING_MEDIA_TYPES = (MEDIA_TYPE_NDJSON, MEDIA_TYPE_CSV)
+
+
+def get_streaming_media_type(accept: Optional[str]) -> Optional[str]:
+    """Return the streaming media type requested by the Accept header, None for a regular json response."""
+    if not accept:
+        return None
+
+    for media_range in accept.split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in STREAMING_MEDIA_TYPES:
+            return media_type
+
+    return None
+
+
+def to_ndjson(batches: Iterable[List[BaseModel]]) -> Iterator[str]:
+    """Serialize batches of models as newline delimited json, one chunk per batch."""
+    for batch in batches:
+        yield "".join(f"{item.model_dump_json(by_alias=True)}\n" for item in batch)
+
+
+def to_csv(batches: Iterable[List[BaseModel]], fieldnames: List[str]) -> Iterator[str]:
+    """Serialize batches of models as csv (with a header line), one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(item.model_dump(by_alias=True) for item in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class IterableReader(io.RawIOBase):
+    """Read-only file-like object over an iterable of str or bytes chunks."""
+
+    def __init__(self, chunks: Iterable[Union[str, bytes]], encoding: str = "utf-8"):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._encoding = encoding
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = chunk.encode(self._encoding) if isinstance(chunk, str) else bytes(chunk)
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+class QueueWriter:
+    """Write-only file-like object pushing each written chunk to a bounded queue (consumed by another thread)."""
+
+    def __init__(self, chunks: queue.Queue, poll_interval: float = 0.1):
+        self.chunks = chunks
+        self.poll_interval = poll_interval
+        self.closed = False
+
+    def write(self, data: Union[str, bytes]) -> int:
+        self.put(data)
+        return len(data)
+
+    def put(self, item: Any) -> None:
+        """Put an item, give up when the consumer has gone away"""
+        while True:
+            if self.closed:
+                raise IOError("the consumer has stopped reading")
+            try:
+                self.chunks.put(item, timeout=self.poll_interval)
+                return
+            except queue.Full:
+                continue
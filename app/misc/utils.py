@@ -3,8 +3,9 @@ import io
 import json
 import os
 from datetime import datetime, timezone
+from itertools import islice
 from logging import getLogger
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, List, Optional
 from uuid import UUID
 
 import boto3
@@ -100,3 +101,13 @@ def to_uuid(uuid_value: Any) -> Optional[UUID]:
         return UUID(int=uuid_value)
 
     raise ValueError(f"Invalid UUID string: {uuid_value}")
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most size items."""
+    if size < 1:
+        raise ValueError(f"Invalid chunk size: {size}")
+
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
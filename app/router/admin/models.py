@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field, conint
+
+
+class ApiV1RequestGetDBStats(BaseModel):
+    limit: conint(ge=1, le=1000) = 20
+    order_by: Literal["total_time", "count", "max_time", "mean_time", "errors", "rows", "bytes"] = "total_time"
+
+
+class QueryStatistics(BaseModel):
+    fingerprint: str = Field(..., example="select oid, relname from pg_class order by oid limit ?")
+    count: int = Field(..., description="Number of executions")
+    errors: int = Field(..., description="Number of failed executions")
+    total_time: float = Field(..., description="Total duration in seconds")
+    mean_time: float = Field(..., description="Mean duration in seconds")
+    max_time: float = Field(..., description="Maximum duration in seconds")
+    p50: float = Field(..., description="Estimated median duration in seconds")
+    p95: float = Field(..., description="Estimated 95th percentile duration in seconds")
+    p99: float = Field(..., description="Estimated 99th percentile duration in seconds")
+    rows: int = Field(..., description="Total number of rows read or written")
+    bytes: int = Field(..., description="Estimated total size of the rows read")
+
+
+class ApiV1GetDBStatsResponse(BaseModel):
+    queries: list[QueryStatistics]
+    pool: Optional[dict] = None
+    cache: Optional[dict] = None
+    resilience: Optional[dict] = None
+    replicas: Optional[dict] = None
+    token_cache: Optional[dict] = Field(None, alias="tokenCache", description="JWT decode cache statistics")
+    permissions_cache: Optional[dict] = Field(
+        None, alias="permissionsCache", description="Roles and permissions cache statistics"
+    )
@@ -0,0 +1,43 @@
+# pylint: disable=W0613,W0107
+
+
+from __future__ import annotations
+
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, Request
+from pydantic import conint
+
+from app.misc.constants import ENDPOINT_API_V1
+from app.misc.models import ErrorResponse
+from app.misc.permissions_checker import user_is_authenticated
+from app.router.admin.models import ApiV1GetDBStatsResponse, ApiV1RequestGetDBStats
+
+router = APIRouter(prefix=f"{ENDPOINT_API_V1}/admin", dependencies=[Depends(user_is_authenticated)])
+
+
+@router.get(
+    "/db/stats/",
+    response_model=ApiV1GetDBStatsResponse,
+    responses={
+        "400": {"model": ErrorResponse},
+        "403": {"model": ErrorResponse},
+        "500": {"model": ErrorResponse},
+    },
+    summary="Return the database statistics",
+    operation_id="GetDBStats",
+    tags=["Admin"],
+)
+def get_db_stats(
+    request: Request,
+    limit: conint(ge=1, le=1000) = Query(20, alias="limit"),
+    order_by: Literal["total_time", "count", "max_time", "mean_time", "errors", "rows", "bytes"] = Query(
+        "total_time", alias="orderBy"
+    ),
+) -> ApiV1GetDBStatsResponse:
+    """
+    Return the top queries (per normalized query fingerprint) and the connection pool, cache
+    and circuit breaker statistics of this process
+    """
+    req = ApiV1RequestGetDBStats(limit=limit, order_by=order_by)
+    return request.app.state.service_manager.get_db_stats(req=req, request=request)
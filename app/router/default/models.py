@@ -1,14 +1,24 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 from fastapi import Query
-from pydantic import BaseModel, Field, conint
+from pydantic import BaseModel, Field, conint, constr
 
 
 class ApiV1RequestListTables(BaseModel):
     limit: Optional[conint(ge=1, le=1000)] = (Query(1, alias="limit"),)
+    cursor: Optional[str] = None
+
+
+# table name, optionally qualified by its schema
+TABLE_NAME_PATTERN = r"^[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*)?$"
+
+
+class ApiV1RequestExportTable(BaseModel):
+    table_name: constr(pattern=TABLE_NAME_PATTERN)
+    format: Literal["csv", "binary"] = "csv"
 
 
 class Table(BaseModel):
@@ -22,6 +32,26 @@ class Table(BaseModel):
 
 class ApiV1ListTablesResponse(BaseModel):
     tables: Optional[list[Table]] = Field(None, example=[Table(id=1234, name="my_table_name")])
+    next: Optional[str] = Field(None, description="Cursor of the next page, absent on the last page")
+
+
+class ApiV1RequestGetTableStats(BaseModel):
+    pass
+
+
+class TableKindStats(BaseModel):
+    kind: str = Field(..., example="r", description="pg_class relkind: r = table, i = index, v = view...")
+    count: int = Field(..., example=120)
+    pages: int = Field(..., example=4800, description="Total number of pages")
+    pages_mean: float = Field(..., example=40.0, alias="pagesMean")
+    pages_p50: float = Field(..., example=12.0, alias="pagesP50")
+    pages_p95: float = Field(..., example=150.0, alias="pagesP95")
+    tuples: float = Field(..., example=240000.0, description="Estimated total number of rows")
+
+
+class ApiV1GetTableStatsResponse(BaseModel):
+    count: int = Field(..., example=480)
+    kinds: list[TableKindStats] = Field(..., example=[])
 
 
 class ApiV1GetDateResponse(BaseModel):
@@ -4,16 +4,28 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, Query, Request
-from pydantic import conint
+from fastapi import APIRouter, Depends, Path, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError, conint
 
+from app.exception import AppException
+from app.misc.cancellation import cancel_on_disconnect
 from app.misc.constants import ENDPOINT_API_V1
 from app.misc.errors import HTTP_NotImplementedError
 from app.misc.models import ErrorResponse
 from app.misc.permissions_checker import user_is_authenticated
-from app.router.default.models import ApiV1GetDateResponse, ApiV1ListTablesResponse, ApiV1RequestListTables
+from app.misc.streaming import MEDIA_TYPE_CSV, MEDIA_TYPE_NDJSON, get_streaming_media_type
+from app.router.default.models import (
+    TABLE_NAME_PATTERN,
+    ApiV1GetDateResponse,
+    ApiV1GetTableStatsResponse,
+    ApiV1ListTablesResponse,
+    ApiV1RequestExportTable,
+    ApiV1RequestGetTableStats,
+    ApiV1RequestListTables,
+)
 
 router = APIRouter(prefix=ENDPOINT_API_V1, dependencies=[Depends(user_is_authenticated)])
 
@@ -22,6 +34,7 @@ router = APIRouter(prefix=ENDPOINT_API_V1, dependencies=[Depends(user_is_authent
     "/demo/name/",
     response_model=ApiV1ListTablesResponse,
     responses={
+        "200": {"content": {MEDIA_TYPE_NDJSON: {}, MEDIA_TYPE_CSV: {}}},
         "400": {"model": ErrorResponse},
         "403": {"model": ErrorResponse},
         "500": {"model": ErrorResponse},
@@ -30,16 +43,91 @@ router = APIRouter(prefix=ENDPOINT_API_V1, dependencies=[Depends(user_is_authent
     operation_id="ListTables",
     tags=["Demo", "Admin"],
 )
-def list_tables(
+async def list_tables(
     request: Request,
     # body: ApiV1RequestListTables,
     limit: Optional[conint(ge=1, le=1000)] = Query(1, alias="limit"),
+    cursor: Optional[str] = Query(None, alias="cursor", description="Cursor returned as next by the previous page"),
 ) -> Union[ApiV1ListTablesResponse, ErrorResponse]:
     """
     Return a list of French phone numbers
+
+    Send "Accept: application/x-ndjson" or "Accept: text/csv" to stream the rows as they are read.
+    """
+    req = ApiV1RequestListTables(limit=limit, cursor=cursor)
+    media_type = get_streaming_media_type(request.headers.get("accept"))
+    if media_type:
+        content = request.app.state.service_manager.stream_tables(req=req, request=request, media_type=media_type)
+        return StreamingResponse(content, media_type=media_type)
+
+    # stop the query when the client gives up
+    async with cancel_on_disconnect(request):
+        return await request.app.state.service_manager.list_tables(req=req, request=request)
+
+
+@router.get(
+    "/demo/stats/",
+    response_model=ApiV1GetTableStatsResponse,
+    responses={
+        "400": {"model": ErrorResponse},
+        "403": {"model": ErrorResponse},
+        "500": {"model": ErrorResponse},
+    },
+    summary="Return statistics on the tables",
+    operation_id="GetTableStats",
+    tags=["Demo"],
+)
+async def get_table_stats(request: Request) -> Union[ApiV1GetTableStatsResponse, ErrorResponse]:
+    """
+    Return the number of tables and the percentiles of their sizes, by kind
+    """
+    req = ApiV1RequestGetTableStats()
+    return await request.app.state.service_manager.get_table_stats(req=req, request=request)
+
+
+@router.get(
+    "/demo/export/{table_name}",
+    response_class=StreamingResponse,
+    responses={
+        "200": {"content": {MEDIA_TYPE_CSV: {}, "application/octet-stream": {}}},
+        "400": {"model": ErrorResponse},
+        "403": {"model": ErrorResponse},
+        "500": {"model": ErrorResponse},
+        "501": {"model": ErrorResponse},
+    },
+    summary="Export a table",
+    operation_id="ExportTable",
+    tags=["Demo", "Admin"],
+)
+def export_table(
+    request: Request,
+    table_name: str = Path(..., description=f"Table name, optionally qualified by its schema ({TABLE_NAME_PATTERN})"),
+    fmt: Literal["csv", "binary"] = Query("csv", alias="format"),
+) -> Response:
+    """
+    Stream a dump of a table (PostgreSQL COPY protocol)
     """
-    req = ApiV1RequestListTables(limit=limit)
-    return request.app.state.service_manager.list_tables(req=req, request=request)
+    try:
+        req = ApiV1RequestExportTable(table_name=table_name, format=fmt)
+    except ValidationError as ex:
+        # the table name ends up in the COPY statement, an invalid one is a bad request (the other
+        # request validation errors keep the FastAPI 422)
+        error = AppException(
+            status_code=400,
+            message=f"Invalid table name: {table_name}",
+            error_type="InvalidTableName",
+            ex=ex,
+            is_warning=True,
+        )
+        error.log_exception()
+        return error.to_json_response()
+    content = request.app.state.service_manager.export_table(req=req, request=request)
+    media_type = MEDIA_TYPE_CSV if fmt == "csv" else "application/octet-stream"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table_name}.{"csv" if fmt == "csv" else "bin"}"'},
+    )
 
 
 @router.get(
@@ -1,13 +1,31 @@
 # pylint: disable=E0213,E1102,W0718
+import asyncio
+import inspect
 import logging
+from typing import Iterator, Optional, Union
 
 from fastapi import Request
+from starlette.concurrency import run_in_threadpool
 
+from app.client.async_db_client import AsyncDBClient
 from app.client.auth_client import AuthClient
 from app.client.db_client import DBClient
-from app.exception import AppException
-from app.misc.permissions_checker import check_demo_permissions
-from app.router.default.models import ApiV1ListTablesResponse, ApiV1RequestListTables
+from app.db.stats import query_stats
+from app.exception import AppDBTimeoutError, AppException
+from app.misc.deadline import deadline, get_operation_timeout, get_request_timeout
+from app.misc.pagination import decode_cursor
+from app.misc.permissions_checker import check_demo_permissions, decoded_token_cache, get_route_permissions
+from app.misc.retry import retry_budget
+from app.misc.singleflight import SingleFlight
+from app.misc.streaming import MEDIA_TYPE_CSV, to_csv, to_ndjson
+from app.router.admin.models import ApiV1GetDBStatsResponse, ApiV1RequestGetDBStats
+from app.router.default.models import (
+    ApiV1GetTableStatsResponse,
+    ApiV1ListTablesResponse,
+    ApiV1RequestExportTable,
+    ApiV1RequestGetTableStats,
+    ApiV1RequestListTables,
+)
 
 
 class ServiceManager:
@@ -16,44 +34,104 @@ class ServiceManager:
         self.logger = logging.getLogger("app")
         self.auth_client = auth_client
         self.db_client = DBClient(config=config)
+        self.async_db_client: Optional[AsyncDBClient] = (
+            AsyncDBClient(
+                config=config, circuit_breaker=self.db_client.circuit_breaker, bulkhead=self.db_client.bulkhead
+            )
+            if config["db"].get("aio", {}).get("enable") and self.db_client.engine != "sqlite"
+            else None
+        )
+        # identical concurrent requests share one execution
+        self.single_flight = SingleFlight()
+        if "retry_budget" in config["db"]:
+            retry_budget.configure(**config["db"]["retry_budget"])
+        if "stats" in config["db"]:
+            query_stats.configure(**config["db"]["stats"])
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        """Open (pre-warm) the database connections and start the keepalive task"""
+        await run_in_threadpool(self.db_client.open)
+        if self.async_db_client is not None:
+            await self.async_db_client.open()
+
+        keepalive_cfg = self.config["db"].get("keepalive", {})
+        if keepalive_cfg.get("enable") and self.db_client.pool is not None:
+            self._keepalive_task = asyncio.ensure_future(self._keepalive(keepalive_cfg["interval"]))
+
+    async def close(self) -> None:
+        """Stop the keepalive task and close the database connections"""
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        self.db_client.disconnect()
+        if self.async_db_client is not None:
+            await self.async_db_client.disconnect()
+
+    async def _keepalive(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                pinged = await run_in_threadpool(self.db_client.keepalive)
+                self.logger.debug("database keepalive", extra={"pinged_connections": pinged})
+            except Exception:
+                self.logger.exception("database keepalive failed")
 
     def handle_errors_decorator(method):
-        def inner(self, *args, **kwargs):
-            req = kwargs["req"]
+        def on_error(self, ex: Exception, req) -> None:
             request_type = req.__class__.__name__
-            try:
-                # TODO: disconnect from database if connected
-                return method(self, *args, **kwargs)  # noqa
-            except AppException as ex:
+            if isinstance(ex, AppException):
                 ex.request_type = request_type
                 ex.request = req.dict()
-                raise ex
-            except Exception as ex:
+            else:
                 self.logger.exception(
                     msg="An error occurred",
                     extra={"request_type": request_type, "request": req.dict()},
                 )
+
+        if inspect.iscoroutinefunction(method):
+
+            async def async_inner(self, *args, **kwargs):
+                try:
+                    return await method(self, *args, **kwargs)  # noqa
+                except Exception as ex:
+                    on_error(self, ex, kwargs["req"])
+                    raise ex
+
+            return async_inner
+
+        def inner(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)  # noqa
+            except Exception as ex:
+                on_error(self, ex, kwargs["req"])
                 raise ex
-            finally:
-                pass  # disconnect from database if connected
 
         return inner
 
     @handle_errors_decorator
-    def list_tables(
+    async def list_tables(
         self,
         *,
         req: ApiV1RequestListTables,
         request: Request,
     ) -> ApiV1ListTablesResponse:
         # This is a demo method
-        check_demo_permissions(
-            request=request,
-            operation_id="ListTables",
-        )
+        check_demo_permissions(request=request)
         limit = req.limit if req.limit > 0 else 1
+        after_id = decode_cursor(req.cursor) if req.cursor else None
         # result = ApiV1ListTablesResponse(tables=[Table(tableId=i, tableName=f"table{i}") for i in range(limit)])
-        result = self.db_client.get_list_of_tables(limit=limit)
+        operation_id = get_route_permissions(request).operation_id
+        # the shared query runs with the timeout of the operation, each caller waits at most its own timeout
+        operation_timeout = get_operation_timeout(self.config["db"], operation_id)
+        try:
+            result = await self.single_flight.do_async(
+                (operation_id, limit, after_id),
+                lambda: self._get_list_of_tables(limit, after_id, operation_timeout),
+                timeout=get_request_timeout(request.headers, self.config["db"], operation_id),
+            )
+        except asyncio.TimeoutError as ex:
+            raise AppDBTimeoutError(message="Request deadline exceeded", ex=ex) from ex
         self.logger.info(
             msg="list tables",
             extra={
@@ -62,3 +140,76 @@ class ServiceManager:
             },
         )
         return result
+
+    async def _get_list_of_tables(
+        self, limit: int, after_id: Optional[int], timeout: Optional[float]
+    ) -> ApiV1ListTablesResponse:
+        with deadline(timeout):
+            if self.async_db_client is not None:
+                return await self.async_db_client.get_list_of_tables(limit=limit, after_id=after_id)
+
+            return await run_in_threadpool(self.db_client.get_list_of_tables, limit=limit, after_id=after_id)
+
+    @handle_errors_decorator
+    def stream_tables(
+        self,
+        *,
+        req: ApiV1RequestListTables,
+        request: Request,
+        media_type: str,
+    ) -> Iterator[str]:
+        # This is a demo method
+        check_demo_permissions(request=request)
+        limit = req.limit if req.limit > 0 else 1
+        after_id = decode_cursor(req.cursor) if req.cursor else None
+        # rows are fetched lazily, while the response is being sent
+        batches = self.db_client.iter_list_of_tables(limit=limit, after_id=after_id)
+        self.logger.info(msg="stream tables", extra={"request": request, "media_type": media_type})
+        if media_type == MEDIA_TYPE_CSV:
+            return to_csv(batches, fieldnames=["tableId", "tableName"])
+
+        return to_ndjson(batches)
+
+    @handle_errors_decorator
+    async def get_table_stats(
+        self,
+        *,
+        req: ApiV1RequestGetTableStats,
+        request: Request,
+    ) -> ApiV1GetTableStatsResponse:
+        # This is a demo method
+        check_demo_permissions(request=request)
+        operation_id = get_route_permissions(request).operation_id
+        with deadline(get_request_timeout(request.headers, self.config["db"], operation_id)):
+            result = await run_in_threadpool(self.db_client.get_table_stats)
+        self.logger.info(msg="table stats", extra={"request": request, "count": result.count})
+        return result
+
+    @handle_errors_decorator
+    def export_table(
+        self,
+        *,
+        req: ApiV1RequestExportTable,
+        request: Request,
+    ) -> Iterator[Union[str, bytes]]:
+        check_demo_permissions(request=request)
+        self.logger.info(msg="export table", extra={"request": request, "table_name": req.table_name})
+        # the COPY starts when the response starts streaming
+        return self.db_client.export_table(table_name=req.table_name, fmt=req.format)
+
+    @handle_errors_decorator
+    def get_db_stats(
+        self,
+        *,
+        req: ApiV1RequestGetDBStats,
+        request: Request,
+    ) -> ApiV1GetDBStatsResponse:
+        return ApiV1GetDBStatsResponse(
+            queries=query_stats.top(limit=req.limit, order_by=req.order_by),
+            pool=self.db_client.get_pool_stats(),
+            cache=self.db_client.get_cache_stats(),
+            resilience=self.db_client.get_resilience_stats(),
+            replicas=self.db_client.get_replica_stats(),
+            tokenCache=decoded_token_cache.stats,
+            permissionsCache=self.auth_client.stats,
+        )
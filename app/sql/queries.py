@@ -1,15 +1,68 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
+from app.sql.registry import QueryRegistry
 
-def query_get_list_of_tables(limit: int) -> Tuple[str, List]:
-    query = """
+QUERY_LIST_TABLES = "list_tables"
+QUERY_LIST_TABLES_AFTER_ID = "list_tables_after_id"
+QUERY_TABLE_SIZES = "table_sizes"
+
+query_registry = QueryRegistry()
+
+query_registry.register(
+    QUERY_LIST_TABLES,
+    """
+        SELECT
+            oid as "table_id",
+            relname as "table_name"
+        FROM
+            pg_class
+        ORDER BY
+            oid
+        LIMIT
+            %s
+    """,
+)
+
+# keyset pagination: seek past the last returned oid instead of using OFFSET
+query_registry.register(
+    QUERY_LIST_TABLES_AFTER_ID,
+    """
         SELECT
             oid as "table_id",
             relname as "table_name"
         FROM
             pg_class
+        WHERE
+            oid > %s
+        ORDER BY
+            oid
         LIMIT
             %s
+    """,
+)
+
+query_registry.register(
+    QUERY_TABLE_SIZES,
     """
-    params = [limit]
-    return query, params
+        SELECT
+            oid as "table_id",
+            relkind as "kind",
+            relpages as "pages",
+            reltuples as "tuples"
+        FROM
+            pg_class
+    """,
+)
+
+
+def named_query_get_list_of_tables(limit: int, after_id: Optional[int] = None) -> Tuple[str, List]:
+    """Return the name of the registered query and its parameters"""
+    if after_id is None:
+        return QUERY_LIST_TABLES, [limit]
+
+    return QUERY_LIST_TABLES_AFTER_ID, [after_id, limit]
+
+
+def query_get_list_of_tables(limit: int, after_id: Optional[int] = None) -> Tuple[str, List]:
+    name, params = named_query_get_list_of_tables(limit, after_id)
+    return query_registry.get(name).sql, params
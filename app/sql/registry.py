@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import re
+from typing import Dict, List
+
+_STATEMENT_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+class NamedQuery:
+    """
+    NamedQuery is a SQL statement declared once in a QueryRegistry.
+
+    The statement uses %s placeholders (no literal "%"), it is sent as is by the drivers without
+    server side prepared statements, or prepared once per connection on PostgreSQL.
+    """
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        parts = sql.split("%s")
+        self.param_count = len(parts) - 1
+        # PostgreSQL numbers the parameters of a prepared statement: $1, $2...
+        numbered = "".join(f"{part}${i}" for i, part in enumerate(parts[:-1], start=1)) + parts[-1]
+        self.prepare_sql = f"PREPARE {name} AS {numbered}"
+        arguments = f" ({', '.join(['%s'] * self.param_count)})" if self.param_count else ""
+        self.execute_sql = f"EXECUTE {name}{arguments}"
+
+
+class QueryRegistry:
+    """
+    QueryRegistry holds the named queries of the application, so that they can be executed by name
+    and parsed/planned once per connection by the server.
+    """
+
+    def __init__(self):
+        self._queries: Dict[str, NamedQuery] = {}
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._queries)
+
+    def register(self, name: str, sql: str) -> NamedQuery:
+        # the name is used as a SQL identifier (PREPARE name AS ...)
+        if not _STATEMENT_NAME.match(name):
+            raise ValueError(f"Invalid query name: {name}")
+        if name in self._queries:
+            raise ValueError(f"Query {name} is already registered")
+
+        query = NamedQuery(name, sql)
+        self._queries[name] = query
+        return query
+
+    def get(self, name: str) -> NamedQuery:
+        try:
+            return self._queries[name]
+        except KeyError as ex:
+            raise ValueError(f"Unknown query: {name}") from ex
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._queries
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import asyncio
+import logging
+
+import asyncpg
+import pytest
+
+from app.client.async_postgresql_client import AsyncPostgreSQLClient
+from app.db.postgresql.async_connection import to_asyncpg_query
+from app.db.postgresql.connection import PostgreSQLConnectionArgs
+from app.exception import AppDBError, AppDBTimeoutError
+from app.misc.deadline import deadline
+
+
+class FakeConnection:
+    def __init__(self, rows, error=None):
+        self.rows = rows
+        self.error = error
+        self.queries = []
+        self.statements = []
+        self.transactions = 0
+
+    async def fetch(self, query, *args):
+        self.queries.append((query, args))
+        if self.error:
+            raise self.error
+        return self.rows
+
+    async def execute(self, query, *args):
+        self.statements.append((query, args))
+        return "SELECT 1"
+
+    def transaction(self):
+        self.transactions += 1
+        return FakeAcquire(self)
+
+
+class FakeAcquire:
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self.connection
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakePool:
+    """In-process stand-in for an asyncpg pool"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def acquire(self):
+        return FakeAcquire(self.connection)
+
+    async def close(self):
+        pass
+
+
+def build_client(connection) -> AsyncPostgreSQLClient:
+    client = AsyncPostgreSQLClient(
+        cnx_args=PostgreSQLConnectionArgs("localhost", 5432, "login", "password", "db", "test"),
+        logger=logging.getLogger("db.client"),
+    )
+    client.pool = FakePool(connection)
+    return client
+
+
+def test_to_asyncpg_query():
+    assert to_asyncpg_query("SELECT %s, %s") == "SELECT $1, $2"
+    assert (
+        to_asyncpg_query("SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' AND c = 'it''s %s' AND d = %s")
+        == "SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' AND c = 'it''s %s' AND d = $2"
+    )
+
+
+def test_async_get_list_of_tables():
+    connection = FakeConnection(rows=[(1, "table1"), (2, "table2")])
+    result = asyncio.run(build_client(connection).get_list_of_tables(limit=2))
+    assert [table.name for table in result.tables] == ["table1", "table2"]
+    assert connection.queries[0][1] == (3,)
+    assert result.next is None
+    assert "$1" in connection.queries[0][0]
+
+
+def test_async_select_maps_errors():
+    connection = FakeConnection(rows=[], error=asyncpg.exceptions.UndefinedTableError("missing"))
+    with pytest.raises(AppDBError):
+        asyncio.run(build_client(connection).select("SELECT 1"))
+
+
+def test_async_select_is_bounded_by_the_deadline():
+    connection = FakeConnection(rows=[(1,)])
+
+    async def select():
+        with deadline(5):
+            return await build_client(connection).select("SELECT 1")
+
+    assert asyncio.run(select()) == [(1,)]
+    assert connection.transactions == 1
+    query, (timeout_ms,) = connection.statements[0]
+    assert "statement_timeout" in query
+    assert 4000 < int(timeout_ms) <= 5000
+
+
+def test_async_select_statement_timeout():
+    connection = FakeConnection(rows=[], error=asyncpg.exceptions.QueryCanceledError("canceling statement"))
+
+    async def select():
+        with deadline(5):
+            return await build_client(connection).select("SELECT pg_sleep(10)")
+
+    with pytest.raises(AppDBTimeoutError):
+        asyncio.run(select())
+    # without a deadline, no statement timeout is set
+    connection = FakeConnection(rows=[])
+    asyncio.run(build_client(connection).select("SELECT 1"))
+    assert connection.statements == []
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import pytest
+
+from app.db.postgresql.helper import build_copy_sql
+from app.misc.streaming import IterableReader
+
+
+def test_build_copy_sql_quotes_identifiers():
+    copy_sql = build_copy_sql("FROM", table="public.users", columns=["id", "name"], fmt="csv", header=True)
+    assert "Identifier('public', 'users')" in repr(copy_sql)
+    assert "Identifier('name')" in repr(copy_sql)
+    assert "HEADER true" in repr(copy_sql)
+
+
+def test_build_copy_sql_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        build_copy_sql("TO", table="users", fmt="xml")
+
+
+def test_iterable_reader_joins_chunks():
+    reader = IterableReader(["ab", b"cd", "ef"])
+    assert reader.read() == b"abcdef"
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+from app.db.mysql.helper import sql_execute_many
+from app.db.postgresql.helper import sql_execute_many as postgresql_execute_many
+from tests.fakes import FakeConnection
+
+
+def test_sql_execute_many_commits_each_batch():
+    connection = FakeConnection()
+    params = ((i, f"name{i}") for i in range(5))
+    affected_rows = sql_execute_many(connection, "INSERT INTO t (id, name) VALUES (%s, %s)", params, batch_size=2)
+    assert affected_rows == [2, 2, 1]
+    assert connection.commits == 3
+    assert connection.batches[-1] == [(4, "name4")]
+
+
+def test_postgresql_execute_many_sends_one_statement_per_batch():
+    connection = FakeConnection()
+    params = ((i, f"name{i}") for i in range(5))
+    affected_rows = postgresql_execute_many(connection, "INSERT INTO t (id, name) VALUES %s", params, batch_size=2)
+    assert len(affected_rows) == 3
+    assert connection.commits == 3
+    # execute_values expands each batch into a single multi-row INSERT
+    assert [sql_req for sql_req, _ in connection.statements] == [
+        b"INSERT INTO t (id, name) VALUES (0,'name0'),(1,'name1')",
+        b"INSERT INTO t (id, name) VALUES (2,'name2'),(3,'name3')",
+        b"INSERT INTO t (id, name) VALUES (4,'name4')",
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import logging
+
+import pandas as pd
+
+from app.client.sqlite_client import SQLiteClient
+from app.db.frame import group_stats, rows_to_frame
+from app.db.sqlite.connection import SQLiteConnectionArgs
+
+
+def test_rows_to_frame_uses_typed_columns():
+    frame = rows_to_frame([(1, "a", 1.5), (2, None, None)], ["id", "name", "ratio"], {"id": "Int32"})
+    assert frame.dtypes.to_dict() == {"id": "Int32", "name": "string", "ratio": "Float64"}
+    assert frame["ratio"].isna().tolist() == [False, True]
+
+
+def test_group_stats():
+    frame = pd.DataFrame({"kind": ["a", "a", "a", "b"], "size": [1, 2, 3, 10]})
+    stats = group_stats(frame, by="kind", column="size", percentiles=(0.5,))
+    assert stats.loc["a"].to_dict() == {"count": 3, "sum": 6, "mean": 2.0, "p50": 2.0}
+    assert stats.loc["b", "count"] == 1
+
+
+def test_sqlite_select_frame():
+    client = SQLiteClient(cnx_args=SQLiteConnectionArgs(seed_rows=8), logger=logging.getLogger("db.client"))
+    client.connect()
+    try:
+        frame = client.get_table_sizes()
+    finally:
+        client.disconnect()
+    assert list(frame.columns) == ["table_id", "kind", "pages", "tuples"]
+    assert len(frame) == 8
+    assert frame["kind"].dtype == "string"
+    assert frame.groupby("kind")["table_id"].count().to_dict() == {"S": 2, "i": 2, "r": 2, "v": 2}
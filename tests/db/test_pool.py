@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import time
+
+import pytest
+
+from app.exception import AppDBConnectionError, AppDBPoolExhaustedError
+from tests.fakes import FakePool
+
+
+def test_pool_reuses_released_connection():
+    pool = FakePool(max_size=2)
+    pooled = pool.acquire()
+    pool.release(pooled)
+    assert pool.acquire() is pooled
+    assert len(pool.created) == 1
+
+
+def test_pool_borrow_timeout_when_exhausted():
+    pool = FakePool(max_size=1)
+    pool.acquire()
+    with pytest.raises(AppDBPoolExhaustedError):
+        pool.acquire(timeout=0.01)
+
+
+def test_pool_discard_frees_a_slot():
+    pool = FakePool(max_size=1)
+    pooled = pool.acquire()
+    pool.release(pooled, discard=True)
+    assert pooled.raw.closed
+    assert pool.acquire() is not pooled
+    assert pool.size == 1
+
+
+def test_pool_drops_expired_connections():
+    pool = FakePool(max_size=1, max_lifetime=0)
+    pooled = pool.acquire()
+    pool.release(pooled)
+    assert pooled.raw.closed
+    assert pool.idle_count == 0
+
+
+def test_pool_open_prefills_min_size():
+    pool = FakePool(min_size=2, max_size=4)
+    pool.open()
+    assert pool.size == 2
+    assert pool.idle_count == 2
+    pool.close()
+    assert pool.size == 0
+    with pytest.raises(AppDBConnectionError):
+        pool.acquire()
+
+
+def test_pool_validates_only_after_validation_interval():
+    pool = FakePool(max_size=1, validation_interval=60)
+    validated = []
+    pool.validate_connection = lambda raw: validated.append(raw) or True
+    pooled = pool.acquire()
+    pool.release(pooled)
+    assert pool.acquire() is pooled
+    assert not validated
+
+    pool.release(pooled)
+    pooled.last_used_at -= 120
+    assert pool.acquire() is pooled
+    assert validated == [pooled.raw]
+
+
+def test_pool_discards_connection_failing_validation():
+    pool = FakePool(max_size=1, validation_interval=0)
+    pool.validate_connection = lambda raw: False
+    pooled = pool.acquire()
+    pool.release(pooled)
+    assert pool.acquire() is not pooled
+    assert pooled.raw.closed
+
+
+def test_pool_stats():
+    pool = FakePool(max_size=1)
+    pooled = pool.acquire()
+    with pytest.raises(AppDBConnectionError):
+        pool.acquire(timeout=0.01)
+    stats = pool.stats
+    assert stats["in_use"] == 1
+    assert stats["idle"] == 0
+    assert stats["waiters"] == 0
+    assert stats["wait_count"] == 1
+    assert stats["wait_time_max"] > 0
+    pool.release(pooled)
+    assert pool.stats["idle"] == 1
+
+
+def test_pool_open_prewarm_capped_at_max_size():
+    pool = FakePool(min_size=1, max_size=3)
+    pool.open(prewarm=5)
+    assert pool.size == 3
+    assert pool.idle_count == 3
+
+
+def test_pool_keepalive_pings_idle_connections():
+    pool = FakePool(min_size=2, max_size=4)
+    pool.open()
+    alive = pool.created[0]
+    pool.validate_connection = lambda raw: raw is alive
+    assert pool.keepalive(idle_threshold=0) == 2
+    # the dead connection is replaced to keep min_size connections
+    assert pool.size == 2
+    assert len(pool.created) == 3
+    assert pool.created[1].closed and not alive.closed
+
+
+def test_pool_keepalive_lets_the_pool_shrink():
+    pool = FakePool(min_size=1, max_size=4, idle_timeout=0.1)
+    held = [pool.acquire() for _ in range(3)]
+    for pooled in held:
+        pool.release(pooled)
+    time.sleep(0.06)
+    # only min_size connections are pinged, without refreshing their idle time
+    assert pool.keepalive(idle_threshold=0.05) == 1
+    assert pool.size == 3
+    time.sleep(0.06)
+    pool.keepalive(idle_threshold=0.05)
+    assert pool.size == 1
+
+
+def test_pool_keepalive_rejects_an_idle_threshold_above_idle_timeout():
+    pool = FakePool(min_size=1, max_size=2, idle_timeout=300)
+    with pytest.raises(ValueError):
+        pool.keepalive(idle_threshold=300)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import logging
+import os
+
+import pytest
+
+from app.db.postgresql.connection import PostgreSQLConnection, PostgreSQLConnectionArgs
+from app.sql.queries import QUERY_LIST_TABLES, QUERY_LIST_TABLES_AFTER_ID, query_get_list_of_tables, query_registry
+from app.sql.registry import QueryRegistry
+from tests.fakes import build_postgresql_connection
+
+
+def test_named_query_is_numbered_for_prepare():
+    query = query_registry.get(QUERY_LIST_TABLES_AFTER_ID)
+    assert query.param_count == 2
+    assert query.prepare_sql.startswith(f"PREPARE {QUERY_LIST_TABLES_AFTER_ID} AS")
+    assert "oid > $1" in query.prepare_sql and "$2" in query.prepare_sql
+    assert query.execute_sql == f"EXECUTE {QUERY_LIST_TABLES_AFTER_ID} (%s, %s)"
+    assert query_get_list_of_tables(10)[0] == query_registry.get(QUERY_LIST_TABLES).sql
+
+
+def test_registry_rejects_invalid_and_duplicate_names():
+    registry = QueryRegistry()
+    registry.register("get_one", "SELECT 1")
+    with pytest.raises(ValueError):
+        registry.register("get_one", "SELECT 1")
+    with pytest.raises(ValueError):
+        registry.register("drop table;", "SELECT 1")
+    with pytest.raises(ValueError):
+        registry.get("missing")
+
+
+def test_select_prepared_prepares_once_per_pooled_connection():
+    connection = build_postgresql_connection(rows=[(1, "table1")])
+    for _ in range(3):
+        with connection.checkout():
+            assert connection.select_prepared(QUERY_LIST_TABLES, [10]) == [(1, "table1")]
+            raw = connection.cnx
+
+    assert [sql_req.split(" AS")[0] for sql_req, _ in raw.statements] == [
+        f"PREPARE {QUERY_LIST_TABLES}",
+        f"EXECUTE {QUERY_LIST_TABLES} (%s)",
+        f"EXECUTE {QUERY_LIST_TABLES} (%s)",
+        f"EXECUTE {QUERY_LIST_TABLES} (%s)",
+    ]
+
+
+# the benchmarks need a PostgreSQL server:
+# BENCHMARK_POSTGRESQL_HOSTNAME=localhost DB_USERNAME=... DB_PASSWORD=... pytest tests/db/test_registry.py
+@pytest.fixture(scope="module")
+def postgresql_connection():
+    hostname = os.environ.get("BENCHMARK_POSTGRESQL_HOSTNAME")
+    if not hostname:
+        pytest.skip("BENCHMARK_POSTGRESQL_HOSTNAME is not set")
+
+    cnx_args = PostgreSQLConnectionArgs(
+        hostname=hostname,
+        tcp_port=int(os.environ.get("DB_TCP_PORT", 5432)),
+        login=os.environ["DB_USERNAME"],
+        password=os.environ["DB_PASSWORD"],
+        database=os.environ.get("DB_DATABASE", "postgres"),
+        program="benchmark",
+    )
+    with PostgreSQLConnection(cnx_args=cnx_args, logger=logging.getLogger("db.client")) as connection:
+        yield connection
+
+
+@pytest.mark.parametrize("name", [QUERY_LIST_TABLES, QUERY_LIST_TABLES_AFTER_ID])
+def test_benchmark_unprepared(benchmark, postgresql_connection, name):
+    params = [100] if name == QUERY_LIST_TABLES else [1000, 100]
+    benchmark(postgresql_connection.select, query_registry.get(name).sql, params, auto_close=False)
+
+
+@pytest.mark.parametrize("name", [QUERY_LIST_TABLES, QUERY_LIST_TABLES_AFTER_ID])
+def test_benchmark_prepared(benchmark, postgresql_connection, name):
+    params = [100] if name == QUERY_LIST_TABLES else [1000, 100]
+    benchmark(postgresql_connection.select_prepared, name, params)
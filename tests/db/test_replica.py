@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import contextlib
+import threading
+from collections import Counter
+
+import pytest
+
+from app.db.replica import Replica, ReplicaSet
+from app.exception import AppDBConnectionError
+from app.misc.cancellation import on_cancel
+from app.misc.circuit_breaker import CircuitBreaker
+
+
+class FakeClient:
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.pool = None
+        self.released = threading.Event()
+        self.finished = threading.Event()
+
+    @contextlib.contextmanager
+    def checkout(self):
+        # like the connections, the running query is cancelled with the current request
+        with on_cancel(self.released.set):
+            yield
+
+    def disconnect(self):
+        pass
+
+    def read(self):
+        try:
+            if self.fail:
+                raise AppDBConnectionError(f"Can't connect to {self.name}")
+            self.released.wait(self.delay)
+            return self.name
+        finally:
+            self.finished.set()
+
+
+def open_breaker(name):
+    circuit_breaker = CircuitBreaker(name, minimum_calls=1, open_timeout=60)
+    circuit_breaker.on_failure()
+    return circuit_breaker
+
+
+def test_pick_least_outstanding_replica():
+    replicas = [Replica("a", FakeClient("a")), Replica("b", FakeClient("b"))]
+    replica_set = ReplicaSet(replicas)
+    first = replica_set.pick()
+    second = replica_set.pick()
+    assert {first, second} == set(replicas)
+
+
+def test_reads_are_balanced_across_replicas():
+    replica_set = ReplicaSet([Replica("a", FakeClient("a")), Replica("b", FakeClient("b"))])
+    reads = Counter(replica_set.read(lambda client: client.read()) for _ in range(100))
+    assert set(reads) == {"a", "b"}
+    assert [replica.outstanding for replica in replica_set.replicas] == [0, 0]
+
+
+def test_replica_with_open_breaker_is_skipped():
+    replica_set = ReplicaSet(
+        [Replica("a", FakeClient("a"), circuit_breaker=open_breaker("a")), Replica("b", FakeClient("b"))]
+    )
+    assert {replica_set.read(lambda client: client.read()) for _ in range(10)} == {"b"}
+
+
+def test_failed_read_is_retried_on_another_replica_then_on_the_primary():
+    replica_set = ReplicaSet([Replica("a", FakeClient("a", fail=True)), Replica("b", FakeClient("b"))])
+    assert {replica_set.read(lambda client: client.read()) for _ in range(10)} == {"b"}
+
+    replica_set = ReplicaSet([Replica("a", FakeClient("a", fail=True)), Replica("b", FakeClient("b", fail=True))])
+    assert replica_set.read(lambda client: client.read(), fallback=lambda: "primary") == "primary"
+    stats = replica_set.stats
+    assert stats["retries"] == 1
+    assert stats["primary_fallbacks"] == 1
+    with pytest.raises(AppDBConnectionError):
+        replica_set.read(lambda client: client.read())
+
+
+def test_hedged_read_returns_the_fastest_replica():
+    slow, fast = FakeClient("slow", delay=5), FakeClient("fast")
+    replica_set = ReplicaSet([Replica("slow", slow), Replica("fast", fast)], hedge=True, hedge_min_delay=0.01)
+    # make sure the first pick is the slow replica
+    replica_set.replicas[1].outstanding = 1
+    try:
+        assert replica_set.read(lambda client: client.read()) == "fast"
+        stats = replica_set.stats
+        assert stats["hedged"] == 1
+        assert stats["hedge_wins"] == 1
+        # the slower read is cancelled instead of holding its connection until it completes
+        assert slow.finished.wait(1)
+    finally:
+        slow.released.set()
+        replica_set.disconnect()
+
+
+def test_no_hedge_without_a_second_candidate():
+    slow = FakeClient("slow", delay=0.05)
+    replica_set = ReplicaSet(
+        [Replica("slow", slow), Replica("down", FakeClient("down"), circuit_breaker=open_breaker("down"))],
+        hedge=True,
+        hedge_min_delay=0.01,
+    )
+    try:
+        assert replica_set.read(lambda client: client.read()) == "slow"
+        assert replica_set.stats["hedged"] == 0
+    finally:
+        replica_set.disconnect()
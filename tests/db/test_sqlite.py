@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import copy
+import logging
+
+import pytest
+
+from app.client.db_client import DBClient
+from app.client.sqlite_client import SQLiteClient
+from app.db.sqlite.connection import SQLiteConnectionArgs
+from app.db.sqlite.helper import to_sqlite_query
+from app.exception import AppDBError
+
+
+@pytest.fixture
+def sqlite_client():
+    client = SQLiteClient(cnx_args=SQLiteConnectionArgs(seed_rows=10), logger=logging.getLogger("db.client"))
+    client.connect()
+    yield client
+    client.disconnect()
+
+
+def test_to_sqlite_query():
+    assert (
+        to_sqlite_query("SELECT * FROM t WHERE a = %s AND b LIKE 'x%%'")
+        == "SELECT * FROM t WHERE a = ? AND b LIKE 'x%'"
+    )
+
+
+def test_sqlite_client_paginates_the_seeded_catalog(sqlite_client):
+    page = sqlite_client.get_list_of_tables(limit=4)
+    assert [table.id for table in page.tables] == [0, 1, 2, 3]
+    assert page.next is not None
+
+    batches = list(sqlite_client.iter_list_of_tables(limit=5, batch_size=2, after_id=7))
+    assert [[table.name for table in batch] for batch in batches] == [["table8", "table9"]]
+
+
+def test_sqlite_client_writes(sqlite_client):
+    assert sqlite_client.execute_many(
+        "INSERT INTO pg_class (oid, relname) VALUES (%s, %s)", [(100, "a"), (101, "b")]
+    ) == [2]
+    assert sqlite_client.safe_execute("DELETE FROM pg_class WHERE oid >= %s", [100])[0] == 2
+    assert sqlite_client.select("SELECT relname FROM pg_class WHERE oid = %s", [9], as_dict=True) == [
+        {"relname": "table9"}
+    ]
+    with pytest.raises(AppDBError):
+        sqlite_client.safe_select("SELECT * FROM missing_table", [])
+
+
+def test_db_client_dry_run_uses_sqlite(mock_config):
+    config = copy.deepcopy(mock_config)
+    config["db"]["dry_run"] = True
+    config["cache"]["enable"] = False
+    db_client = DBClient(config=config)
+    db_client.open()
+    try:
+        assert isinstance(db_client.client, SQLiteClient)
+        assert len(db_client.get_list_of_tables(limit=3).tables) == 3
+    finally:
+        db_client.disconnect()
+
+
+def test_sqlite_stream_does_not_hold_the_connection_between_batches(sqlite_client):
+    stream = sqlite_client.select_stream("SELECT oid FROM pg_class ORDER BY oid", batch_size=4)
+    assert next(stream) == [(0,), (1,), (2,), (3,)]
+    # other queries run while the stream is being consumed
+    assert sqlite_client.select("SELECT COUNT(*) FROM pg_class") == [(10,)]
+    assert [len(batch) for batch in stream] == [4, 2]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import psycopg2.errors
+import pytest
+
+from app.exception import AppDBTimeoutError
+from app.misc.deadline import deadline, get_operation_timeout, get_request_timeout
+from tests.fakes import build_postgresql_connection
+
+
+def test_statement_timeout_is_set_from_the_deadline_and_reset():
+    connection = build_postgresql_connection()
+    with deadline(2):
+        with connection.checkout():
+            raw = connection.cnx
+    sql_req, params = raw.statements[0]
+    assert sql_req == "SET statement_timeout = %s"
+    assert 1000 < params[0] <= 2000
+    assert raw.statements[-1] == ("RESET statement_timeout", None)
+
+
+def test_statement_timeout_error_is_mapped_to_504():
+    connection = build_postgresql_connection(
+        error=psycopg2.errors.QueryCanceled("canceling statement due to statement timeout")
+    )
+    with pytest.raises(AppDBTimeoutError) as ex_info:
+        with deadline(2):
+            with connection.checkout():
+                connection.select("SELECT pg_sleep(10)")
+    assert ex_info.value.status_code == 504
+    # the connection is not closed nor reconnected, it goes back to the pool
+    assert connection.pool.stats["idle"] == 1
+
+
+def test_request_timeout_header_shortens_the_operation_timeout():
+    db_config = {"request_timeout": 10, "operation_timeouts": {"ExportTable": 600}}
+    assert get_request_timeout({}, db_config, "ListTables") == 10
+    assert get_request_timeout({}, db_config, "ExportTable") == 600
+    assert get_request_timeout({"x-request-timeout": "2.5"}, db_config, "ExportTable") == 2.5
+    # the header does not change the operation timeout (used by the queries shared between requests)
+    assert get_operation_timeout(db_config, "ExportTable") == 600
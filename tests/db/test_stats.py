@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import logging
+
+import pytest
+
+from app.db.stats import QueryStatsRegistry, fingerprint
+
+
+def test_fingerprint_normalizes_values():
+    assert fingerprint("SELECT *  FROM t WHERE id = 12 AND name = 'bob' -- comment") == fingerprint(
+        "select * from t where id = %s and name = %s"
+    )
+    assert fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3)") == "select * from t where id in (?+)"
+
+
+def test_registry_top_and_percentiles():
+    registry = QueryStatsRegistry(slow_query_threshold=None)
+    for _ in range(9):
+        registry.record("SELECT 1", 0.001, rows=1, nbytes=8)
+    registry.record("SELECT 1", 0.2, rows=1, nbytes=8)
+    registry.record("UPDATE t SET a = 1", 0.5, rows=3, error=True)
+
+    top = registry.top(limit=1, order_by="count")
+    assert top[0]["fingerprint"] == "select ?"
+    assert top[0]["count"] == 10
+    assert top[0]["rows"] == 10
+    assert top[0]["p50"] == 0.001
+    assert top[0]["p99"] == 0.25
+    assert registry.top(order_by="errors")[0]["fingerprint"] == "update t set a = ?"
+    with pytest.raises(ValueError):
+        registry.top(order_by="name")
+
+
+def test_registry_logs_slow_queries(caplog):
+    registry = QueryStatsRegistry(slow_query_threshold=0.1)
+    with caplog.at_level(logging.WARNING, logger="db"):
+        with registry.measure("SELECT 2") as timer:
+            timer.set_result([{"a": "xyz"}])
+        registry.record("SELECT 3", 0.2)
+    assert [record.sql_fingerprint for record in caplog.records] == ["select ?"]
+    assert registry.top(order_by="bytes")[0]["bytes"] == 3
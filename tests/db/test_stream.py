@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import logging
+
+from app.db.mysql.connection import MySQLConnection, MySQLConnectionArgs
+from tests.fakes import FakePool, build_postgresql_connection
+
+
+def build_connection(rows) -> MySQLConnection:
+    return MySQLConnection(
+        cnx_args=MySQLConnectionArgs("localhost", 3306, "login", "password", "db", "test"),
+        logger=logging.getLogger("db"),
+        pool=FakePool(max_size=1, connection_args={"rows": rows}),
+    )
+
+
+def test_select_stream_yields_batches():
+    connection = build_connection(rows=[{"id": i} for i in range(5)])
+    batches = list(connection.select_stream("SELECT id FROM t", batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert connection.pool.stats["idle"] == 1
+
+
+def test_select_stream_closes_connection_when_closed_early():
+    connection = build_connection(rows=[{"id": i} for i in range(5)])
+    stream = connection.select_stream("SELECT id FROM t", batch_size=2)
+    next(stream)
+    assert connection.pool.stats["in_use"] == 1
+    stream.close()
+    assert connection.pool.stats["in_use"] == 0
+    # the rows left are not read: the connection is closed and discarded
+    raw = connection.pool.created[0]
+    assert raw.fetch_sizes == [2]
+    assert raw.closed
+    assert connection.pool.stats["idle"] == 0
+
+
+def test_postgresql_select_stream_uses_a_named_cursor():
+    connection = build_postgresql_connection(rows=[(i,) for i in range(5)])
+    stream = connection.select_stream("SELECT id FROM t", batch_size=2)
+    assert next(stream) == [(0,), (1,)]
+    raw = connection.pool.created[0]
+    assert raw.cursor_args[0]["name"].startswith("stream_")
+    stream.close()
+    # closing a named cursor does not read the rows left, the connection goes back to the pool
+    assert raw.fetch_sizes == [2]
+    assert connection.pool.stats["idle"] == 1
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import logging
+
+from app.db.pool import ConnectionPool
+from app.db.postgresql.connection import PostgreSQLConnection, PostgreSQLConnectionArgs
+
+
+class FakeCursor:
+    """DB-API cursor of a FakeConnection, the statements are recorded on the connection"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.connection = raw
+        self.rowcount = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def close(self):
+        pass
+
+    def execute(self, sql_req, params=None):
+        self.raw.statements.append((sql_req, params))
+        if self.raw.on_execute is not None:
+            self.raw.on_execute()
+        # the session settings (SET statement_timeout...) do not fail
+        if self.raw.error is not None and not str(sql_req).startswith(("SET ", "RESET ")):
+            raise self.raw.error
+        self._rows = list(self.raw.rows)
+        self.rowcount = len(self._rows)
+
+    def mogrify(self, template, args):
+        return template % tuple(repr(arg).encode() for arg in args)
+
+    def executemany(self, sql_req, batch):
+        self.raw.batches.append(batch)
+        self.rowcount = len(batch)
+        return self.rowcount
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size):
+        self.raw.fetch_sizes.append(size)
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def copy_expert(self, copy_sql, destination):
+        for chunk in self.raw.copy_chunks:
+            destination.write(chunk)
+
+
+class FakeConnection:
+    """
+    Raw database connection returning rows to every select (or raising error, SET and RESET excepted)
+    and the copy_chunks to COPY ... TO STDOUT. on_execute is called on each statement.
+    """
+
+    encoding = "UTF8"
+
+    def __init__(self, rows=(), error=None, on_execute=None, copy_chunks=()):
+        self.rows = list(rows)
+        self.error = error
+        self.on_execute = on_execute
+        self.copy_chunks = list(copy_chunks)
+        self.statements = []
+        self.batches = []
+        self.fetch_sizes = []
+        self.cursor_args = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.cancelled = 0
+        self.closed = False
+
+    def cursor(self, *args, **kwargs):
+        self.cursor_args.append(kwargs)
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def cancel(self):
+        self.cancelled += 1
+
+    def close(self):
+        self.closed = True
+
+    @property
+    def open(self):
+        return not self.closed
+
+
+class FakePool(ConnectionPool):
+    """ConnectionPool of FakeConnection objects, the created connections are kept in created"""
+
+    def __init__(self, connection_args=None, **kwargs):
+        self.connection_args = connection_args or {}
+        self.created = []
+        super().__init__(**kwargs)
+
+    def create_connection(self):
+        raw = FakeConnection(**self.connection_args)
+        self.created.append(raw)
+        return raw
+
+    def close_connection(self, raw):
+        raw.close()
+
+
+def build_postgresql_connection(cls=PostgreSQLConnection, **connection_args):
+    """Return a PostgreSQLConnection (or an instance of a subclass) with a one connection FakePool"""
+    return cls(
+        cnx_args=PostgreSQLConnectionArgs(
+            hostname="h", tcp_port=5432, login="u", password="p", database="d", program="t"
+        ),
+        logger=logging.getLogger("db.client"),
+        pool=FakePool(connection_args=connection_args, max_size=1),
+    )
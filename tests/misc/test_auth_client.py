@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import copy
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from app.client.auth_client import AuthClient, UserAccess
+
+
+@pytest.fixture
+def auth_client(mock_config):
+    config = copy.deepcopy(mock_config)
+    config["auth"]["permissions_cache"] = {"enable": True, "max_size": 10, "ttl": 60, "negative_ttl": 0.001}
+    return AuthClient(config=config)
+
+
+def test_checks_of_a_request_share_one_lookup(auth_client):
+    request = SimpleNamespace(state=SimpleNamespace())
+    with mock.patch.object(auth_client, "fetch_user_access", wraps=auth_client.fetch_user_access) as fetch:
+        assert auth_client.user_has_admin_role("user-1", request=request)
+        assert auth_client.user_has_permissions("user-1", "ListTables", request)
+        # another request is served by the cache
+        assert auth_client.user_has_permissions("user-1", "ListTables", SimpleNamespace(state=SimpleNamespace()))
+    assert fetch.call_count == 1
+    assert auth_client.stats == {"request_hits": 1, "hits": 1, "misses": 1, "size": 1}
+
+
+def test_negative_ttl_and_invalidation(auth_client):
+    with mock.patch.object(auth_client, "fetch_user_access", return_value=UserAccess()) as fetch:
+        assert not auth_client.user_has_permissions("user-2", "ListTables", None)
+        time.sleep(0.01)
+        assert auth_client.cache.get("user-2") is None
+        auth_client.user_has_permissions("user-2", "ListTables", None)
+    assert fetch.call_count == 2
+
+    auth_client.get_user_access("user-3")
+    auth_client.invalidate("user-3")
+    assert auth_client.cache.get("user-3") is None
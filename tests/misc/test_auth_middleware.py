@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import asyncio
+import base64
+from base64 import b64decode
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from starlette.authentication import AuthCredentials, AuthenticationBackend, BaseUser
+from starlette.middleware import Middleware
+from starlette.middleware.authentication import AuthenticationMiddleware
+
+from app.exception import AuthException
+from app.misc.auth_middleware import AuthMiddleware
+from app.misc.permissions_checker import AuthenticatedUser, AuthSettings, user_is_authenticated
+
+AUTH_CFG = {
+    "sso": {"enable": False},
+    "basic": {"enable": True, "login": "service", "password": "secret"},
+    "excluded_paths": ["/healthcheck"],
+}
+BASIC_AUTHORIZATION = b"Basic " + base64.b64encode(b"service:secret")
+
+
+async def endpoint(scope, receive, send):
+    scope["seen_user"] = scope["user"]
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def make_scope(path="/api", authorization=BASIC_AUTHORIZATION):
+    state = SimpleNamespace(auth_settings=AuthSettings(AUTH_CFG), config={"auth": AUTH_CFG})
+    headers = [(b"host", b"testserver"), (b"accept", b"*/*")]
+    if authorization is not None:
+        headers.append((b"authorization", authorization))
+    return {"type": "http", "path": path, "headers": headers, "app": SimpleNamespace(state=state)}
+
+
+def call(app, scope):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages[0]["status"]
+
+
+def test_basic_auth_user_is_stored_in_scope():
+    scope = make_scope()
+    assert call(AuthMiddleware(endpoint), scope) == 200
+    assert scope["seen_user"].is_authenticated
+    assert scope["authorization"][0] == "basic"
+
+
+def test_excluded_path_is_not_authenticated():
+    scope = make_scope(path="/healthcheck", authorization=b"not a valid header")
+    assert call(AuthMiddleware(endpoint), scope) == 200
+    assert not scope["seen_user"].is_authenticated
+
+
+def test_invalid_header_is_rejected():
+    assert call(AuthMiddleware(endpoint), make_scope(authorization=b"garbage")) == 403
+
+
+# the previous authentication stack (starlette AuthenticationMiddleware), kept as the benchmark baseline
+
+
+class LegacyBasicAuthBackend(AuthenticationBackend):
+    async def authenticate(self, conn) -> Optional[Tuple[AuthCredentials, BaseUser]]:
+        auth_cfg = conn.app.state.config["auth"]
+
+        if "Authorization" not in conn.headers:
+            return None
+
+        auth = conn.headers["Authorization"]
+        scheme, credentials = auth.split()
+        scheme = scheme.lower()
+        if scheme == "basic" and auth_cfg["basic"]["enable"]:
+            login, password = b64decode(credentials).decode("utf-8").split(":")
+            if login != auth_cfg["basic"]["login"] or password != auth_cfg["basic"]["password"]:
+                raise AuthException(message="Invalid password")
+
+            return AuthCredentials(["authenticated"]), AuthenticatedUser(
+                token={"email": login, "identity_id": login}, auth_method=scheme
+            )
+        return None
+
+
+class LegacyOptionalHTTPBearer(HTTPBearer):
+    async def __call__(self, request: Request) -> Optional[HTTPAuthorizationCredentials]:
+        if not request.app.state.config["auth"]["sso"]["enable"]:
+            return None
+
+        try:
+            return await super().__call__(request)
+        except (Exception, HTTPException):
+            return None
+
+
+async def legacy_user_is_authenticated(
+    request: Request,
+    _credentials: HTTPAuthorizationCredentials = Depends(LegacyOptionalHTTPBearer(auto_error=False)),
+) -> None:
+    auth_sso_enabled = request.app.state.config["auth"]["sso"]["enable"]
+    auth_basic_enabled = request.app.state.config["auth"]["basic"]["enable"]
+    if not auth_sso_enabled and not auth_basic_enabled:
+        return
+
+    if not request.user.is_authenticated:
+        raise HTTPException(status_code=401, detail="User is not authenticated")
+
+
+def build_app(middleware: Middleware, dependency) -> FastAPI:
+    """FastAPI application with one route protected by the authentication dependency"""
+    app = FastAPI(middleware=[middleware])
+    app.state.config = {"auth": AUTH_CFG}
+    app.state.auth_settings = AuthSettings(AUTH_CFG)
+
+    @app.get("/api", dependencies=[Depends(dependency)])
+    async def api():
+        return {}
+
+    return app
+
+
+STACKS = {
+    "asgi": lambda: build_app(Middleware(AuthMiddleware), user_is_authenticated),
+    "starlette": lambda: build_app(
+        Middleware(AuthenticationMiddleware, backend=LegacyBasicAuthBackend()), legacy_user_is_authenticated
+    ),
+}
+
+
+def make_http_scope(authorization=BASIC_AUTHORIZATION):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api",
+        "raw_path": b"/api",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"accept", b"*/*"), (b"authorization", authorization)],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+
+
+async def run_requests(app, count: int) -> List[int]:
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    for _ in range(count):
+        await app(make_http_scope(), receive, send)
+    return statuses
+
+
+@pytest.fixture
+def event_loop_runner():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.mark.parametrize("stack", list(STACKS))
+def test_auth_stacks_authenticate_the_request(event_loop_runner, stack):
+    assert event_loop_runner(run_requests(STACKS[stack](), 2)) == [200, 200]
+
+
+@pytest.mark.parametrize("stack", list(STACKS))
+def test_benchmark_auth_middleware(benchmark, event_loop_runner, stack):
+    """Middleware and dependency of a request with basic auth, 200 requests per round on one event loop"""
+    app = STACKS[stack]()
+    statuses = benchmark.pedantic(lambda: event_loop_runner(run_requests(app, 200)), rounds=20, warmup_rounds=2)
+    assert statuses == [200] * 200
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import threading
+import time
+
+import fakeredis
+
+from app.misc.cache import LRUCache, ReadThroughCache, RedisCache, cached
+from app.router.default.models import ApiV1ListTablesResponse, Table
+
+
+class FakeDBClient:
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = 0
+
+    @cached("get_list_of_tables", ApiV1ListTablesResponse)
+    def get_list_of_tables(self, limit: int) -> ApiV1ListTablesResponse:
+        self.calls += 1
+        time.sleep(0.01)
+        return ApiV1ListTablesResponse(tables=[Table(tableId=i, tableName=f"table{i}") for i in range(limit)])
+
+
+def build_cache(redis_client=None, ttl=60):
+    return ReadThroughCache(
+        lru=LRUCache(max_size=10),
+        redis_cache=RedisCache(redis_client, prefix="test:") if redis_client else None,
+        ttls={"get_list_of_tables": ttl},
+    )
+
+
+def test_lru_cache_evicts_and_expires():
+    lru = LRUCache(max_size=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    lru.set("d", 4, ttl=0)
+    assert lru.get("d") is None
+
+
+def test_cached_method_hits_lru_tier():
+    client = FakeDBClient(build_cache())
+    first = client.get_list_of_tables(limit=2)
+    assert client.get_list_of_tables(limit=2) is first
+    assert client.calls == 1
+    client.get_list_of_tables(limit=3)
+    assert client.calls == 2
+    stats = client.cache.stats
+    assert stats["lru_hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_cached_method_hits_redis_tier():
+    redis_client = fakeredis.FakeRedis()
+    FakeDBClient(build_cache(redis_client)).get_list_of_tables(limit=2)
+
+    # a second process only shares the redis tier
+    other = FakeDBClient(build_cache(redis_client))
+    result = other.get_list_of_tables(limit=2)
+    assert other.calls == 0
+    assert [table.name for table in result.tables] == ["table0", "table1"]
+    assert other.cache.stats["redis_hits"] == 1
+
+
+def test_cached_method_without_ttl_is_not_cached():
+    client = FakeDBClient(build_cache(ttl=None))
+    client.get_list_of_tables(limit=1)
+    client.get_list_of_tables(limit=1)
+    assert client.calls == 2
+
+
+def test_cache_stampede_protection():
+    client = FakeDBClient(build_cache())
+    threads = [threading.Thread(target=client.get_list_of_tables, kwargs={"limit": 5}) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.calls == 1
+
+
+def test_invalidate_survives_a_redis_outage():
+    server = fakeredis.FakeServer()
+    cache = build_cache(fakeredis.FakeRedis(server=server))
+    cache.lru.set("key", "value", 60)
+    server.connected = False
+    cache.invalidate("key")
+    assert cache.lru.get("key") is None
+    assert cache.stats["redis_errors"] == 1
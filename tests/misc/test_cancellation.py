@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import asyncio
+
+import psycopg2.errors
+import pytest
+
+from app.exception import AppDBQueryCancelledError
+from app.misc.cancellation import CancellationToken, cancellation_scope, get_cancellation_token
+from app.misc.singleflight import SingleFlight
+from tests.fakes import build_postgresql_connection
+
+
+def test_token_calls_registered_callbacks_once():
+    token = CancellationToken()
+    calls = []
+    token.register(lambda: calls.append("a"))
+    unregister = token.register(lambda: calls.append("b"))
+    unregister()
+    token.cancel()
+    token.cancel()
+    token.register(lambda: calls.append("c"))
+    assert calls == ["a", "c"]
+
+
+def test_checkout_cancels_the_running_query():
+    token = CancellationToken()
+    # the request is cancelled while the query is running
+    connection = build_postgresql_connection(
+        on_execute=token.cancel, error=psycopg2.errors.QueryCanceled("canceling statement due to user request")
+    )
+    with cancellation_scope(token):
+        with pytest.raises(AppDBQueryCancelledError) as ex_info:
+            with connection.checkout():
+                connection.select("SELECT pg_sleep(10)")
+    assert ex_info.value.status_code == 499
+    raw = connection.pool.created[0]
+    assert raw.cancelled == 1
+    # the aborted transaction is rolled back, the connection goes back to the pool
+    assert raw.rollbacks == 1
+    assert not raw.closed
+    assert connection.pool.stats["idle"] == 1
+
+
+def test_single_flight_is_cancelled_when_all_callers_are_cancelled():
+    single_flight = SingleFlight()
+    flight_tokens = []
+
+    async def work():
+        flight_tokens.append(get_cancellation_token())
+        await asyncio.sleep(0.05)
+        return 1
+
+    async def caller(token):
+        with cancellation_scope(token):
+            return await single_flight.do_async("key", work)
+
+    async def main():
+        first, second = CancellationToken(), CancellationToken()
+        tasks = [asyncio.ensure_future(caller(first)), asyncio.ensure_future(caller(second))]
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert not flight_tokens[0].cancelled
+        second.cancel()
+        assert flight_tokens[0].cancelled
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == [1, 1]
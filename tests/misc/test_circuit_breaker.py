@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import asyncio
+import copy
+
+import pytest
+
+from app.client.db_client import DBClient
+from app.exception import AppDBConnectionError, AppDBPoolExhaustedError
+from app.misc.circuit_breaker import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    Bulkhead,
+    CircuitBreaker,
+    guarded_async,
+)
+
+
+def fail(breaker):
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("down")
+
+
+def test_circuit_breaker_opens_on_failure_rate_and_fails_fast():
+    breaker = CircuitBreaker("db", minimum_calls=2, failure_rate_threshold=0.5, exceptions=(ValueError,))
+    with breaker.guard():
+        pass
+    fail(breaker)
+    assert breaker.state == STATE_OPEN
+    with pytest.raises(AppDBConnectionError):
+        with breaker.guard():
+            pass
+    assert breaker.stats["rejected"] == 1
+
+
+def test_circuit_breaker_half_open_probe():
+    breaker = CircuitBreaker("db", minimum_calls=1, open_timeout=0, exceptions=(ValueError,))
+    fail(breaker)
+    assert breaker.state == STATE_HALF_OPEN
+    fail(breaker)
+    assert breaker.stats["opened"] == 2
+    with breaker.guard():
+        pass
+    assert breaker.state == STATE_CLOSED
+
+
+def test_circuit_breaker_ignores_other_errors():
+    breaker = CircuitBreaker("db", minimum_calls=1, exceptions=(AppDBConnectionError,))
+    fail(breaker)
+    assert breaker.state == STATE_CLOSED
+
+
+def test_circuit_breaker_ignores_an_exhausted_pool(mock_config):
+    breaker = DBClient(config=mock_config).build_circuit_breaker("db")
+    breaker.minimum_calls = 1
+    for _ in range(3):
+        with pytest.raises(AppDBPoolExhaustedError):
+            with breaker.guard():
+                raise AppDBPoolExhaustedError("No database connection available")
+    assert breaker.state == STATE_CLOSED
+    assert breaker.stats["failures"] == 0
+
+
+def test_abandoned_call_records_no_outcome():
+    breaker = CircuitBreaker("db", minimum_calls=1, open_timeout=0, exceptions=(ValueError,))
+
+    def stream():
+        with breaker.guard():
+            yield 1
+            yield 2
+
+    rows = stream()
+    next(rows)
+    rows.close()
+    assert breaker.stats["successes"] == 0 and breaker.stats["failures"] == 0
+
+    # the probe slot of an abandoned half open call is given back
+    fail(breaker)
+    rows = stream()
+    next(rows)
+    rows.close()
+    with breaker.guard():
+        pass
+    assert breaker.state == STATE_CLOSED
+
+
+def test_guard_iter_takes_the_bulkhead_slot_before_the_response_starts(mock_config):
+    config = copy.deepcopy(mock_config)
+    config["db"]["dry_run"] = True
+    db_client = DBClient(config=config)
+    db_client.bulkhead = Bulkhead("db", max_concurrent=1)
+    db_client.open()
+    try:
+        batches = db_client.iter_list_of_tables(limit=3)
+        assert db_client.bulkhead.stats["in_flight"] == 1
+        with pytest.raises(AppDBConnectionError):
+            db_client.iter_list_of_tables(limit=3)
+        assert sum(len(batch) for batch in batches) == 3
+        assert db_client.bulkhead.stats["in_flight"] == 0
+    finally:
+        db_client.disconnect()
+
+
+def test_bulkhead_rejects_when_full():
+    bulkhead = Bulkhead("db", max_concurrent=1)
+    with bulkhead.guard():
+        assert bulkhead.stats["in_flight"] == 1
+        with pytest.raises(AppDBConnectionError):
+            with bulkhead.guard():
+                pass
+    assert bulkhead.stats == {"in_flight": 0, "rejected": 1, "name": "db", "max_concurrent": 1}
+
+
+def test_guarded_async_waits_for_a_bulkhead_slot():
+    breaker = CircuitBreaker("db", minimum_calls=1, exceptions=(ValueError,))
+    bulkhead = Bulkhead("db", max_concurrent=1, max_wait=1.0)
+    in_flight = []
+
+    async def query(i):
+        async with guarded_async(breaker, bulkhead):
+            in_flight.append(bulkhead.stats["in_flight"])
+            await asyncio.sleep(0.01)
+            return i
+
+    async def main():
+        return await asyncio.gather(*[query(i) for i in range(3)])
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert in_flight == [1, 1, 1]
+    assert breaker.stats["successes"] == 3
+
+    async def rejected():
+        async with guarded_async(breaker, Bulkhead("full", max_concurrent=0, max_wait=0.01)):
+            pass
+
+    with pytest.raises(AppDBConnectionError):
+        asyncio.run(rejected())
+    # a rejected call does not reach the circuit breaker
+    assert breaker.stats["failures"] == 0
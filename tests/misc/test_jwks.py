@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+import pytest
+
+from app.exception import JWTDecodeException
+from app.misc.jwks import JWKSKeyStore, get_jwks_url, jwks_key_store
+from app.misc.permissions_checker import decode_jwt_token, decoded_token_cache
+
+RESOURCES = os.path.join(os.path.dirname(__file__), "..", "resources")
+JWKS_URL = "file://" + os.path.join(RESOURCES, "jwks.json")
+
+
+def read_private_key(name):
+    with open(os.path.join(RESOURCES, name), "rb") as pem:
+        return pem.read()
+
+
+# the RSA key pair of the stand-in JWKS (the public key is in jwks.json) and a key that is not in it
+SIGNING_KEY = read_private_key("jwks-test-key-1.pem")
+OTHER_KEY = read_private_key("jwks-other-key.pem")
+
+
+def make_token(key=SIGNING_KEY, kid="test-key-1"):
+    claims = {"email": "a@b.c", "identity_id": "1", "exp": int(time.time()) + 60}
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def key_store():
+    jwks_key_store.configure(url=JWKS_URL, min_refresh_interval=60)
+    jwks_key_store.refresh(force=True)
+    decoded_token_cache.clear()
+    yield jwks_key_store
+    jwks_key_store.configure(url="")
+    decoded_token_cache.clear()
+
+
+def test_get_jwks_url():
+    assert get_jwks_url({"host": "https://sso/", "realm_name": "demo"}) == (
+        "https://sso/realms/demo/protocol/openid-connect/certs"
+    )
+    assert get_jwks_url({"host": "https://sso", "realm_name": "demo", "jwks": {"url": JWKS_URL}}) == JWKS_URL
+
+
+def test_missing_keys_are_fetched_on_demand():
+    store = JWKSKeyStore(url=JWKS_URL, min_refresh_interval=60)
+    assert store.get_signing_key("test-key-1").key_id == "test-key-1"
+    assert store.stats["fetches"] == 1
+
+
+def test_unknown_kid_refresh_is_rate_limited():
+    store = JWKSKeyStore(url=JWKS_URL, min_refresh_interval=60)
+    for _ in range(3):
+        with pytest.raises(JWTDecodeException):
+            store.get_signing_key("rotated-key")
+    assert store.stats["fetches"] == 1
+    assert store.stats["unknown_kids"] == 3
+
+
+def test_unknown_kid_is_fetched_by_a_single_caller(monkeypatch):
+    store = JWKSKeyStore(url=JWKS_URL, min_refresh_interval=0)
+    urlopen = urllib.request.urlopen
+    calls = []
+
+    def slow_urlopen(*args, **kwargs):
+        calls.append(args)
+        time.sleep(0.2)
+        return urlopen(*args, **kwargs)
+
+    monkeypatch.setattr(urllib.request, "urlopen", slow_urlopen)
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        keys = list(executor.map(lambda _: store.get_signing_key("test-key-1"), range(5)))
+
+    assert len(calls) == 1
+    assert {key.key_id for key in keys} == {"test-key-1"}
+
+
+def test_keys_are_kept_when_the_refresh_fails():
+    store = JWKSKeyStore(url=JWKS_URL)
+    store.refresh(force=True)
+    store.url = "file:///missing/jwks.json"
+    assert not store.refresh(force=True)
+    assert store.get_signing_key("test-key-1").algorithm_name == "RS256"
+
+
+def test_decode_jwt_token_verifies_the_signature(key_store):
+    assert decode_jwt_token(make_token())["email"] == "a@b.c"
+    with pytest.raises(JWTDecodeException):
+        decode_jwt_token(make_token(key=OTHER_KEY))
+    with pytest.raises(JWTDecodeException):
+        decode_jwt_token(make_token(kid="unknown"))
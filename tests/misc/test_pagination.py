@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import pytest
+
+from app.exception import AppException
+from app.misc.pagination import decode_cursor, encode_cursor, paginate
+from app.sql.queries import query_get_list_of_tables
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1234)) == 1234
+
+
+@pytest.mark.parametrize("token", ["", "not-a-cursor", encode_cursor(1)[:-2]])
+def test_invalid_cursor(token):
+    with pytest.raises(AppException) as ex:
+        decode_cursor(token)
+    assert ex.value.status_code == 400
+
+
+def test_paginate():
+    page, next_cursor = paginate([1, 2, 3], 2, key=lambda item: item)
+    assert page == [1, 2]
+    assert decode_cursor(next_cursor) == 2
+    assert paginate([1, 2], 2, key=lambda item: item) == ([1, 2], None)
+
+
+def test_query_get_list_of_tables_seeks_after_id():
+    query, params = query_get_list_of_tables(10, after_id=42)
+    assert "oid > %s" in query
+    assert params == [42, 10]
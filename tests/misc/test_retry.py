@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import asyncio
+
+import pytest
+
+from app.misc.deadline import deadline, get_remaining_time
+from app.misc.retry import RetryBudget, async_retry, retry
+
+
+class Flaky:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ValueError("flaky")
+        return "ok"
+
+    async def __call__(self):
+        return self.call()
+
+
+def test_async_retry_retries_until_success():
+    flaky = Flaky(failures=2)
+    func = async_retry(exceptions=ValueError, tries=3, delay=0.001, full_jitter=True, logger=None)(flaky)
+    assert asyncio.run(func()) == "ok"
+    assert flaky.calls == 3
+
+
+def test_async_retry_gives_up_when_the_deadline_would_be_exceeded():
+    flaky = Flaky(failures=2)
+    func = async_retry(exceptions=ValueError, tries=3, delay=10, logger=None)(flaky)
+
+    async def main():
+        with deadline(1):
+            return await func()
+
+    with pytest.raises(ValueError):
+        asyncio.run(main())
+    assert flaky.calls == 1
+
+
+def test_async_retry_stops_when_the_budget_is_exhausted():
+    budget = RetryBudget(ratio=0, max_tokens=1)
+    flaky = Flaky(failures=10)
+    func = async_retry(exceptions=ValueError, tries=5, delay=0, budget=budget, logger=None)(flaky)
+    with pytest.raises(ValueError):
+        asyncio.run(func())
+    assert flaky.calls == 2
+    assert budget.stats["exhausted"] == 1
+
+
+def test_retry_gives_up_when_the_deadline_would_be_exceeded():
+    flaky = Flaky(failures=2)
+    func = retry(exceptions=ValueError, tries=3, delay=10, logger=None)(flaky.call)
+    with pytest.raises(ValueError):
+        with deadline(1):
+            func()
+    assert flaky.calls == 1
+
+
+def test_retry_stops_when_the_budget_is_exhausted():
+    budget = RetryBudget(ratio=0, max_tokens=1)
+    flaky = Flaky(failures=10)
+    func = retry(exceptions=ValueError, tries=5, delay=0, budget=budget, logger=None)(flaky.call)
+    with pytest.raises(ValueError):
+        func()
+    assert flaky.calls == 2
+    assert budget.stats["exhausted"] == 1
+
+
+def test_nested_deadline_only_shortens():
+    assert get_remaining_time() is None
+    with deadline(1):
+        with deadline(60):
+            assert get_remaining_time() <= 1
+    assert get_remaining_time() is None
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+from types import SimpleNamespace
+
+from fastapi import APIRouter, Depends
+
+from app.main import app
+from app.misc.constants import ENDPOINT_API_V1, TAG_ADMIN
+from app.misc.permissions_checker import RoutePermissionTable, check_demo_permissions, user_is_authenticated
+
+
+def find_route(path):
+    return next(route for route in app.routes if getattr(route, "path", None) == path)
+
+
+def test_permission_table_is_built_from_the_route_metadata():
+    table = RoutePermissionTable(app.routes)
+    list_tables = table.get(find_route(f"{ENDPOINT_API_V1}/demo/name/"))
+    assert list_tables.authenticated
+    assert list_tables.operation_id == "ListTables"
+    assert list_tables.required_roles == {"admin"}
+
+    assert table.get(find_route(f"{ENDPOINT_API_V1}/demo/date/")).required_roles == frozenset()
+    healthcheck = table.get(find_route("/healthcheck"))
+    assert healthcheck.is_public
+    assert healthcheck.operation_id is None
+
+
+def test_routes_sharing_an_operation_id_keep_their_own_permissions():
+    router = APIRouter()
+    router.add_api_route("/a", lambda: None, operation_id="Shared", dependencies=[Depends(user_is_authenticated)])
+    router.add_api_route(
+        "/b", lambda: None, operation_id="Shared", tags=[TAG_ADMIN], dependencies=[Depends(user_is_authenticated)]
+    )
+    first, second = router.routes
+    table = RoutePermissionTable(router.routes)
+    assert len(table) == 2
+    assert table.get(first).required_roles == frozenset()
+    assert table.get(second).required_roles == {"admin"}
+
+
+def test_route_without_operation_permission_skips_the_check():
+    route = find_route("/healthcheck")
+    request = SimpleNamespace(
+        scope={"route": route},
+        app=SimpleNamespace(state=SimpleNamespace(route_permissions=RoutePermissionTable(app.routes))),
+    )
+    # neither the user nor the auth client are looked up
+    check_demo_permissions(request=request)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.misc.singleflight import SingleFlight
+
+
+def test_single_flight_threads_share_one_call():
+    single_flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.05)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(single_flight.do("key", work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert single_flight.do("key", lambda: "again") == "again"
+
+
+def test_single_flight_async_share_one_call_and_error():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*[single_flight.do_async("key", work) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert single_flight.shared == 2
+
+
+def test_single_flight_async_distinct_keys():
+    single_flight = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(
+            single_flight.do_async(1, lambda: asyncio.sleep(0, result=1)),
+            single_flight.do_async(2, lambda: asyncio.sleep(0, result=2)),
+        )
+
+    assert asyncio.run(main()) == [1, 2]
+    assert single_flight.executions == 2
+
+
+def test_single_flight_async_callers_have_their_own_timeout():
+    single_flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(
+            single_flight.do_async("key", work, timeout=0.01),
+            single_flight.do_async("key", work, timeout=1.0),
+            return_exceptions=True,
+        )
+
+    short, long = asyncio.run(main())
+    assert isinstance(short, asyncio.TimeoutError)
+    assert long == "result"
+    assert single_flight.executions == 1
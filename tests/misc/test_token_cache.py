@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# flake8: noqa
+
+import time
+from unittest import mock
+
+import jwt
+import pytest
+
+from app.exception import JWTExpiredSignatureError
+from app.misc.permissions_checker import DecodedTokenCache, decode_jwt_token, decoded_token_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    decoded_token_cache.clear()
+    yield
+    decoded_token_cache.clear()
+
+
+def test_decode_jwt_token_is_cached():
+    token = jwt.encode({"email": "a@b.c", "exp": int(time.time()) + 60}, "secret", algorithm="HS256")
+    with mock.patch("jwt.decode", wraps=jwt.decode) as decode:
+        claims = decode_jwt_token(token)
+        claims["email"] = "modified"
+        assert decode_jwt_token(token)["email"] == "a@b.c"
+    assert decode.call_count == 1
+    assert decoded_token_cache.stats["hits"] >= 1
+
+
+def test_entry_expires_with_the_token():
+    cache = DecodedTokenCache(max_size=10, max_ttl=300)
+    cache.set("expired", {"exp": time.time() - 1})
+    cache.set("valid", {"exp": time.time() + 60})
+    assert cache.get("expired") is None
+    assert cache.get("valid") is not None
+    assert cache.stats == {"hits": 1, "misses": 1, "size": 1, "max_size": 10}
+
+
+def test_expired_token_is_not_served_from_cache():
+    token = jwt.encode({"email": "a@b.c", "exp": int(time.time()) - 1}, "secret", algorithm="HS256")
+    with pytest.raises(JWTExpiredSignatureError):
+        decode_jwt_token(token)
+    assert decoded_token_cache.stats["size"] == 0
@@ -8,8 +8,10 @@ import pytest
 from fastapi.testclient import TestClient
 from freezegun import freeze_time
 
+from app.client.postgresql_client import PostgreSQLClient
 from app.main import app
 from app.router.default.models import ApiV1GetDateResponse
+from tests.fakes import build_postgresql_connection
 
 
 @pytest.fixture(scope="module")
@@ -28,3 +30,65 @@ def test_get_date(client):
     assert data["date"] == "2023-01-01T00:00:00"
     now = ApiV1GetDateResponse(date=datetime.now())
     assert json.dumps(data).replace(" ", "") == now.model_dump_json()
+
+
+def test_list_tables_stream_ndjson(client):
+    response = client.get("/demo-project/api/v1/demo/name/?limit=3", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert [json.loads(line)["tableId"] for line in lines] == [0, 1, 2]
+
+
+def test_list_tables_stream_csv(client):
+    response = client.get("/demo-project/api/v1/demo/name/?limit=2", headers={"Accept": "text/csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == ["tableId,tableName", "0,table0", "1,table1"]
+
+
+def test_list_tables_pagination(client):
+    response = client.get("/demo-project/api/v1/demo/name/?limit=2")
+    assert response.status_code == 200
+    first_page = response.json()
+    assert [table["tableId"] for table in first_page["tables"]] == [0, 1]
+    response = client.get(f"/demo-project/api/v1/demo/name/?limit=2&cursor={first_page['next']}")
+    assert [table["tableId"] for table in response.json()["tables"]] == [2, 3]
+
+
+def test_get_db_stats(client):
+    response = client.get("/demo-project/api/v1/admin/db/stats/?limit=5&orderBy=count")
+    assert response.status_code == 200
+    assert isinstance(response.json()["queries"], list)
+
+
+def test_get_table_stats(client):
+    response = client.get("/demo-project/api/v1/demo/stats/")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == sum(kind["count"] for kind in data["kinds"])
+    assert {"kind", "count", "pages", "pagesMean", "pagesP50", "pagesP95", "tuples"} <= set(data["kinds"][0])
+
+
+def test_export_table_rejects_an_invalid_table_name(client):
+    response = client.get("/demo-project/api/v1/demo/export/pg_class;drop")
+    assert response.status_code == 400
+    assert response.json()["name"] == "InvalidTableName"
+
+
+def test_other_validation_errors_keep_the_fastapi_status(client):
+    response = client.get("/demo-project/api/v1/demo/export/pg_class", params={"format": "xml"})
+    assert response.status_code == 422
+
+
+def test_export_table_streams_the_copy_output(client, monkeypatch):
+    postgresql_client = build_postgresql_connection(cls=PostgreSQLClient, copy_chunks=["id,name\n1,a\n", "2,b\n"])
+    pool = postgresql_client.pool
+    monkeypatch.setattr(app.state.service_manager.db_client, "client", postgresql_client)
+    response = client.get("/demo-project/api/v1/demo/export/public.pg_class")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="public.pg_class.csv"'
+    assert response.text == "id,name\n1,a\n2,b\n"
+    # the completed COPY returns its connection to the pool
+    assert pool.stats["idle"] == 1